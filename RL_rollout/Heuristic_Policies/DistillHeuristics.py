@@ -1,10 +1,13 @@
-from Heuristic import Heuristic
+from Heuristic import Heuristic, VecHeuristic
 import numpy as np
 
 
-def salt_check(env):
+def shelf_salt_check(shelf):
     return any([(mat in vessel.material_dict) and (vessel.material_dict[mat].mol>1e-3)
-                for vessel in env.shelf[:3] for mat in ["Na","Cl","NaCl"]])
+                for vessel in shelf[:3] for mat in ["Na","Cl","NaCl"]])
+
+def salt_check(env):
+    return shelf_salt_check(env.shelf)
 
 class WurtzDistillHeuristic(Heuristic):
     level_2 = "0909090930"
@@ -26,4 +29,34 @@ class WurtzDistillHeuristic(Heuristic):
             self.step=0
         return int(act)*10+int(param),[]
     
-    
\ No newline at end of file
+    
+
+
+class VecWurtzDistillHeuristic(VecHeuristic):
+    level_2 = VecHeuristic.sequence_table([WurtzDistillHeuristic.level_2])
+    level_3 = VecHeuristic.sequence_table(WurtzDistillHeuristic.level_3)
+
+    def __init__(self,env,level=1,n_envs=None,seed=None):
+        super().__init__(env,level,n_envs)
+        self.rng = np.random.default_rng(seed)
+
+    def salt_checks(self):
+        """Runs salt_check on every environment (fetching their shelves from the VecEnv)"""
+        if hasattr(self.env,"get_attr"):
+            shelves = self.env.get_attr("shelf")
+        else:
+            shelves = [self.env.unwrapped.shelf]
+        return np.array([shelf_salt_check(shelf) for shelf in shelves],dtype=np.int64)
+
+    def _predict(self,obs):
+        if self.level==1:
+            act = np.where(self.rng.random(self.n_envs)<0.25,3,0)
+            param = np.where(act==0,9,0)
+            self.steps+=1
+            self.steps[act==3]=0
+        elif self.level==2:
+            act,param = self.sequence_step(VecWurtzDistillHeuristic.level_2,end=3)
+        else:
+            act,param = self.sequence_step(VecWurtzDistillHeuristic.level_3,self.salt_checks(),end=3)
+        return act*10+param
+
@@ -1,4 +1,5 @@
-from Heuristic import Heuristic
+from Heuristic import Heuristic, VecHeuristic
+import numpy as np
 
 
 
@@ -76,4 +77,40 @@ class WaterOilHeuristic(Heuristic):
         return int(act)*5+int(param),[]
     
     
-    
\ No newline at end of file
+    
+
+
+class VecWurtzExtractHeuristic(VecHeuristic):
+    level_2 = VecHeuristic.sequence_table([WurtzExtractHeuristic.level_2])
+    level_3 = VecHeuristic.sequence_table([WurtzExtractHeuristic.level_3])
+
+    def mix_check(self,o):
+        s = self.steps
+        #if not mix then wait one step
+        out = np.where((s+1)%2==0,1*5+2,7*5)
+        #Drain if the dodecane is near the bottom (checking the widest window last so it takes priority)
+        for n,act in ((2,0),(5,1),(8,2),(11,3),(14,4)):
+            out[o[:,0:n].mean(axis=1)>0.72] = act
+        out[s==0] = 5*5
+        out[s==49] = 8*5
+        self.steps = np.where(s==49,0,s+1)
+        return out
+
+    def _predict(self,obs):
+        if self.level==1:
+            return self.mix_check(obs)
+        table = VecWurtzExtractHeuristic.level_2 if self.level==2 else VecWurtzExtractHeuristic.level_3
+        act,param = self.sequence_step(table)
+        return act*5+param
+
+
+class VecWaterOilHeuristic(VecHeuristic):
+    level_2 = VecHeuristic.sequence_table([WaterOilHeuristic.level_2])
+    level_3 = VecHeuristic.sequence_table([WaterOilHeuristic.level_3])
+
+    def _predict(self,obs):
+        if self.level==1:
+            return np.full(self.n_envs,40)
+        table = VecWaterOilHeuristic.level_2 if self.level==2 else VecWaterOilHeuristic.level_3
+        act,param = self.sequence_step(table)
+        return act*5+param
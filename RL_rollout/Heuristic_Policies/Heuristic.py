@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class Heuristic():
     """
     Heuristic policy for a chemgymrl bench.
@@ -20,4 +23,83 @@ class Heuristic():
 
         :return: (np.ndarray, []) the model's action and an empty array (for baselines compatability)
         """
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+
+class VecHeuristic(Heuristic):
+    """
+    Heuristic policy for a vector of chemgymrl benches (ex. a stable baselines VecEnv).
+
+    Observations come in as an (N, obs_dim) array and actions are computed for all N environments at once,
+    with a step counter for each environment (self.steps) in place of the scalar self.step.
+
+    """
+
+    def __init__(self,env,level=1,n_envs=None):
+        """
+        :param env: A VecEnv (or a single environment)
+        :param level: The level of the heuristic
+        :param n_envs: The number of environments (defaults to env.num_envs, or 1)
+        """
+        super().__init__(env,level)
+        self.n_envs = getattr(env,"num_envs",1) if n_envs is None else n_envs
+        self.steps = np.zeros(self.n_envs,dtype=np.int64)
+
+    def reset(self,dones=None):
+        """
+        Restart the step counters of finished episodes
+
+        :param dones: (np.ndarray) boolean mask of the environments to reset (all of them if None)
+        """
+        if dones is None:
+            self.steps[:]=0
+        else:
+            self.steps[np.asarray(dones,dtype=bool)]=0
+
+    def predict(self,observation,state=None,episode_start=None,deterministic=True):
+        """
+        Get actions for a batch of observations based off of heurstics
+
+        :param observation: (np.ndarray) the (N, obs_dim) observations
+        :param state: passed through (for baselines compatability)
+        :param episode_start: (np.ndarray) mask of environments starting a new episode, their step counters are reset
+
+        :return: (np.ndarray, state) the (N, ...) actions and the state
+        """
+        obs = np.asarray(observation).reshape(self.n_envs,-1)
+        if episode_start is not None:
+            self.reset(episode_start)
+        return self._predict(obs),state
+
+    def _predict(self,obs):
+        raise NotImplementedError
+
+    @staticmethod
+    def sequence_table(policies):
+        """
+        Turn action strings like "0909090930" (pairs of action, parameter digits) into arrays
+        of actions and parameters, padded by repeating each string's last pair
+
+        :return: (np.ndarray, np.ndarray) [len(policies), max_steps] arrays of actions and parameters
+        """
+        n = max(len(p) for p in policies)//2
+        pad = [p+p[-2:]*(n-len(p)//2) for p in policies]
+        digits = np.array([[int(c) for c in p] for p in pad],dtype=np.int64)
+        return digits[:,0::2],digits[:,1::2]
+
+    def sequence_step(self,table,which=0,end=8):
+        """
+        Take the next action of a sequence policy for every environment, restarting the
+        sequences which reach the end action
+
+        :param table: (np.ndarray, np.ndarray) the output of sequence_table
+        :param which: (int or np.ndarray) which sequence each environment follows
+
+        :return: (np.ndarray, np.ndarray) the actions and parameters
+        """
+        acts,params = table
+        s = np.minimum(self.steps,acts.shape[1]-1)
+        act,param = acts[which,s],params[which,s]
+        self.steps+=1
+        self.steps[act==end]=0
+        return act,param
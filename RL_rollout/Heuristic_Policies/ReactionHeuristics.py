@@ -1,4 +1,4 @@
-from Heuristic import Heuristic
+from Heuristic import Heuristic, VecHeuristic
 import numpy as np
 
 class WurtzReactHeuristic(Heuristic):
@@ -45,4 +45,38 @@ class FictReact2Heuristic(Heuristic):
                 #Dump in some C
                 return actions[t],[]# make G
         else: 
-            return actions[t],[]
\ No newline at end of file
+            return actions[t],[]
+
+
+class VecWurtzReactHeuristic(VecHeuristic):
+    actions=np.array([
+    [1,1,0,0,1],#dodecane
+    [1,1,1,0,1],#5-methylundecane
+    [1,1,0,1,1],#4-ethyldecane
+    [1,0,1,0,1],#5,6-dimethyldecane
+    [1,0,1,1,1],#4-ethyl-5-methylnonane
+    [1,0,0,1,1],#4,5-diethyloctane
+    [1,1,1,1,1],#NaCl
+    ],dtype=np.float32)
+    def _predict(self,obs):
+        return VecWurtzReactHeuristic.actions[np.argmax(obs[:,-7:],axis=1)]
+
+
+class VecFictReact2Heuristic(VecHeuristic):
+    actions=np.array([
+    #T A B C D
+    [1,1,1,1,0],#A+B+C -> E
+    [1,1,0,0,1],#A+D -> F
+    [1,0,1,0,1],#B+D -> G
+    [1,0,0,1,1], #C+D -> H
+    [1,0,0,1,0]# F+G+C -> I
+    ],dtype=np.float32)
+    def _predict(self,obs,a=0.91378666,b=0.92011728,thresh=0.093):
+        t = np.argmax(obs[:,-5:],axis=1)
+        out = VecFictReact2Heuristic.actions[t]
+        #making I is a special case
+        marker = obs[:,:100].mean(axis=1)
+        make_i = t==4
+        out[make_i&(marker<0.01)] = [1,a,b,0,1]
+        out[make_i&(marker>thresh)] = [1,0,0,0,0]
+        return out
@@ -43,9 +43,11 @@ class Opt:
         dir (str): Output directory, set to <DEFAULT> for a generated folder name
         seed (int): Random seed for the run
         dummy_vec (bool): Set to True if you want all environments on one thread
+        shm_vec (bool): Set to True to run environments in subprocesses which share observations through shared memory
+        thread_vec (bool): Set to True to run environments in a pool of threads (in this process)
     """
     DEFAULTS=dict(policy="MlpPolicy",algorithm="PPO",environment="WurtzReact-v1",
-                  steps= 51200,dir="<DEFAULT>",n_steps=256,n_envs=1,seed=None,dummy_vec=False)
+                  steps= 51200,dir="<DEFAULT>",n_steps=256,n_envs=1,seed=None,dummy_vec=False,shm_vec=False,thread_vec=False)
                  #best_episodes=200,best_ratio=0.2)
     def __init__(self,**kwargs):
         self.__dict__.update(Opt.DEFAULTS)
@@ -146,7 +148,9 @@ import gymnasium as gym
 #import wandb
 import sys
 import chemistrylab
+from chemistrylab.util.vec_env import SharedMemoryVecEnv, ThreadVecEnv
 import numpy as np
+from functools import partial
 from stable_baselines3.common.off_policy_algorithm import OffPolicyAlgorithm
 from stable_baselines3.common.on_policy_algorithm import OnPolicyAlgorithm
 from datetime import datetime
@@ -173,6 +177,11 @@ vals=np.array([1.0]+[0.05]*6+[0.005*a for a in range(10,0,-2)]+[0.01]*2+[0.005]*
 schedule = get_interp_fn(vals)
 
 
+def make_monitored_env(env_id, monitor_file):
+    """Makes an environment wrapped in a Monitor (defined at module level so it can be pickled)"""
+    return Monitor(gym.make(env_id), monitor_file, allow_early_resets=True)
+
+
 
 
 ALGO={"PPO":PPO,"A2C":A2C,"SAC":SAC,"DQN":DQN,"TD3":TD3}
@@ -222,6 +231,18 @@ if __name__=="__main__":
             return dummy
 
         env = DummyVecEnv([f]*op.n_envs)
+
+    elif op.shm_vec:
+        env = SharedMemoryVecEnv([
+            partial(make_monitored_env, op.environment, os.path.join(op.dir, str(i)))
+            for i in range(op.n_envs)
+        ])
+
+    elif op.thread_vec:
+        env = ThreadVecEnv([
+            partial(make_monitored_env, op.environment, os.path.join(op.dir, str(i)))
+            for i in range(op.n_envs)
+        ])
         
     else:
         env = make_vec_env(
@@ -320,6 +341,7 @@ if __name__=="__main__":
     except Exception as e: print(e);1/0
     
     model.save(op.dir+"\\model")
+    env.close()
 
     #Clean up the logging
     sys.stdout = old_stdout
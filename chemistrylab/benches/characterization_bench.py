@@ -4,10 +4,11 @@ import numpy as np
 import copy
 import sys
 from chemistrylab import material, vessel
+from chemistrylab.extract_algorithms import separate
 import numba
 from typing import NamedTuple, Tuple, Callable, Optional, List
 
-@numba.jit(nopython=True)
+@numba.jit(nopython=True, nogil=True)
 def calc_absorb3(item, C, x, w_min, w_max, absorb):
      
     # iterate through the spectral parameters in self.params and the wavelength space
@@ -30,6 +31,33 @@ def calc_absorb3(item, C, x, w_min, w_max, absorb):
             absorb[k] += C * item[j, 0] * decay_rate
 
 
+def quantize(obs: np.ndarray) -> np.ndarray:
+    """
+    Rounds observations in [0,1] to the nearest multiple of 1/255, stored as uint8.
+
+    Args:
+        obs (np.ndarray): A float observation with entries in [0,1]
+    Returns:
+        np.ndarray: The uint8 observation round(255*obs)
+    """
+    return (obs*np.float32(255)+np.float32(0.5)).astype(np.uint8)
+
+
+def dequantize(obs: np.ndarray) -> np.ndarray:
+    """
+    Maps uint8 observations (see :func:`quantize`) back to float32 values in [0,1]. Float observations are returned
+    unchanged, so this can be applied to observations in either mode.
+
+    Args:
+        obs (np.ndarray): A quantized observation (or a batch of them)
+    Returns:
+        np.ndarray: The float32 observation obs/255
+    """
+    if obs.dtype != np.uint8:
+        return obs
+    return obs.astype(np.float32)*np.float32(1/255)
+
+
 class CharacterizationBench:
     """
     A set of methods made available to inspect an inputted vessel.
@@ -38,25 +66,44 @@ class CharacterizationBench:
         observation_list (Tuple[str]): Ordered list of observations to make (see Method Map)
         targets (Tuple[str]): A list of target materials
         n_vessels (int): The (maximum) number of vessels included in an observation
+        dtype (np.dtype): Either np.float32 (the default) or np.uint8 for quantized observations (see :func:`quantize`)
 
     Method Map:
 
-    +------------+----------------+
-    | Key        | Method         |
-    +============+================+
-    | 'spectra'  | get_spectra    |
-    +------------+----------------+
-    | 'layers'   | get_layers     |
-    +------------+----------------+
-    | 'targets'  | encode_target  |
-    +------------+----------------+
-    | 'PVT'      | encode_PVT     |
-    +------------+----------------+
+    +-------------------+---------------------+
+    | Key               | Method              |
+    +===================+=====================+
+    | 'spectra'         | get_spectra         |
+    +-------------------+---------------------+
+    | 'layers'          | get_layers          |
+    +-------------------+---------------------+
+    | 'layers_expected' | get_layers_expected |
+    +-------------------+---------------------+
+    | 'targets'         | encode_target       |
+    +-------------------+---------------------+
+    | 'PVT'             | encode_PVT          |
+    +-------------------+---------------------+
 
+    Quantized observations cut their memory (ex. in a replay buffer) by 4x. The precision loss of each component is:
+
+    +-------------------+---------------------------------------------------------------------------------+
+    | Key               | Error after :func:`dequantize`                                                  |
+    +===================+=================================================================================+
+    | 'spectra'         | at most 1/510 (~0.002) per pixel                                                |
+    +-------------------+---------------------------------------------------------------------------------+
+    | 'layers'          | at most 1/510 per pixel; the solvent colors stay distinct if they differ by     |
+    |                   | more than 1/255                                                                 |
+    +-------------------+---------------------------------------------------------------------------------+
+    | 'layers_expected' | at most 1/510 per pixel                                                         |
+    +-------------------+---------------------------------------------------------------------------------+
+    | 'targets'         | none (the one-hot encoding is exact)                                            |
+    +-------------------+---------------------------------------------------------------------------------+
+    | 'PVT'             | at most 1/510, i.e. ~2K in temperature and ~0.2% of the vessel volume           |
+    +-------------------+---------------------------------------------------------------------------------+
 
     """
 
-    def __init__(self, observation_list,targets,n_vessels):
+    def __init__(self, observation_list,targets,n_vessels,dtype=np.float32):
 
         # specify the analysis techniques available in this bench
         self.params = {'spectra': {'range_ir': (2000, 20000)}}
@@ -66,6 +113,7 @@ class CharacterizationBench:
         self.sizes=dict(
             spectra=200,
             layers=100,
+            layers_expected=100,
             targets=len(targets),
             PVT = 3
         )
@@ -74,6 +122,7 @@ class CharacterizationBench:
         self.characterization_tech = dict(
             spectra=self.get_spectra,
             layers=self.get_layers,
+            layers_expected=self.get_layers_expected,
             targets=self.encode_target,
             PVT=self.encode_PVT
         )
@@ -86,6 +135,9 @@ class CharacterizationBench:
         n_pixels=sum(self.sizes[a] for a in observation_list)
         self.observation_shape=(n_vessels*n_pixels,)
         self.state_s = (n_vessels,n_pixels)
+        self.dtype = np.dtype(dtype)
+        if not self.dtype in (np.float32, np.uint8):
+            raise ValueError(f"Observations can be float32 or uint8, not {self.dtype}")
 
     def get_observation(self, vessels: vessel.Vessel, target: str):
         """
@@ -98,10 +150,15 @@ class CharacterizationBench:
         """
         self.target=target
         state=np.zeros(self.state_s,dtype=np.float32)
+        # Integrate any time the vessels have pending before observing them
+        vessel.sync_all(vessels[:self.n_vessels])
         for i,v in enumerate(vessels):
             if i>= self.n_vessels:break
             state[i] = np.concatenate([f(v) for f in self.functions])
-        return np.clip(state.flatten(),0,1)
+        state = np.clip(state.flatten(),0,1)
+        if self.dtype == np.uint8:
+            return quantize(state)
+        return state
 
     def __call__(self, vessels, target):
         return self.get_observation(vessels, target)
@@ -153,6 +210,32 @@ class CharacterizationBench:
             np.array: a 1D array of vessel layer information"""
         return vessel.get_layers()
 
+    def get_layers_expected(self, vessel: vessel.Vessel):
+        """
+        Returns:
+            np.array: a 1D array of the expected color of each vessel layer (a noise-free version of get_layers)
+        """
+        return separate.expected_layers(*vessel.get_layer_distribution())
+
+    @staticmethod
+    def get_layers_expected_batch(vessels: Tuple[vessel.Vessel]):
+        """
+        Computes the expected layer observation of many vessels (ex. the working vessels of several benches) at once.
+
+        Args:
+            vessels (Tuple[Vessel]): The vessels to observe
+        Returns:
+            np.array: a [len(vessels), 100] array with the expected color of each layer of each vessel
+        """
+        distributions = [v.get_layer_distribution() for v in vessels]
+        n_layers = max(len(d[0]) for d in distributions)
+        # Pad with empty layers, which are ignored
+        A, B, C, colors = np.zeros((4, len(vessels), n_layers), dtype=np.float32)
+        for i, d in enumerate(distributions):
+            k = len(d[0])
+            A[i, :k], B[i, :k], C[i, :k], colors[i, :k] = d
+        return separate.expected_layers(A, B, C, colors)
+
     def encode_PVT(self,vessel: vessel.Vessel):
         """
         Returns:
@@ -13,15 +13,19 @@ from chemistrylab.util.reward import RewardGenerator
 from chemistrylab import material, vessel
 from chemistrylab.benches.general_bench import *
 from chemistrylab.reactions.reaction_info import ReactInfo, REACTION_PATH
+from chemistrylab.reactions.reaction import load_reaction
 import importlib
-from chemistrylab.lab.shelf import VariableShelf
+from chemistrylab.lab.shelf import VariableShelf, VesselBank
 
-def wurtz_vessel(add_mat):
+def wurtz_vessel(add_mat, add_second = None, rng = None):
     """
     Function to generate an input vessel for the wurtz distillation experiment.
 
     Args:
         add_mat (str): The target material to include in the vessel
+        add_second (Optional[bool]): Whether to also add NaCl (or dodecane if the target is NaCl). This is
+            chosen randomly if None.
+        rng (Optional[np.random.Generator]): Generator for the random choices (np.random's global state if None)
 
     Returns:
         Vessel: A vessel containing add_mat and some undesired materials
@@ -44,9 +48,10 @@ def wurtz_vessel(add_mat):
         'NaCl': material.NaCl
     }
 
+    rng = np.random if rng is None else rng
     try:
         if add_mat == "":
-            add_mat = choice(list(products.keys()))
+            add_mat = str(rng.choice(list(products.keys())))
         
         add_material = products[add_mat]()
     
@@ -66,7 +71,9 @@ def wurtz_vessel(add_mat):
         add_material.get_name(): add_material
     }
 
-    if np.random.choice([0, 1]) > 0.5:
+    if add_second is None:
+        add_second = rng.choice([0, 1]) > 0.5
+    if add_second:
         add_material2 = material.Dodecane() if (add_mat == 'NaCl') else material.NaCl()
         add_material2.mol=1
         material_dict[add_material2.get_name()] = add_material2
@@ -94,13 +101,13 @@ class GeneralWurtzDistill_v2(GenBench):
         "render_fps": 10,
     }
 
-    def __init__(self):
+    def __init__(self, obs_dtype=np.float32):
         d_rew= RewardGenerator(use_purity=True,exclude_solvents=False,include_dissolved=True)
         shelf = VariableShelf( [
-            lambda x:wurtz_vessel(x)[0],
+            VesselBank(lambda x, salt:wurtz_vessel(x, salt)[0], variants = [False, True]),
             lambda x:vessel.Vessel("Beaker 1"),
             lambda x:vessel.Vessel("Beaker 2"),
-        ],[], n_working = 3)
+        ],[], n_working = 3, bank = True)
 
         amounts=np.linspace(0,1,10).reshape([10,1])
         
@@ -132,9 +139,9 @@ class GeneralWurtzDistill_v2(GenBench):
             "NaCl"
         ]
 
-        react_info = ReactInfo.from_json(REACTION_PATH+"/precipitation.json")
+        compiled = load_reaction(REACTION_PATH+"/precipitation.json")
 
-        reaction = Reaction(react_info)
+        reaction = Reaction(compiled)
         reaction.solver="newton"
         reaction.newton_steps=100
         
@@ -145,6 +152,7 @@ class GeneralWurtzDistill_v2(GenBench):
             targets=targets,
             default_events = (Event("react", (reaction,), None),),
             reward_function=d_rew,
+            obs_dtype=obs_dtype
         )
 
 
@@ -159,13 +167,13 @@ class WurtzDistillDemo_v0(GenBench):
         "render_fps": 60,
     }
 
-    def __init__(self):
+    def __init__(self, obs_dtype=np.float32):
         d_rew= RewardGenerator(use_purity=True,exclude_solvents=False,include_dissolved=True)
         shelf = VariableShelf( [
-            lambda x:wurtz_vessel(x)[0],
+            VesselBank(lambda x, salt:wurtz_vessel(x, salt)[0], variants = [False, True]),
             lambda x:vessel.Vessel("Beaker 1"),
             lambda x:vessel.Vessel("Beaker 2"),
-        ],[], n_working = 3)
+        ],[], n_working = 3, bank = True)
 
         amounts=np.ones([1,1])*0.02
         
@@ -192,8 +200,8 @@ class WurtzDistillDemo_v0(GenBench):
             "NaCl"
         ]
 
-        react_info = ReactInfo.from_json(REACTION_PATH+"/precipitation.json")
-        reaction = Reaction(react_info)
+        compiled = load_reaction(REACTION_PATH+"/precipitation.json")
+        reaction = Reaction(compiled)
         reaction.solver="newton"
         reaction.newton_steps=100
 
@@ -204,7 +212,8 @@ class WurtzDistillDemo_v0(GenBench):
             targets=targets,
             default_events = (Event("react", (reaction,), None),),
             reward_function=d_rew,
-            max_steps=500
+            max_steps=500,
+            obs_dtype=obs_dtype
         )
 
 
@@ -5,7 +5,6 @@
 import os
 import pickle
 import sys
-from random import choice
 from copy import deepcopy
 
 from chemistrylab.util.reward import RewardGenerator
@@ -15,15 +14,17 @@ from chemistrylab.benches.general_bench import *
 import importlib
 
 from chemistrylab.reactions.reaction_info import ReactInfo, REACTION_PATH
+from chemistrylab.reactions.reaction import load_reaction
 from chemistrylab.lab.shelf import Shelf,VariableShelf
 
 
-def wurtz_vessel(add_mat=""):
+def wurtz_vessel(add_mat="", rng=None):
     """
     Function to generate an input vessel for the wurtz extraction bench.
 
     Args:
     - add_mat (str): The target material to include in the vessel
+    - rng (Optional[np.random.Generator]): Generator used to choose add_mat if it is "" (np.random's global state if None)
 
     Returns:
     - extract_vessel (Vessel): A vessel containing add_mat and some undesired materials
@@ -62,9 +63,10 @@ def wurtz_vessel(add_mat=""):
         '4,5-diethyloctane': material.FourFiveDiethyloctane,
         'NaCl': material.NaCl
     }
+    rng = np.random if rng is None else rng
     try:
         if add_mat == "":
-            add_mat = choice(list(products.keys()))
+            add_mat = str(rng.choice(list(products.keys())))
         
         if add_mat != "NaCl":
             add_material = products[add_mat]()
@@ -154,7 +156,7 @@ class GeneralWurtzExtract_v2(GenBench):
         "render_fps": 10,
     }
 
-    def __init__(self):
+    def __init__(self, obs_dtype=np.float32):
         e_rew= RewardGenerator(use_purity=True,exclude_solvents=True,include_dissolved=True)
         shelf = VariableShelf( [
             lambda x:wurtz_vessel(x)[0],
@@ -162,7 +164,7 @@ class GeneralWurtzExtract_v2(GenBench):
             lambda x:vessel.Vessel("Beaker 2"),
             lambda x:make_solvent("C6H14"),
             lambda x:make_solvent("diethyl ether")
-        ],[], n_working = 3)
+        ],[], n_working = 3, bank = True)
         amounts=np.linspace(0.2,1,5).reshape([5,1])
         pixels = (amounts*10).astype(np.int32)
         actions = [
@@ -178,14 +180,15 @@ class GeneralWurtzExtract_v2(GenBench):
             Action([0], [[0]],               'mix',           None, 0,    True)
         ]
         
-        targets = ReactInfo.from_json(REACTION_PATH+"/chloro_wurtz.json").PRODUCTS
+        targets = load_reaction(REACTION_PATH+"/chloro_wurtz.json").react_info.PRODUCTS
 
         super(GeneralWurtzExtract_v2, self).__init__(
             shelf,
             actions,
             ["layers","targets"],
             targets,
-            reward_function=e_rew
+            reward_function=e_rew,
+            obs_dtype=obs_dtype
         )
 
 
@@ -198,7 +201,7 @@ class WaterOilExtract_v0(GenBench):
         "render_fps": 10,
     }
 
-    def __init__(self):
+    def __init__(self, obs_dtype=np.float32):
         e_rew= RewardGenerator(use_purity=False, exclude_solvents=True, include_dissolved=True, exclude_mat="C6H14")
         shelf =VariableShelf( [
             lambda x:oil_vessel(),
@@ -206,7 +209,7 @@ class WaterOilExtract_v0(GenBench):
             lambda x:vessel.Vessel("Waste Vessel"),
             lambda x:make_solvent("C6H14"),
             lambda x:make_solvent("H2O")
-        ], [], n_working = 2)
+        ], [], n_working = 2, bank = True)
         amounts=np.linspace(0.2,1,5).reshape([5,1])
         pixels = (amounts*10).astype(np.int32)
         actions = [
@@ -229,6 +232,7 @@ class WaterOilExtract_v0(GenBench):
             ["layers","targets"],
             targets=["NaCl"],
             reward_function=e_rew,
+            obs_dtype=obs_dtype
         )
 
 
@@ -245,7 +249,7 @@ class WurtzExtractDemo_v0(GenBench):
     }
 
 
-    def __init__(self):
+    def __init__(self, obs_dtype=np.float32):
         e_rew= RewardGenerator(use_purity=True,exclude_solvents=True,include_dissolved=True)
         shelf = VariableShelf( [
             lambda x:wurtz_vessel(x)[0],
@@ -253,7 +257,7 @@ class WurtzExtractDemo_v0(GenBench):
             lambda x:vessel.Vessel("Beaker 2"),
             lambda x:make_solvent("C6H14"),
             lambda x:make_solvent("diethyl ether")
-        ],[], n_working = 3)
+        ],[], n_working = 3, bank = True)
         amounts=np.ones([1,1])*0.02
         pixels = [[1]]
         actions = [
@@ -268,7 +272,7 @@ class WurtzExtractDemo_v0(GenBench):
             Action([0], [[0]],               'mix',           None, 0,    True)
         ]
         
-        targets = ReactInfo.from_json(REACTION_PATH+"/chloro_wurtz.json").PRODUCTS
+        targets = load_reaction(REACTION_PATH+"/chloro_wurtz.json").react_info.PRODUCTS
 
         super(WurtzExtractDemo_v0, self).__init__(
             shelf,
@@ -276,7 +280,8 @@ class WurtzExtractDemo_v0(GenBench):
             ["layers","targets"],
             targets,
             reward_function=e_rew,
-            max_steps=500
+            max_steps=500,
+            obs_dtype=obs_dtype
         )
 
     def get_keys_to_action(self):
@@ -295,7 +300,7 @@ class SeparateTest_v0(GenBench):
         "render_fps": 60,
     }
     
-    def __init__(self):
+    def __init__(self, obs_dtype=np.float32):
         e_rew= RewardGenerator(use_purity=True,exclude_solvents=True,include_dissolved=True)
         shelf = VariableShelf( [
             lambda x:wurtz_vessel(x)[0],
@@ -306,7 +311,7 @@ class SeparateTest_v0(GenBench):
             lambda x:make_solvent("H2O"),
             lambda x:make_solvent("ethoxyethane"),
             lambda x:make_solvent("ethyl acetate"),
-        ],[], n_working = 3)
+        ],[], n_working = 3, bank = True)
         amounts=np.ones([1,1])*0.02
         pixels = [[1]]
         actions = [
@@ -324,7 +329,7 @@ class SeparateTest_v0(GenBench):
             Action([0], [[0]],               'mix',           None, 0,    True)
         ]
         
-        targets = ReactInfo.from_json(REACTION_PATH+"/chloro_wurtz.json").PRODUCTS
+        targets = load_reaction(REACTION_PATH+"/chloro_wurtz.json").react_info.PRODUCTS
 
         super(SeparateTest_v0, self).__init__(
             shelf,
@@ -332,5 +337,6 @@ class SeparateTest_v0(GenBench):
             ["layers","targets"],
             targets,
             reward_function=e_rew,
-            max_steps=5000
+            max_steps=5000,
+            obs_dtype=obs_dtype
         )
\ No newline at end of file
@@ -2,6 +2,8 @@
 from typing import NamedTuple, Tuple, Callable, Optional
 import gymnasium as gym
 import numpy as np
+from concurrent.futures import Executor
+from copy import copy, deepcopy
 
 #Imports which need to go soon
 import sys
@@ -28,6 +30,23 @@ class ContinuousParam(NamedTuple):
     thresh: float
     other: tuple
 
+class PreparedReset(NamedTuple):
+    target: str
+    vessels: list
+    initial_reward: float
+    observation: np.ndarray
+
+PreparedReset.vessels.__doc__ = "The vessels of the reset shelf"
+
+class CompiledAction(NamedTuple):
+    events: Tuple[tuple]
+    idle: Tuple[int]
+    dt: float
+    terminal: bool
+
+CompiledAction.events.__doc__ = "(slot, event function, other slot or None, parameter) for each event, referring to shelf slots"
+CompiledAction.idle.__doc__ = "Working vessel slots which are not involved in the action"
+
 def default_reward(vessels,targ):
     sum_=0
     for vessel in vessels:
@@ -54,6 +73,8 @@ class GenBench(gym.Env):
         reward_function (Callable): A function which accepts a target and a list of vessels and outputs a reward.
         discrete (bool): set to True for a discrete action space and False for a continuous one
         max_steps (int): Maximum number of steps for an episode
+        obs_dtype (np.dtype): np.float32 for observations in [0,1], or np.uint8 for quantized observations in [0,255]
+            (see :class:`~chemistrylab.benches.characterization_bench.CharacterizationBench`)
 
     """
     def __init__(
@@ -66,6 +87,7 @@ class GenBench(gym.Env):
         reward_function: Callable = default_reward,
         discrete=True,
         max_steps=50,
+        obs_dtype=np.float32,
     ):
         
                 
@@ -86,8 +108,9 @@ class GenBench(gym.Env):
 
         
         #Set up observation and action space
-        self.characterization_bench =  CharacterizationBench(observation_list,self.targets,self.shelf.n_working)
-        self.observation_space = gym.spaces.Box(0,1,self.characterization_bench.observation_shape, dtype=np.float32)
+        self.characterization_bench =  CharacterizationBench(observation_list,self.targets,self.shelf.n_working,obs_dtype)
+        high = 255 if self.characterization_bench.dtype == np.uint8 else 1
+        self.observation_space = gym.spaces.Box(0,high,self.characterization_bench.observation_shape, dtype=obs_dtype)
         
         # Rendering
         self.render_mode = "rgb_array"
@@ -102,13 +125,27 @@ class GenBench(gym.Env):
         
         self.disincentive = -0.1
 
+        # Used by prefetched resets (see prepare_reset)
+        self._next_reset = None
+        self._reset_observer = None
+
+        self.compile_actions()
         self.reset()
         
     def get_vessels(self):
         return self.shelf
-    def update_vessels(self,new_vessels):
-        # TODO: Implement this
-        raise NotImplementedError
+    def update_vessels(self, new_vessels, target: Optional[str] = None):
+        """
+        Starts a new episode with the given vessels in the first shelf slots, in place of the starting vessels the
+        bench would make. This is the same as ``reset(options=dict(vessels=new_vessels, target=target))``.
+
+        Args:
+            new_vessels (List[Vessel]): The vessels to work with
+            target (Optional[str]): The target material (chosen randomly if None)
+        Returns:
+            np.ndarray: The first observation of the episode
+        """
+        return self.reset(options=dict(vessels=new_vessels, target=target))[0]
         
     def build_event(self,action,param):
         """
@@ -129,6 +166,44 @@ class GenBench(gym.Env):
         
         #I may change this in the future to remove support for an action to span multiple vessel pairs
         return [(v,Event(action.event_name,param,other_vessels[i])) for i,v in enumerate(action.vessels)]
+
+    @property
+    def actions(self):
+        """List of (events, action) tuples with events bound to the vessels currently on the shelf (see :meth:`build_event`)"""
+        return [(self.build_event(a,p),a)  for a in self.action_list for p in a.parameters]
+
+    def compile_actions(self):
+        """
+        Compiles the action list into a list of :class:`CompiledAction` (one for each action index). These refer to shelf slots
+        rather than vessels, so they stay valid when the shelf is reset. For continuous action spaces, the bounds of each
+        :class:`ContinuousParam` are also gathered into arrays so all action dimensions can be rescaled at once.
+        """
+        self._compiled = []
+        for a in self.action_list:
+            other_slots = [None]*len(a.vessels) if a.affected_vessels is None else a.affected_vessels
+            for p in a.parameters:
+                events = tuple((v, type(self.shelf[v])._event_dict[a.event_name], other_slots[i], p) for i,v in enumerate(a.vessels))
+                idle = tuple(v for v in range(self.shelf.n_working) if not v in a.vessels)
+                self._compiled.append(CompiledAction(events, idle, a.dt, a.terminal))
+        if not self.discrete:
+            params = [p for a in self.action_list for p in a.parameters]
+            self._min_val = np.array([p.min_val for p in params], dtype=np.float64)
+            self._val_range = np.array([p.max_val-p.min_val for p in params], dtype=np.float64)
+            self._thresh = np.array([p.thresh for p in params], dtype=np.float64)
+
+    def _run_event(self, slot, func, other_slot, parameter, dt):
+        """Performs a single compiled event on the vessel in the given shelf slot, then updates its layers."""
+        vessel = self.shelf[slot]
+        other_vessel = None if other_slot is None else self.shelf[other_slot]
+        vessel._touch()
+        if other_vessel is not None:
+            other_vessel._touch()
+        status = func(vessel, dt, other_vessel, *parameter)
+        if not vessel.ignore_layout:
+            vessel._mix_and_update_layers(dt)
+        vessel.clock += dt
+        vessel.time = vessel.clock
+        return status
     
     def _perform_continuous_action(self,action):
         """
@@ -136,77 +211,70 @@ class GenBench(gym.Env):
         
         Here, event parameters follow the ContinuousParam format. 
         In this implementation all actions are performed with dt=0, then afterwards
-        all visible vessels are given an empty event with dt=0.01. 
+        all visible vessels are advanced by dt=0.01 (see :meth:`~chemistrylab.vessel.Vessel.advance`).
         (May create a variable to replace 0.01)
 
         Returns:
             done (bool): Whether or not the episode is done.
             reward (bool): A reward associated with taking the action  (unused).
         """
-        for i,(events,_action) in enumerate(self.actions):
-            val=action[i]
+        action = np.asarray(action)
+        # move the actions in [0,1] to [min_val,max_val]
+        active = action > self._thresh
+        rescaled = action*active*self._val_range+self._min_val
+        for i,compiled in enumerate(self._compiled):
             #handling any end of episode actions
-            if _action.terminal and (val>events[0][1].parameter.thresh):
+            if compiled.terminal and active[i]:
                 return True, 0
-            
             #update the involved vessels
-            for v,event in events:
-                # move the action in [0,1] to [min_val,max_val]
-                min_val, max_val, thresh, other = event.parameter
-                activ=val*(val>thresh)
-                rescaled = activ*(max_val-min_val)+min_val
-                #create a new event with this
-                param=(rescaled,*other)
-                derived_event = Event(event.name,param,event.other_vessel)
-                #perform the new event
-                self.shelf[v].push_event_to_queue(events=[derived_event], dt=0.0)
+            for v, func, other, param in compiled.events:
+                self._run_event(v, func, other, (rescaled[i],*param.other), 0.0)
         #all vessels which appear in the observation space are updated
         for vessel in self.shelf.get_working_vessels():
-            vessel.push_event_to_queue(dt=0.01)
+            vessel.advance(0.01)
         return False, 0
     def _perform_discrete_action(self,action):
         """
         Action should be an integer.
         Here, the chosen action is perfomed on all relevant vessels, then all
-        other visible vessels are fed an empty event with the same dt.
+        other visible vessels are advanced by the same dt (their settling is integrated lazily).
 
         Returns:
             done (bool): Whether or not the episode is done.
             reward (bool): A reward associated with taking the action (ex if it causes a spill you may get a reward of -0.1).
         """
         reward = 0
-        events,_action = self.actions[action]
-        updated=set()
+        compiled = self._compiled[action]
         #update the involved vessels
-        for v,event in events:
-            updated.add(v)
-            #going to hard-code dt for now
-            feedback = self.shelf[v].push_event_to_queue(events=[event], dt=_action.dt)
-            reward += sum(self.disincentive for code in feedback if code==-1)
+        for v, func, other, param in compiled.events:
+            if self._run_event(v, func, other, param, compiled.dt) == -1:
+                reward += self.disincentive
         #all uninvolved vessels which appear in the observation space
-        for v in range(self.shelf.n_working):
-            if not v in updated:
-                self.shelf[v].push_event_to_queue(dt=_action.dt)
-        return _action.terminal,reward
+        for v in compiled.idle:
+            self.shelf[v].advance(compiled.dt)
+        return compiled.terminal,reward
     
-    def step(self,action):
+    def _advance(self,action):
         """
-        Here, actions are performed by '_perform_discrete_action' or '_perform_continuous_action'. Afterwards, all vessels in
-        react_list have their concentrations updated by a reaction (specified in __init__). Finally, a CharacterizationBench
-        is used to generate an observation, and a reward function provides a reward (if a terminal state was reached).
-        
+        Performs an action followed by the default events, and increments the step counter.
+        No observation is made.
+
         Args:
             action (int or 1D array): The action to be performed
+
+        Returns:
+            done (bool): Whether or not the episode is done.
+            reward (float): The reward obtained from this step.
         """
         if self.discrete:
             done,reward = self._perform_discrete_action(action)
         else:
             done,reward = self._perform_continuous_action(action)
             
-        #perform any default events
+        #defer any default events (they run over the time each vessel has pending when it is next touched or observed)
         if self.default_events:
           for vessel in self.shelf.get_working_vessels():
-            vessel.push_event_to_queue(self.default_events, update_layers=False)
+            vessel.advance(0, self.default_events, vessel.default_dt, update_layers=False)
             
         #Increment the step counter and check if you are done
         self.steps+=1
@@ -214,30 +282,173 @@ class GenBench(gym.Env):
         
         #Handle reward
         if done:
-            reward += self.reward_function(self.shelf.get_working_vessels(),self.target_material)-self.initial_reward
+            reward += self.reward_function(self._synced_working_vessels(),self.target_material)-self.initial_reward
+        return done, reward
+
+    def _synced_working_vessels(self):
+        """Returns the working vessels after integrating any time they have pending (see :func:`~chemistrylab.vessel.sync_all`)"""
+        vessels = self.shelf.get_working_vessels()
+        vessel.sync_all(vessels)
+        return vessels
+
+    def step(self,action):
+        """
+        Here, actions are performed by '_perform_discrete_action' or '_perform_continuous_action'. Afterwards, all vessels in
+        react_list have their concentrations updated by a reaction (specified in __init__). Finally, a CharacterizationBench
+        is used to generate an observation, and a reward function provides a reward (if a terminal state was reached).
+        
+        Args:
+            action (int or 1D array): The action to be performed
+        """
+        done,reward = self._advance(action)
         
         #gather observations
         state=self.characterization_bench(self.shelf.get_working_vessels(),self.target_material)
         
         return state, reward, done, False, {}
+
+    def step_many(self, actions, repeat: int = 1):
+        """
+        Performs a sequence of actions (or a single action repeated) without making any intermediate observations.
+        Rewards are accumulated and an observation is only made at the end (or as soon as the episode is done).
+
+        Args:
+            actions: Either a single action, or a sequence of actions (anything with one more dimension than a single action,
+                ex. a list of actions or a 2D array of continuous actions).
+            repeat (int): The number of times each action is repeated.
+
+        Returns:
+            Tuple[np.ndarray, float, bool, bool, dict]: The same as :meth:`step`, where the reward is the sum over all sub-steps,
+            and the info dictionary holds the number of sub-steps performed under "n_steps".
+        """
+        if np.ndim(actions) != (1 if self.discrete else 2):
+            actions = [actions]
+        total = 0
+        n = 0
+        done = False
+        for action in actions:
+            for _ in range(repeat):
+                done,reward = self._advance(action)
+                total += reward
+                n += 1
+                if done:
+                    break
+            if done:
+                break
+        state=self.characterization_bench(self.shelf.get_working_vessels(),self.target_material)
+        return state, total, done, False, {"n_steps": n}
     
     def _reset(self,target):
-        self.steps=0
-        self.shelf.reset(target)
-        self.target_material=target
-        #Rebuild the list of actions with the new vessels
-        self.actions = [(self.build_event(a,p),a)  for a in self.action_list for p in a.parameters]
+        return self.apply_reset(self._prepare_reset(target, self._reset_shelf(target), self.characterization_bench))
+
+    def _reset_shelf(self, target):
+        """
+        Returns a reset copy of the shelf (without changing the current one).
+
+        The episode gets its own generator, seeded from the bench's np_random, so the simulation (which draws from it
+        while stepping) never shares a stream with resets being prepared in the background.
+        """
+        shelf = copy(self.shelf)
+        shelf.reset(target, np.random.default_rng(self.np_random.integers(2**63)))
+        return shelf
+
+    @staticmethod
+    def _place_vessels(shelf, vessels):
+        """
+        Puts vessels in the first slots of a reset shelf. Each one takes the layout setting of the vessel it replaces,
+        and the episode's generator.
+        """
+        assert len(vessels) <= len(shelf), "More vessels were given than the bench has slots for"
+        for i, v in enumerate(vessels):
+            old = shelf.vessels[i]
+            v.ignore_layout = old.ignore_layout
+            v.rng = old.rng
+            shelf.vessels[i] = v
+
+    def _prepare_reset(self, target, shelf, characterization_bench):
+        vessels = shelf.get_working_vessels()
         #Gather the initial reward using a provided reward function
-        self.initial_reward = self.reward_function(self.shelf.get_working_vessels(), self.target_material)
-        
-        return self.characterization_bench(self.shelf.get_working_vessels(), self.target_material)
-    
+        initial_reward = self.reward_function(vessels, target)
+        return PreparedReset(target, shelf.vessels, initial_reward, characterization_bench(vessels, target))
+
+    def prepare_reset(self, target: Optional[str] = None) -> "PreparedReset":
+        """
+        Makes the start of a new episode (the reset shelf, initial reward and first observation) without changing
+        the bench. This is safe to call from another thread while the bench is being stepped.
+
+        Args:
+            target (Optional[str]): The target material (chosen randomly if None)
+        Returns:
+            PreparedReset: The new episode, which can be started with :meth:`apply_reset`
+        """
+        if target is None:
+            target = self.np_random.choice(self.targets)
+        shelf = self._reset_shelf(target)
+        # The characterization bench stores the target while observing, so a separate one is used
+        if self._reset_observer is None:
+            self._reset_observer = deepcopy(self.characterization_bench)
+        return self._prepare_reset(target, shelf, self._reset_observer)
+
+    def apply_reset(self, prepared: "PreparedReset"):
+        """
+        Starts the episode made by :meth:`prepare_reset`.
+
+        Returns:
+            np.ndarray: The first observation of the episode
+        """
+        self.steps=0
+        self.shelf.vessels = prepared.vessels
+        self.target_material = prepared.target
+        self.initial_reward = prepared.initial_reward
+        return prepared.observation
+
+    def prefetch_reset(self, executor: Executor):
+        """
+        Starts preparing the next episode in the background. The next reset without a seed or options then
+        starts this episode instead of making a new one.
+
+        Args:
+            executor (Executor): The executor to run :meth:`prepare_reset` in
+        """
+        self._wait_for_reset()
+        self._next_reset = executor.submit(self.prepare_reset)
+
+    def _wait_for_reset(self):
+        """Waits for (and takes) the episode being prepared in the background, if there is one"""
+        future, self._next_reset = self._next_reset, None
+        return None if future is None else future.result()
+
     def reset(self, *args, seed=None, options=None):
+        """
+        Starts a new episode.
+
+        Args:
+            seed (Optional[int]): Seed for the bench's random number generators
+            options (Optional[dict]): May contain a "target" material, and a list of "vessels" which are placed in
+                the first shelf slots instead of the bench's starting vessels (see :meth:`update_vessels`)
+        """
+        prepared = self._wait_for_reset()
+        if prepared is not None and seed is None and not options:
+            return self.apply_reset(prepared),{}
+
+        super().reset(seed=seed)
+        if seed is not None:
+            self.action_space.seed(seed)
+        options = options or dict()
+        target = options.get("target")
+        if target is None:
+            target=self.np_random.choice(self.targets)
+        elif not target in self.targets:
+            raise ValueError(f"{target} is not a target of this bench")
+        shelf = self._reset_shelf(target)
+        self._place_vessels(shelf, options.get("vessels", ()))
+        return self.apply_reset(self._prepare_reset(target, shelf, self.characterization_bench)),{}
 
-        np.random.seed(seed)
-        self.action_space.seed(seed)
-        target=np.random.choice(self.targets)
-        return self._reset(target),{}
+    def __getstate__(self):
+        # Episodes being prepared in the background are not copied
+        state = self.__dict__.copy()
+        state["_next_reset"] = None
+        return state
         
     def render(self):
-        return self.visual.get_rgb(self.shelf.get_working_vessels())
\ No newline at end of file
+        return self.visual.get_rgb(self._synced_working_vessels())
\ No newline at end of file
@@ -5,10 +5,12 @@
 import os
 import sys
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from chemistrylab.util.reward import RewardGenerator
 from chemistrylab import material, vessel
 from chemistrylab.benches.general_bench import *
 from chemistrylab.reactions.reaction_info import ReactInfo, REACTION_PATH
+from chemistrylab.reactions.reaction import load_reaction
 from chemistrylab.lab.shelf import Shelf
 
 def get_mat(mat,amount,name=None):
@@ -41,7 +43,7 @@ class GeneralWurtzReact_v2(GenBench):
         "render_modes": ["rgb_array"],
         "render_fps": 10,
     }
-    def __init__(self):
+    def __init__(self, obs_dtype=np.float32):
         r_rew = RewardGenerator(use_purity=False,exclude_solvents=False,include_dissolved=False)
         shelf = Shelf([
             get_mat("diethyl ether",4,"Reaction Vessel"),
@@ -58,17 +60,18 @@ class GeneralWurtzReact_v2(GenBench):
             Action([4],    [ContinuousParam(0,1,1e-3,())],      'pour by percent',  [0],   0.01,   False),
         ]
 
-        react_info = ReactInfo.from_json(REACTION_PATH+"/chloro_wurtz.json")
+        compiled = load_reaction(REACTION_PATH+"/chloro_wurtz.json")
         
         super(GeneralWurtzReact_v2, self).__init__(
             shelf,
             actions,
             ["PVT","spectra","targets"],
-            targets=react_info.PRODUCTS,
-            default_events = (Event("react", (Reaction(react_info),), None),),
+            targets=compiled.react_info.PRODUCTS,
+            default_events = (Event("react", (Reaction(compiled),), None),),
             reward_function=r_rew,
             discrete=False,
-            max_steps=20
+            max_steps=20,
+            obs_dtype=obs_dtype
         )
         
 class GeneralWurtzReact_v0(GenBench):
@@ -79,7 +82,7 @@ class GeneralWurtzReact_v0(GenBench):
         "render_modes": ["rgb_array"],
         "render_fps": 10,
     }
-    def __init__(self):
+    def __init__(self, obs_dtype=np.float32):
         r_rew = RewardGenerator(use_purity=False,exclude_solvents=False,include_dissolved=False)
         shelf = Shelf([
             get_mat("diethyl ether",4,"Reaction Vessel"),
@@ -96,17 +99,18 @@ class GeneralWurtzReact_v0(GenBench):
             Action([4],    [ContinuousParam(0,1,1e-3,())],      'pour by percent',  [0],   0.01,   False),
         ]
 
-        react_info = ReactInfo.from_json(REACTION_PATH+"/chloro_wurtz.json")
+        compiled = load_reaction(REACTION_PATH+"/chloro_wurtz.json")
         
         super(GeneralWurtzReact_v0, self).__init__(
             shelf,
             actions,
             ["PVT","spectra","targets"],
-            targets=react_info.PRODUCTS[:-1],
-            default_events = (Event("react", (Reaction(react_info),), None),),
+            targets=compiled.react_info.PRODUCTS[:-1],
+            default_events = (Event("react", (Reaction(compiled),), None),),
             reward_function=r_rew,
             discrete=False,
-            max_steps=20
+            max_steps=20,
+            obs_dtype=obs_dtype
         )
 
 class FictReact_v2(GenBench):
@@ -119,7 +123,7 @@ class FictReact_v2(GenBench):
         "render_fps": 10,
     }
     
-    def __init__(self):
+    def __init__(self, obs_dtype=np.float32):
         r_rew = RewardGenerator(use_purity=False,exclude_solvents=False,
                                 include_dissolved=False, exclude_mat = "fict_E")
         shelf = Shelf([
@@ -139,17 +143,18 @@ class FictReact_v2(GenBench):
         ]
         
         targets = ["fict_E", "fict_F", "fict_G", "fict_H", "fict_I"]
-        react_info = ReactInfo.from_json(REACTION_PATH+"/fict_react.json")
+        compiled = load_reaction(REACTION_PATH+"/fict_react.json")
 
         super(FictReact_v2, self).__init__(
             shelf,
             actions,
             ["PVT","spectra","targets"],
             targets=targets,
-            default_events = (Event("react", (Reaction(react_info),), None),),
+            default_events = (Event("react", (Reaction(compiled),), None),),
             reward_function=r_rew,
             discrete=False,
-            max_steps=20
+            max_steps=20,
+            obs_dtype=obs_dtype
         )
         
 
@@ -158,7 +163,7 @@ class FictReactBandit_v0(GenBench):
     Class to define an environment which performs a Wurtz extraction on materials in a vessel.
     """
 
-    def __init__(self,targets=None):
+    def __init__(self,targets=None,obs_dtype=np.float32):
         r_rew = RewardGenerator(use_purity=False,exclude_solvents=False,
                                 include_dissolved=False, exclude_mat = "fict_E")
         shelf = Shelf([
@@ -178,17 +183,18 @@ class FictReactBandit_v0(GenBench):
         ]
         if targets is None:
             targets = ["fict_E", "fict_F", "fict_G", "fict_H", "fict_I"]
-        react_info = ReactInfo.from_json(REACTION_PATH+"/fict_react.json")
+        compiled = load_reaction(REACTION_PATH+"/fict_react.json")
 
         super().__init__(
             shelf,
             actions,
             ["targets"],
             targets=targets,
-            default_events = (Event("react", (Reaction(react_info),), None),),
+            default_events = (Event("react", (Reaction(compiled),), None),),
             reward_function=r_rew,
             discrete=False,
-            max_steps=20
+            max_steps=20,
+            obs_dtype=obs_dtype
         )
         self.action_space = gym.spaces.Box(0, 1, (self.n_actions+4,), dtype=np.float32)
 
@@ -198,13 +204,102 @@ class FictReactBandit_v0(GenBench):
         gate = action[-4:]*self.max_steps-0.5
         ret=0
         d=False
+        #only the final observation is needed
         while not d:
             act = uaction*1
             act[1:]*= (gate<self.steps)
-            o,r,d,*_ = super().step(act)
+            d,r = self._advance(act)
             gate[gate<self.steps-1]=self.max_steps
             ret+=r
-        return (o,ret,d,*_)
+        o = self.characterization_bench(self.shelf.get_working_vessels(),self.target_material)
+        return o, ret, d, False, {}
+
+    def schedule(self, actions):
+        """
+        Converts a batch of bandit actions into the actions the underlying bench performs at each step
+        (the same ones :meth:`step` performs).
+
+        Args:
+            actions (np.ndarray): An [N, D] array of bandit actions
+        Returns:
+            np.ndarray: An [N, max_steps, D-4] array where entry [i, t] is the action performed at step t for candidate i.
+        """
+        actions = np.asarray(actions)
+        uaction = actions[:, :-4]
+        gate = actions[:, -4:]*self.max_steps-0.5
+        #each pour happens once, on the first step after its gate
+        pour_step = np.maximum(np.floor(gate)+1, 0)
+        steps = np.arange(self.max_steps)
+        schedule = np.repeat(uaction[:, None, :], self.max_steps, axis=1)
+        schedule[:, :, 1:] *= (steps[None, :, None] == pour_step[:, None, :])
+        return schedule
+
+    def evaluate(self, actions, n_workers=None):
+        """
+        Scores a batch of bandit actions (ex. all candidates in one generation of a black-box optimizer).
+        Each candidate is run from the same reset vessels for the current target material, without making any
+        observations, and the reactions of all candidates are integrated together. The current episode is left untouched.
+
+        Args:
+            actions (np.ndarray): An [N, D] array of bandit actions
+            n_workers (Optional[int]): The number of processes to split the candidates between (defaults to the number of cpus).
+                With a single worker everything runs in the calling process.
+        Returns:
+            np.ndarray: The return of each of the N candidates
+        """
+        schedules = self.schedule(actions)
+        if n_workers is None:
+            n_workers = os.cpu_count()
+        n_workers = max(1, min(n_workers, len(schedules)))
+        if n_workers == 1:
+            return self._evaluate_schedules(schedules)
+        #workers get their own copy of this bench when they start
+        with ProcessPoolExecutor(n_workers, initializer=_set_worker_env, initargs=(self,)) as pool:
+            chunks = np.array_split(schedules, n_workers)
+            return np.concatenate(list(pool.map(_evaluate_chunk, chunks)))
+
+    def _evaluate_schedules(self, schedules):
+        """
+        Runs every [max_steps, D-4] schedule on its own copy of one reset shelf, and returns their returns.
+
+        The copies are stepped together: at each step the pending reactions of every copy the step touches are
+        integrated with one batched call (see :func:`~chemistrylab.vessel.sync_all`), so a candidate's return does
+        not depend on the other candidates (or the bench's random state).
+        """
+        base = copy(self.shelf)
+        base.reset(self.target_material, np.random.default_rng(0))
+        initial_reward = self.reward_function(base.get_working_vessels(), self.target_material)
+        shelves = [deepcopy(base.vessels) for _ in schedules]
+        returns = np.zeros(len(schedules))
+        saved = self.shelf.vessels
+        try:
+            for t in range(self.max_steps):
+                #every action involves the reaction vessel, which integrates its pending time when touched
+                touched = [v for shelf, act in zip(shelves, schedules[:, t]) if np.any(act > self._thresh) for v in shelf]
+                vessel.sync_all(touched)
+                for shelf, act in zip(shelves, schedules[:, t]):
+                    self.shelf.vessels = shelf
+                    self._perform_continuous_action(act)
+                    for v in shelf[:self.shelf.n_working]:
+                        v.advance(0, self.default_events, v.default_dt, update_layers=False)
+            working = [v for shelf in shelves for v in shelf[:self.shelf.n_working]]
+            vessel.sync_all(working)
+            for i, shelf in enumerate(shelves):
+                returns[i] = self.reward_function(shelf[:self.shelf.n_working], self.target_material)-initial_reward
+        finally:
+            self.shelf.vessels = saved
+        return returns
+
+_worker_env = None
+
+def _set_worker_env(env):
+    """Initializer for the worker processes of :meth:`FictReactBandit_v0.evaluate`"""
+    global _worker_env
+    _worker_env = env
+
+def _evaluate_chunk(schedules):
+    """Worker function for :meth:`FictReactBandit_v0.evaluate`"""
+    return _worker_env._evaluate_schedules(schedules)
 
 
 
@@ -218,7 +313,7 @@ class FictReactDemo_v0(GenBench):
         "render_fps": 60,
     }
 
-    def __init__(self):
+    def __init__(self, obs_dtype=np.float32):
         r_rew = RewardGenerator(use_purity=False,exclude_solvents=False,
                                 include_dissolved=False, exclude_mat = "fict_E")
 
@@ -241,17 +336,18 @@ class FictReactDemo_v0(GenBench):
         ]
         
         targets = ["fict_E", "fict_F", "fict_G", "fict_H", "fict_I"]
-        react_info = ReactInfo.from_json(REACTION_PATH+"/fict_react.json")
+        compiled = load_reaction(REACTION_PATH+"/fict_react.json")
 
         super(FictReactDemo_v0, self).__init__(
             shelf,
             actions,
             ["PVT","spectra","targets"],
             targets=targets,
-            default_events = (Event("react", (Reaction(react_info),), None),),
+            default_events = (Event("react", (Reaction(compiled),), None),),
             reward_function=r_rew,
             discrete=False,
-            max_steps=500
+            max_steps=500,
+            obs_dtype=obs_dtype
         )
         
     def get_keys_to_action(self):
@@ -17,9 +17,9 @@ x = np.linspace(0, 1, 100, endpoint=True, dtype=np.float32)
 #from numba.pycc import CC
 #cc = CC('separate_cc')
 
-@numba.jit(cache=True,nopython=True)
+@numba.jit(cache=True,nopython=True,nogil=True)
 #@cc.export('map_to_state', '(f4[:], f4[:],f4[:],f4[:],f4[:])')
-def map_to_state(A, B, C, colors, x=x):
+def map_to_state(A, B, C, colors, x=x, u=None):
     """
     Uses the position and variance of each solvent to stochastically create a layer-view of the vessel
     
@@ -28,6 +28,8 @@ def map_to_state(A, B, C, colors, x=x):
         B (np.ndarray): The current positions of the solvent layers in the vessel
         C (float): The current variance of the solvent layers in the vessel
         colors (np.ndarray): The color of each solvent
+        u (Optional[np.ndarray]): Uniform random numbers in [0,1), one for each of the 100 layer pixels. If None these are
+            drawn from numba's global random state.
 
     Returns:
         Tuple[np.ndarray]: 
@@ -48,6 +50,8 @@ def map_to_state(A, B, C, colors, x=x):
         iii. The distributions are more ballparks so you have to keep track of how many units you placed, and set the probability of the layer having a solvent to zero if all the units have already been placed
         iv. This also means you may not have placed all of your units by the time you are way outside the variance of your gaussian, so you should keep track of the lowest layer that still has units to place, and make sure those units are all placed once you start to go way past it.
     """
+    if u is None:
+        u = np.random.random(100)
     # Create a copy of B for temporary changes
     B1 = np.copy(B)
     
@@ -123,7 +127,7 @@ def map_to_state(A, B, C, colors, x=x):
         
 
         # Random number for mixing of layers
-        r = np.random.rand()
+        r = u[l]
         place_jmin = False
         #Below if part 5.iv
         # The current point has to be far to the RIGHT of the gaussian for it to have passed over
@@ -172,7 +176,94 @@ def map_to_state(A, B, C, colors, x=x):
     return L,L2
 
 
-@numba.jit(cache=True,nopython=True)
+@numba.jit(cache=True,nopython=True,nogil=True)
+def mix_and_map(v, Vprev, v_solute, B, C, C0, D, Spol, Lpol, S, mixing, colors, x=x, u=None):
+    """
+    Runs :func:`mix` followed by :func:`map_to_state` on the mixed layers, so a full layer update is one call
+    (and does not hold the GIL).
+
+    Args:
+        colors (np.ndarray): The color of each solvent
+        x (np.ndarray): The layer positions used by map_to_state
+        u (Optional[np.ndarray]): The random numbers used by map_to_state
+        *: See :func:`mix`
+
+    Returns:
+        Tuple[np.ndarray]: The outputs of :func:`mix` followed by the outputs of :func:`map_to_state`
+    """
+    B, v_layer, C, C0, S, var_layer = mix(v, Vprev, v_solute, B, C, C0, D, Spol, Lpol, S, mixing)
+    L, L2 = map_to_state(v_layer.astype(np.float32), B.astype(np.float32), var_layer.astype(np.float32), colors, x, u)
+    return B, v_layer, C, C0, S, var_layer, L, L2
+
+
+@numba.jit(cache=True,nopython=True,nogil=True)
+def _expected_layers(A, B, C, colors, x):
+    """
+    Kernel for :func:`expected_layers` on [n_vessels, n_solvents] arrays
+    """
+    L = np.zeros((A.shape[0], x.shape[0]), dtype=np.float32)
+    # Same cutoff as map_to_state (MINP)
+    log_minp = np.log(0.21626516683)
+    for i in range(A.shape[0]):
+        scale = 0.0
+        for j in range(A.shape[1]):
+            scale += max(A[i, j], 0.0)
+        for k in range(x.shape[0]):
+            X = x[k] * scale
+            total = 0.0
+            color = 0.0
+            max_log_p = -np.inf
+            for j in range(A.shape[1]):
+                if A[i, j] <= 0:
+                    continue
+                c = max(C[i, j], 1e-10)
+                z = -0.5 * ((X - B[i, j]) / c) ** 2
+                max_log_p = max(max_log_p, np.log(A[i, j] / c) + z)
+                if z > log_minp or X > B[i, j]:
+                    p = A[i, j] / c * np.exp(z)
+                    total += p
+                    color += p * colors[i, j]
+            if total <= 0 and max_log_p > -np.inf:
+                # Outside every clipped gaussian, so use the unclipped heights (in log space since they can underflow)
+                for j in range(A.shape[1]):
+                    if A[i, j] <= 0:
+                        continue
+                    c = max(C[i, j], 1e-10)
+                    p = np.exp(np.log(A[i, j] / c) - 0.5 * ((X - B[i, j]) / c) ** 2 - max_log_p)
+                    total += p
+                    color += p * colors[i, j]
+            if total > 0:
+                L[i, k] = color / total
+    return L
+
+def expected_layers(A, B, C, colors, x=x):
+    """
+    Deterministic counterpart to :func:`map_to_state`, giving the expected color of each layer pixel instead of a sample.
+
+    Each pixel is the average of the solvent colors weighted by the (clipped) gaussian heights map_to_state samples from.
+    Pixels outside every clipped gaussian fall back to the unclipped heights (so they take the color of the nearest solvent).
+
+    All arguments may have leading batch dimensions (ex. [n_vessels, n_solvents]). Solvents with no volume are ignored,
+    so vessels with fewer layers can be padded with zeros.
+
+    Args:
+        A (np.ndarray): The volume of each solvent
+        B (np.ndarray): The current positions of the solvent layers in the vessel
+        C (np.ndarray): The current variance of the solvent layers in the vessel
+        colors (np.ndarray): The color of each solvent
+        x (np.ndarray): The layer positions (fractions of the total volume)
+
+    Returns:
+        np.ndarray: The expected color at each layer position, with shape [..., len(x)]
+    """
+    A = np.asarray(A, dtype=np.float32)
+    shape = A.shape[:-1]
+    flat = lambda arr: np.ascontiguousarray(arr, dtype=np.float32).reshape(-1, A.shape[-1])
+    L = _expected_layers(flat(A), flat(B), flat(C), flat(colors), x)
+    return L.reshape(shape + x.shape)
+
+
+@numba.jit(cache=True,nopython=True,nogil=True)
 #@cc.export('mix', '(f4[:], f4[:], f4[:], f4[:], f4[:], f4, f4[:], f4[:], f4[:], f4[:,:],f4)')
 def mix(v, Vprev, v_solute, B, C, C0 , D, Spol, Lpol, S, mixing):
     """
@@ -408,10 +499,6 @@ def mix(v, Vprev, v_solute, B, C, C0 , D, Spol, Lpol, S, mixing):
     return B, v_layer, C,C0, S, var_layer
 
 
-
-
-
-
 if __name__ == "__main__":
     
-    cc.compile()
\ No newline at end of file
+    cc.compile()
@@ -1,72 +1,166 @@
 """
+The lab runs experiments which span several benches. Vessels are kept on a shared shelf, and bench jobs take their
+input vessels from it and put their output vessels back on it, so vessels can be routed through production flows
+such as react -> extract -> distill.
 
+Bench instances are kept warm between jobs, and independent jobs are run concurrently in a pool of worker threads
+(the simulation kernels release the GIL).
+
+Example:
+    >>> with Lab(n_workers=4) as lab:
+    ...     stages = lab.run_flow(["GenWurtzReact-v2", "GenWurtzExtract-v2", "GenWurtzDistill-v2"], n=8, target="dodecane")
+    ...     print(lab.report())
 """
 import sys
-from abc import ABC
+import time
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Tuple, Optional, Sequence, Callable, List, Dict
 import gymnasium as gym
 import chemistrylab
 import numpy as np
+from chemistrylab import vessel
+from chemistrylab.benches.characterization_bench import CharacterizationBench
+from chemistrylab.lab.shelf import Shelf
 
-Agent = object
 
-class Lab(gym.Env, ABC):
+class RandomAgent:
     """
-    The lab class is meant to be a gym environment so that an agent can figure out how to synthesize different chemicals
+    Agent which takes uniformly random actions in an environment.
+
+    The predict function is implemented the same as in a stable baselines policy, so any agent with the same
+    interface (such as the heuristic policies) can be used in its place.
     """
-    def __init__(self, render_mode: str = None, max_num_vessels: int = 100):
+    def __init__(self, env):
         """
+        Args:
+            env (gym.Env): The environment the agent acts in
+        """
+        self.env = env
 
-        Parameters
-        ----------
-        render_mode: a string for the render mode of the environment if the user wishes to see outputs from the benches
-        max_num_vessels: the maximum number of vessels that the shelf can store
+    def predict(self, observation):
+        """
+        Returns:
+            Tuple: A random action and None (for stable baselines compatability)
         """
-        all_envs = envs.registry.all()
+        return self.env.action_space.sample(), None
+
+
+class BenchJob(NamedTuple):
+    bench: str
+    inputs: Tuple[int] = ()
+    outputs: Optional[Tuple[int]] = None
+    agent: str = "random"
+    target: Optional[str] = None
+    seed: Optional[int] = None
+
+BenchJob.bench.__doc__ = "The id of the bench environment to run an episode of"
+BenchJob.inputs.__doc__ = "Lab shelf slots of the vessels placed in the first bench slots (the bench's own vessels are used if empty)"
+BenchJob.outputs.__doc__ = "Bench shelf slots of the vessels put on the lab shelf afterwards (the working vessels if None)"
+BenchJob.agent.__doc__ = "Name of the agent which runs the bench (see :meth:`Lab.register_agent`)"
+BenchJob.target.__doc__ = "The target material (chosen by the bench if None)"
+BenchJob.seed.__doc__ = "Seed passed to the bench's reset"
+
+
+class JobResult(NamedTuple):
+    job: BenchJob
+    reward: float
+    steps: int
+    seconds: float
+    target: str
+    outputs: Tuple[int]
+
+JobResult.reward.__doc__ = "The total reward of the episode"
+JobResult.steps.__doc__ = "The number of steps taken"
+JobResult.seconds.__doc__ = "Time spent running the episode"
+JobResult.target.__doc__ = "The target material of the episode"
+JobResult.outputs.__doc__ = "Lab shelf slots of the output vessels (valid until the next call to :meth:`Lab.run`)"
+
+
+class BenchStats(NamedTuple):
+    jobs: int
+    steps: int
+    vessels: int
+    seconds: float
+
+    @property
+    def jobs_per_second(self):
+        return self.jobs/max(self.seconds, 1e-12)
+
+    @property
+    def steps_per_second(self):
+        return self.steps/max(self.seconds, 1e-12)
+
+BenchStats.vessels.__doc__ = "The number of vessels output by the bench"
+BenchStats.seconds.__doc__ = "Total time spent running episodes (summed over workers)"
+
+
+def chemistrylab_benches() -> List[str]:
+    """Returns the ids of all registered chemistrylab environments"""
+    return [key for key, spec in gym.envs.registry.items() if str(spec.entry_point).startswith("chemistrylab")]
+
+
+class Lab(gym.Env):
+    """
+    The lab class is meant to be a gym environment so that an agent can figure out how to synthesize different chemicals.
+
+    Besides the gym interface (see :meth:`step`), jobs can be given directly to :meth:`run` and :meth:`run_flow`.
+    """
+    def __init__(self, benches: Optional[Sequence[str]] = None, n_workers: int = 1, max_num_vessels: int = 100,
+            render_mode: Optional[str] = None):
+        """
+        Args:
+            benches (Optional[Sequence[str]]): Ids of the bench environments to use (all chemistrylab benches if None)
+            n_workers (int): The number of jobs which are run at the same time
+            max_num_vessels (int): The number of vessel slots in the action space
+            render_mode (Optional[str]): Unused
+        """
+        benches = chemistrylab_benches() if benches is None else list(benches)
         # the following parameters list out all available reactions, extractions and distillations that the agent can use
-        self.reactions = [env_spec.id for env_spec in all_envs if 'React' in env_spec.id]
-        self.extractions = [env_spec.id for env_spec in all_envs if 'Extract' in env_spec.id]
-        self.distillations = [env_spec.id for env_spec in all_envs if 'Distill' in env_spec.id]
-        self.characterization = list(CharacterizationBench().techniques.keys())
-        self.characterization_bench = CharacterizationBench()
+        self.reactions = [b for b in benches if 'React' in b]
+        self.extractions = [b for b in benches if 'Extract' in b]
+        self.distillations = [b for b in benches if 'Distill' in b]
+        self.characterization = ['spectra', 'layers', 'layers_expected', 'PVT']
         # the following is a dictionary of all available agents that can operate each bench feel free to add your own
         # custom agents
-        self.react_agents = {'random': RandomAgent()}
-        self.extract_agents = {'random': RandomAgent()}
-        self.distill_agents = {'random': RandomAgent()}
+        self.react_agents = {'random': RandomAgent}
+        self.extract_agents = {'random': RandomAgent}
+        self.distill_agents = {'random': RandomAgent}
         self.render_mode = render_mode
         self.max_num_vessels = max_num_vessels
+        self.n_workers = n_workers
         # the shelf holds all available vessels that can be used by the agent
-        self.shelf = Shelf(max_num_vessels=max_num_vessels)
+        self.shelf = Shelf([], n_working=0)
+
+        # Idle bench instances for each bench id
+        self._free = defaultdict(list)
+        self._lock = threading.Lock()
+        self._stats = dict()
+        self._executor = None
+        self._set_action_space()
+        self.observation_space = None
+
+    def _set_action_space(self):
         # the action space is a vector:
-        # the 0th index represents what bench is selected (reaction, extraxction, distillation, done)
+        # the 0th index represents what bench is selected (reaction, extraxction, distillation, characterization, done)
         # the 1st index represents what environment the agent selects
         # the 2nd index represents what vessel from the shelf the agent uses
         # the 3rd index represents which agent will be used to perform the experiment
         self.action_space = gym.spaces.MultiDiscrete([5,
-                                                      max([len(self.reactions),
-                                                           len(self.extractions),
-                                                           len(self.distillations),
-                                                           len(self.characterization)]),
-                                                      self.max_num_vessels,
-                                                      max([len(self.react_agents),
-                                                           len(self.extract_agents),
-                                                           len(self.distill_agents)])])
-        # have to get back to this part
-        self.observation_space = None
+            max(len(self.reactions), len(self.extractions), len(self.distillations), len(self.characterization)),
+            self.max_num_vessels,
+            max(len(self.react_agents), len(self.extract_agents), len(self.distill_agents))])
 
-    def register_agent(self, bench: str, name: str, agent: Agent):
+    def register_agent(self, bench: str, name: str, agent: Callable):
         """
-        a function that registers an agent for a specified bench
-
-        Parameters
-        ----------
-        bench: the bench for which the agent will be registered
-        name: the name of the agent to be registered
-        agent: the agent itself derived from the agent class
+        Registers an agent for a kind of bench.
 
-        Returns
-        -------
-        None
+        Args:
+            bench (str): "reaction", "extraction" or "distillation"
+            name (str): The name of the agent
+            agent (Callable[[gym.Env], Any]): Makes the agent for a bench. The agent needs a predict method which maps an
+                observation to (action, state), like :class:`RandomAgent` or a stable baselines policy.
         """
         if bench == "reaction":
             self.react_agents[name] = agent
@@ -76,197 +170,219 @@ class Lab(gym.Env, ABC):
             self.distill_agents[name] = agent
         else:
             raise ValueError('bench must be "reaction", "extraction" or "distillation"')
+        self._set_action_space()
 
-        self.action_space = gym.spaces.MultiDiscrete([4,
-                                                      max([len(self.reactions),
-                                                           len(self.extractions),
-                                                           len(self.distillations)]),
-                                                      self.max_num_vessels,
-                                                      max([len(self.react_agents),
-                                                           len(self.extract_agents),
-                                                           len(self.distill_agents)])])
-
-    def load_reaction_bench(self, index: int):
+    def agents_for(self, bench: str) -> Dict[str, Callable]:
+        """
+        Args:
+            bench (str): The id of a bench environment
+        Returns:
+            Dict[str, Callable]: The agents which can run the bench
         """
-        this function returns the reaction environment that the agent has selected
+        if bench in self.reactions:
+            return self.react_agents
+        if bench in self.extractions:
+            return self.extract_agents
+        if bench in self.distillations:
+            return self.distill_agents
+        return {'random': RandomAgent}
+
+    def _checkout(self, bench: str):
+        """Takes an idle instance of a bench (making a new one if they are all busy)"""
+        with self._lock:
+            free = self._free[bench]
+            if free:
+                return free.pop()
+        return gym.make(bench).unwrapped
 
-        Parameters
-        ----------
-        index: the index of the agent to be run
+    def _checkin(self, bench: str, env):
+        with self._lock:
+            self._free[bench].append(env)
 
-        Returns
-        -------
-        the gym environment that has been loaded
+    def warm(self, benches: Sequence[str], n: Optional[int] = None):
         """
-        print(self.reactions[index])
-        return gym.make(self.reactions[index])
+        Makes instances of benches ahead of time, so jobs do not have to wait for them to be made.
 
-    def load_extraction_bench(self, index):
+        Args:
+            benches (Sequence[str]): Ids of the benches
+            n (Optional[int]): The number of idle instances to have for each bench (defaults to n_workers)
         """
-        this function returns the extraction environment that the agent has selected
+        n = self.n_workers if n is None else n
+        for bench in benches:
+            for _ in range(n - len(self._free[bench])):
+                self._checkin(bench, gym.make(bench).unwrapped)
 
-        Parameters
-        ----------
-        index: the index of the agent to be run
+    def _run_job(self, job: BenchJob, vessels: List[vessel.Vessel]):
+        """Runs one episode of a job with the given input vessels, returning (reward, steps, seconds, target, output vessels)"""
+        agent = self.agents_for(job.bench)[job.agent]
+        env = self._checkout(job.bench)
+        try:
+            start = time.perf_counter()
+            policy = agent(env)
+            obs, _ = env.reset(seed=job.seed, options=dict(vessels=vessels, target=job.target))
+            total, steps, done = 0.0, 0, False
+            while not done:
+                obs, reward, terminated, truncated, _ = env.step(policy.predict(obs)[0])
+                total += reward
+                steps += 1
+                done = terminated or truncated
+            slots = range(env.shelf.n_working) if job.outputs is None else job.outputs
+            outputs = [env.shelf[i] for i in slots]
+            vessel.sync_all(outputs)
+            return total, steps, time.perf_counter()-start, env.target_material, outputs
+        finally:
+            self._checkin(job.bench, env)
 
-        Returns
-        -------
-        the gym environment that has been loaded
+    def run(self, jobs: Sequence[BenchJob]) -> List[JobResult]:
         """
-        print(self.extractions[index])
-        return gym.make(self.extractions[index])
+        Runs a set of independent jobs (which do not share any vessels), n_workers at a time. Afterwards, the input
+        vessels of the jobs are taken off the shelf, and their output vessels are added to the end of it (in the order
+        of the jobs).
 
-    def load_distillation_bench(self, index):
+        Args:
+            jobs (Sequence[BenchJob]): The jobs to run
+        Returns:
+            List[JobResult]: The result of each job
         """
-        this function returns the distillation environment that the agent has selected
+        used = [i for job in jobs for i in job.inputs]
+        if len(set(used)) != len(used):
+            raise ValueError("Jobs which run together cannot share vessels")
+        for i in used:
+            if not 0 <= i < len(self.shelf):
+                raise IndexError(f"There is no vessel in slot {i} of the shelf")
+        for job in jobs:
+            if not job.agent in self.agents_for(job.bench):
+                raise KeyError(f"{job.agent} is not an agent for {job.bench}")
+        inputs = [[self.shelf[i] for i in job.inputs] for job in jobs]
+
+        if self.n_workers > 1 and len(jobs) > 1:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.n_workers)
+            results = list(self._executor.map(self._run_job, jobs, inputs))
+        else:
+            results = [self._run_job(job, vessels) for job, vessels in zip(jobs, inputs)]
 
-        Parameters
-        ----------
-        index: the index of the agent to be run
+        for i in sorted(used, reverse=True):
+            del self.shelf[i]
+        out = []
+        for job, (reward, steps, seconds, target, vessels) in zip(jobs, results):
+            start = len(self.shelf)
+            self.shelf.vessels += vessels
+            out.append(JobResult(job, reward, steps, seconds, str(target), tuple(range(start, len(self.shelf)))))
+            stats = self._stats.get(job.bench, BenchStats(0, 0, 0, 0.0))
+            self._stats[job.bench] = BenchStats(stats.jobs+1, stats.steps+steps, stats.vessels+len(vessels), stats.seconds+seconds)
+        return out
 
-        Returns
-        -------
-        the gym environment that has been loaded
+    def run_flow(self, benches: Sequence[str], n: int = 1, target: Optional[str] = None, agent: str = "random",
+            outputs: Optional[Sequence[Optional[Tuple[int]]]] = None) -> List[List[JobResult]]:
         """
-        print(self.distillations[index])
-        return gym.make(self.distillations[index])
+        Runs n independent production flows through a sequence of benches (such as react -> extract -> distill).
+        The first bench starts from its own vessels, and the output vessels of each bench are the input vessels of
+        the next one (with the same target). Each stage runs the jobs of all flows together (see :meth:`run`).
 
-    def run_bench(self, bench, env_index, vessel_index, agent_index=0, custom_agent=None):
+        Args:
+            benches (Sequence[str]): Ids of the benches of each stage
+            n (int): The number of flows
+            target (Optional[str]): The target material (chosen by the first bench of each flow if None)
+            agent (str): The name of the agent used on every bench
+            outputs (Optional[Sequence[Optional[Tuple[int]]]]): The bench shelf slots passed on by each stage
+                (see :attr:`BenchJob.outputs`)
+        Returns:
+            List[List[JobResult]]: The job results of each stage
         """
-        this function works as a wrapper for the lab environment and allows for an agent to specify what
-        environment they wish to run and with what vessel and agent
+        current = [()]*n
+        targets = [target]*n
+        stages = []
+        for k, bench in enumerate(benches):
+            slots = None if outputs is None else outputs[k]
+            results = self.run([BenchJob(bench, inputs, slots, agent, targ) for inputs, targ in zip(current, targets)])
+            current = [r.outputs for r in results]
+            targets = [r.target for r in results]
+            stages.append(results)
+        return stages
 
-        Parameters
-        ----------
-        bench
-        env_index
-        vessel_index
-        agent_index
-        custom_agent
+    def throughput(self) -> Dict[str, BenchStats]:
+        """
+        Returns:
+            Dict[str, BenchStats]: The jobs, steps, output vessels and time spent for each bench that has been run
+        """
+        return dict(self._stats)
 
-        Returns
-        -------
+    def report(self) -> str:
+        """
+        Returns:
+            str: A table of the throughput of each bench
+        """
+        lines = ["%-24s %6s %8s %8s %10s %10s"%("bench", "jobs", "steps", "vessels", "jobs/s", "steps/s")]
+        for bench, s in self._stats.items():
+            lines.append("%-24s %6d %8d %8d %10.2f %10.1f"%(bench, s.jobs, s.steps, s.vessels, s.jobs_per_second, s.steps_per_second))
+        return "\n".join(lines)
 
+    def run_bench(self, bench: str, env_index: int, vessel_index: int, agent_index: int = 0):
         """
-        env = None
-        agent = None
-        total_reward = 0
-
-        if bench == 'reaction':
-            if env_index >= len(self.reactions):
-                total_reward -= 10
-            else:
-                env = self.load_reaction_bench(env_index)
-                if vessel_index > self.shelf.open_slot:
-                    total_reward -= 10
-                else:
-                    env.update_vessel(self.shelf.get_vessel(vessel_index))
-            if agent_index >= len(list(self.react_agents.keys())):
-                total_reward -= 10
-            else:
-                agent_name = list(self.react_agents.keys())[agent_index]
-                agent = self.react_agents[agent_name]
-        elif bench == 'extraction':
-            if env_index >= len(self.extractions):
-                total_reward -= 10
-            else:
-                env = self.load_extraction_bench(env_index)
-                if vessel_index > self.shelf.open_slot:
-                    total_reward -= 10
-                else:
-                    env.update_vessel(self.shelf.get_vessel(vessel_index))
-            if agent_index >= len(list(self.extract_agents.keys())):
-                total_reward -= 10
-            else:
-                agent_name = list(self.extract_agents.keys())[agent_index]
-                agent = self.extract_agents[agent_name]
-        elif bench == 'distillation':
-            if env_index >= len(self.distillations):
-                total_reward -= 10
-            else:
-                env = self.load_distillation_bench(env_index)
-                if vessel_index > self.shelf.open_slot:
-                    total_reward -= 10
-                else:
-                    env.update_vessel(self.shelf.get_vessel(vessel_index))
-            if agent_index >= len(list(self.distill_agents.keys())):
-                 total_reward -= 10
-            else:
-                agent_name = list(self.distill_agents.keys())[agent_index]
-                agent = self.distill_agents[agent_name]
-        elif bench == 'characterization':
-            analysis = np.array([])
-            if vessel_index > self.shelf.open_slot or env_index >= len(self.characterization):
-                total_reward -= 10
-            else:
-                analysis, rtn_vessel = self.characterization_bench.analyze(self.shelf.get_vessel(vessel_index), self.characterization[env_index])
-                self.shelf.return_vessel_to_shelf(vessel=rtn_vessel)
-            return total_reward, analysis
-        else:
-            raise KeyError(f'{bench} is not a recognized bench')
-        done = total_reward < 0
-        if not done:
-            if custom_agent:
-                agent = custom_agent
-            state = env.reset()
-            while not done:
-                # env.render(mode=self.render_mode)
-                action = agent.run_step(env, state)
-                state, reward, done, _ = env.step(action)
-                total_reward += reward
-            rtn_vessel = env.vessels
-            self.shelf.return_vessel_to_shelf(vessel=rtn_vessel)
-        return total_reward, np.array([])
-
-    def step(self, action: list or np.array):
+        Runs an episode of a bench with a vessel from the shelf (or the bench's own starting vessels if vessel_index is
+        the first empty slot), and puts the resulting vessels on the shelf.
+
+        Args:
+            bench (str): "reaction", "extraction", "distillation" or "characterization"
+            env_index (int): The index of the bench environment (or characterization technique)
+            vessel_index (int): The shelf slot of the vessel to use
+            agent_index (int): The index of the agent to use
+        Returns:
+            Tuple[float, np.ndarray]: The reward, and the analysis (for the characterization bench)
         """
-        This function takes in an agents command and deconstructs the command and runs the appropriate environment with
-        the specified bench, environment, vessel, and agent
-        Parameters
-        ----------
-        action: [list, np.array]: this parameter specifies the action the agent takes
-        action: [bench_id, environment_id, vessel_id, agent_id]
-
-        Returns
-        -------
-        None
+        if bench == 'characterization':
+            if vessel_index >= len(self.shelf) or env_index >= len(self.characterization):
+                return -10, np.array([])
+            analysis = CharacterizationBench([self.characterization[env_index]], (), 1)([self.shelf[vessel_index]], None)
+            return 0, analysis
+        envs = dict(reaction=self.reactions, extraction=self.extractions, distillation=self.distillations).get(bench)
+        if envs is None:
+            raise KeyError(f'{bench} is not a recognized bench')
+        if env_index >= len(envs) or vessel_index > len(self.shelf):
+            return -10, np.array([])
+        agents = list(self.agents_for(envs[env_index]))
+        if agent_index >= len(agents):
+            return -10, np.array([])
+        inputs = (vessel_index,) if vessel_index < len(self.shelf) else ()
+        result, = self.run([BenchJob(envs[env_index], inputs, agent=agents[agent_index])])
+        return result.reward, np.array([])
+
+    def step(self, action):
         """
+        Runs the bench, environment, vessel and agent specified by the action.
 
-        done = False
-        if action[0] == 0:
-            # reaction bench
-            bench = 'reaction'
-        elif action[0] == 1:
-            # extraction bench
-            bench = 'extraction'
-        elif action[0] == 2:
-            # distillation bench
-            bench = 'distillation'
-        elif action[0] == 3:
-            # characterization bench
-            bench = 'characterization'
-        elif action[0] == 4:
-            bench = None
-            done = True
-        else:
+        Args:
+            action (Union[list, np.ndarray]): [bench_id, environment_id, vessel_id, agent_id]
+        Returns:
+            Tuple[float, np.ndarray, bool]: The reward, any analysis of a vessel, and whether the lab is done
+        """
+        benches = ['reaction', 'extraction', 'distillation', 'characterization']
+        if action[0] == 4:
+            return 0, np.array([]), True
+        if not 0 <= action[0] < 4:
             raise EnvironmentError(f'{action[0]} is not a valid environment')
-        reward = 0
-        analysis = np.array([])
-        if not done:
-            env_index = action[1]
-            vessel_index = action[2]
-            agent_index = action[3]
-            reward, analysis = self.run_bench(bench, env_index, vessel_index, agent_index)
-        return reward, analysis, done
-
-    def reset(self):
+        reward, analysis = self.run_bench(benches[action[0]], action[1], action[2], action[3])
+        return reward, analysis, False
+
+    def reset(self, *args, **kwargs):
         """
-        this function resets the shelf and gets rid of all the currently stored vessels
-        Returns
-        -------
-        None
+        Gets rid of all the vessels on the shelf
+
+        Returns:
+            List[Vessel]: The (empty) list of vessels on the shelf
         """
-        self.shelf.reset()
+        self.shelf.vessels = []
         return self.shelf.vessels
 
+    def close(self):
+        """Shuts down the worker threads"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
 
+    def __exit__(self, *args):
+        self.close()
@@ -1,5 +1,5 @@
 """
-
+Command line and agent interface for running a :class:`~chemistrylab.lab.lab.Lab`.
 """
 
 import os
@@ -8,6 +8,9 @@ import sys
 import numpy as np
 import chemistrylab
 import datetime as dt
+from chemistrylab import vessel as vessel_module
+from chemistrylab.lab import vessel_library
+from chemistrylab.lab.lab import Lab, RandomAgent
 
 Agent = object #TODO: add this actually
 
@@ -110,11 +113,11 @@ class Manager:
             self._human_run()
         # if the mode given matches a registered agent, acquire the corresponding agent and run it
         elif self.mode in self.agents:
-            self.agent = self.agents[self.mode]()
+            self.agent = self.agents[self.mode](self.lab)
             self._agent_run()
         # if an agent was specified directly, run that agent
         elif self.agent:
-            self.agent = self.agent()
+            self.agent = self.agent(self.lab)
             self._agent_run()
         else:
             raise ValueError("agent specified does not exist")
@@ -148,6 +151,7 @@ class Manager:
                     'list vessels',
                     'create new vessel',
                     'save vessel',
+                    'throughput report',
                     'quit']
 
         while not done:
@@ -184,7 +188,10 @@ class Manager:
             # action[7] == save an existing vessel
             elif action == 7:
                 self.save_vessel()
-            # action[8] OR action not in range(0, 8) == end the program
+            # action[8] == print the throughput of each bench
+            elif action == 8:
+                print(self.lab.report())
+            # action[9] OR action not in range(0, 9) == end the program
             else:
                 done = True
 
@@ -217,7 +224,7 @@ class Manager:
             envs = self.lab.extractions
             agents = list(self.lab.extract_agents.keys())
         elif bench == 'characterization':
-            envs = ['characterization']
+            envs = self.lab.characterization
             agents = ['none']
         else:
             raise KeyError('Inputted bench not supported')
@@ -231,10 +238,10 @@ class Manager:
         # list all the vessels available on the shelf and request the user select a vessel
         self.list_vessels()
         vessel = int(input(
-            'Please specify what vessel you wish to use (inputting -1 we will create a new vessel and use that) : '
+            'Please specify what vessel you wish to use (inputting -1 lets the bench make its own vessels) : '
         ))
         if vessel == -1:
-            self.create_new_vessel()
+            vessel = len(self.lab.shelf)
 
         # list all the available agents and request the user select an agent
         for i, agent in enumerate(agents):
@@ -279,7 +286,7 @@ class Manager:
         # have the agent select actions and run the lab manager step function until the done parameter is satisfied
         while not done:
             # agent selects actions based on the state of the environemnt and the chosen characterization of a vessel
-            action = self.agent.run_step(self.lab, analysis)
+            action, _ = self.agent.predict(analysis)
             reward, analysis, done = self.lab.step(action)
             total_reward += reward
 
@@ -308,7 +315,10 @@ class Manager:
         """
 
         # pass the necessary parameters to the `run_bench` method of the `lab` environment
-        self.lab.run_bench(bench, env_index, vessel_index, agent)
+        reward, analysis = self.lab.run_bench(bench, env_index, vessel_index, agent)
+        print(f'reward: {reward}')
+        if len(analysis) > 0:
+            print(analysis)
 
     def list_vessels(self):
         """
@@ -329,8 +339,7 @@ class Manager:
 
         for i, vessel in enumerate(self.lab.shelf.vessels):
             print(f'{i}: {vessel.label}')
-            print(vessel.get_material_dict())
-            print(vessel.get_solute_dict())
+            print({key: mat.mol for key, mat in vessel.material_dict.items()})
 
     def load_vessel(self, path):
         """
@@ -339,7 +348,7 @@ class Manager:
         Parameters
         ---------------
         `path` : `str`
-            The directory path to a valid pickle file containing a vessel object.
+            The path to a vessel library file (see `vessel_library.save_vessels`).
 
         Returns
         ---------------
@@ -352,10 +361,7 @@ class Manager:
         """
 
         # check that the vessel path is a valid path
-        if any([
-                not os.path.isfile(path),
-                path.split(".")[-1] != "pickle"
-        ]):
+        if not os.path.isfile(path):
             raise IOError("Invalid vessel path!")
 
         self.lab.shelf.load_vessel(path)
@@ -377,7 +383,8 @@ class Manager:
         None
         """
 
-        self.lab.shelf.create_new_vessel()
+        label = input('Specify a label for the new vessel: ')
+        self.lab.shelf.append(vessel_module.Vessel(label))
 
     def save_vessel(self):
         """
@@ -411,7 +418,7 @@ class Manager:
         path = input('Specify the relative path for the vessel: ')
 
         # pass the vessel and intended vessel path to the lab shelf
-        self.lab.shelf.vessels[vessel].save_vessel(path)
+        vessel_library.save_vessels(path, [self.lab.shelf.vessels[vessel]])
 
 
 if __name__ == "__main__":
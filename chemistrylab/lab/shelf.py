@@ -5,7 +5,9 @@ import sys
 import numpy as np
 from chemistrylab import material
 from chemistrylab.vessel import Vessel
+from chemistrylab.lab.vessel_library import VesselLibrary, save_vessels
 from copy import deepcopy
+from typing import Callable, Optional, Sequence
 
 class Shelf:
     """
@@ -43,34 +45,139 @@ class Shelf:
         'Return a nicely formatted representation string'
         return self.__class__.__name__ + ': (%s)' % ", ".join(str(v) for v in self.vessels)
 
-    def load_vessel(self, path: str):
+    def load_vessel(self, path: str, index: Optional[int] = None):
         """
-        TODO: Implement this
+        Loads vessels from a vessel library file (see :mod:`~chemistrylab.lab.vessel_library`) onto the shelf.
+
+        Args:
+            path (str): the path to the vessel library that is to be loaded
+            index (Optional[int]): The vessel to load from the library (all of them are loaded if None)
+        Returns:
+            List[Vessel]: The vessels which were added to the shelf
+        """
+        library = VesselLibrary(path)
+        vessels = library[:] if index is None else [library[index]]
+        self.vessels += vessels
+        return vessels
+
+    def save(self, path: str):
+        """
+        Saves the vessels currently on the shelf to a vessel library file.
+
         Args:
-        - path (str): the path to the vessel that is to be loaded
+            path (str): Path of the file to write
         """
-        pass
+        save_vessels(path, self.vessels, n_working=self.n_working)
 
-    def reset(self, target = None):
+    @staticmethod
+    def load(path: str, n_working: Optional[int] = None):
+        """
+        Makes a shelf from the vessels in a vessel library file (such as one written by :meth:`save`).
+
+        Args:
+            path (str): Path to the vessel library file
+            n_working (Optional[int]): Number of working vessels (the saved value is used if None)
+        Returns:
+            Shelf: A shelf holding the loaded vessels
+        """
+        library = VesselLibrary(path)
+        if n_working is None:
+            n_working = library.meta.get("n_working", 1)
+        return Shelf(library[:], n_working=n_working)
+
+    def reset(self, target = None, rng: Optional[np.random.Generator] = None):
         """
         TODO: Update this along with __init__
         Resets the shelf to it's initial state
+
+        Args:
+            target: The target material (unused by a plain shelf)
+            rng (Optional[np.random.Generator]): Generator given to the new vessels (see :attr:`Vessel.rng`)
         """
         self.vessels=[deepcopy(v) for v in self._orig_vessels]
+        for v in self.vessels:
+            v.rng = rng
 
 
 
+class VesselBank:
+    """
+    Wraps a function which makes a starting vessel for a target. Each distinct vessel is only made once, after that
+    new copies are built from its packed state (see :class:`~chemistrylab.lab.vessel_library.VesselState`),
+    which is much cheaper than making and validating the vessel again.
+
+    The vessel function has to be deterministic given its arguments. If it makes a random choice, that choice
+    should be an argument which the bank draws instead:
+
+    Example:
+        >>> # Makes wurtz_vessel(target, False) or wurtz_vessel(target, True) with equal probability
+        >>> bank = VesselBank(lambda target, salt: wurtz_vessel(target, salt)[0], variants = [False, True])
+        >>> shelf = VariableShelf([bank, lambda x:vessel.Vessel("Beaker 1")], [], bank=True)
+    """
+    def __init__(self, vessel_func: Callable, variants: Optional[Sequence] = None):
+        """
+        Args:
+            vessel_func (Callable): Function of the target (and variant if variants are given) which returns a vessel
+            variants (Optional[Sequence]): Values of the random argument to vessel_func, which are chosen uniformly
+                (see :meth:`__call__`)
+        """
+        self.vessel_func = vessel_func
+        self.variants = variants
+        self._states = dict()
+
+    def get(self, target, variant: int = 0) -> Vessel:
+        """
+        Args:
+            target: The target material given to the vessel function
+            variant (int): Index of the variant to make
+        Returns:
+            Vessel: A new starting vessel
+        """
+        key = (target, variant)
+        state = self._states.get(key)
+        if state is None:
+            v = self.vessel_func(target) if self.variants is None else self.vessel_func(target, self.variants[variant])
+            state = self._states[key] = VesselLibrary.from_vessels([v]).unpack(0)
+        return state.build()
+
+    def fill(self, targets: Sequence):
+        """Makes the vessels of every (target, variant) pair up front"""
+        for target in targets:
+            for variant in range(1 if self.variants is None else len(self.variants)):
+                self.get(target, variant)
+
+    def __call__(self, target, rng: Optional[np.random.Generator] = None) -> Vessel:
+        """
+        Args:
+            target: The target material given to the vessel function
+            rng (Optional[np.random.Generator]): Generator used to choose the variant (np.random's global state if None)
+        Returns:
+            Vessel: A new starting vessel with a randomly chosen variant
+        """
+        if self.variants is None:
+            return self.get(target)
+        return self.get(target, (np.random if rng is None else rng).choice(len(self.variants)))
+
+
 class VariableShelf(Shelf):
     """
     Shelf which is given a set of fixed and variable vessels. 
-    On reset the original vessels are deepcopied into new vessel objects
+    On reset the original vessels are deepcopied into new vessel objects, and new variable vessels are made
+    for the target.
     
     """
-    def __init__(self, variable_vessels: list, fixed_vessels: list, n_working = 1):
+    def __init__(self, variable_vessels: list, fixed_vessels: list, n_working = 1, bank: bool = False):
         """
-        TODO: Allow the starting vessels to be given as arguments.
+        Args:
+            variable_vessels (list): Functions of the target which make a vessel (or :class:`VesselBank` objects)
+            fixed_vessels (list): Vessels which are copied on each reset
+            n_working (int): The number of working vessels
+            bank (bool): If True, the variable vessel functions are deterministic, so each is wrapped in a
+                :class:`VesselBank` (and only run once per target).
         """
         self.n_working = n_working
+        if bank:
+            variable_vessels = [f if isinstance(f, VesselBank) else VesselBank(f) for f in variable_vessels]
         self.variable_vessels = variable_vessels
         self.fixed_vessels = fixed_vessels
 
@@ -79,12 +186,21 @@ class VariableShelf(Shelf):
 
         self.reset()
 
-    def reset(self, target = None):
+    def reset(self, target = None, rng: Optional[np.random.Generator] = None):
+        """
+        Makes new variable vessels for the target and copies the fixed vessels.
 
+        Args:
+            target: The target material
+            rng (Optional[np.random.Generator]): Generator used by :class:`VesselBank` entries and given to the new
+                vessels (see :attr:`Vessel.rng`)
+        """
         variable = []
         if len(self.variable_vessels)>0:
             # Set the target to the first one in the dict if not provided
-            variable = [vessel_func(target) for vessel_func in self.variable_vessels]
+            variable = [vessel_func(target, rng) if isinstance(vessel_func, VesselBank) else vessel_func(target)
+                for vessel_func in self.variable_vessels]
         
         self.vessels = variable + [deepcopy(v) for v in self.fixed_vessels]
-
+        for v in self.vessels:
+            v.rng = rng
@@ -0,0 +1,460 @@
+"""
+Binary (pickle free) storage of vessels.
+
+A vessel library is a single file holding any number of vessels as a handful of flat numpy arrays:
+
++----------------+----------------------------------------------------------------------------------------------+
+| Array          | Contents                                                                                     |
++================+==============================================================================================+
+| vessels        | One row per vessel (temperature, volume, mixing variance, counts and offsets into the rest) |
++----------------+----------------------------------------------------------------------------------------------+
+| materials      | One row per material (registry name, mol, phase, temperature, flags and species properties) |
++----------------+----------------------------------------------------------------------------------------------+
+| members        | Solvent, solute and layer slots of each vessel (as indices into its materials)              |
++----------------+----------------------------------------------------------------------------------------------+
+| amounts        | Dissolved solute amounts ([solutes, solvents] matrix) and cached solute / solvent mols      |
++----------------+----------------------------------------------------------------------------------------------+
+| layer_state    | Layer positions, variances, volumes and colors                                              |
++----------------+----------------------------------------------------------------------------------------------+
+| layers         | The layer image (the color of each pixel)                                                   |
++----------------+----------------------------------------------------------------------------------------------+
+| hashed_layers  | The layer index of each pixel of the layer image                                            |
++----------------+----------------------------------------------------------------------------------------------+
+| strings        | Labels, material keys and material registry names                                           |
++----------------+----------------------------------------------------------------------------------------------+
+
+Materials are stored by their name in :data:`chemistrylab.material.REGISTRY` (so they must be registered to be saved),
+along with any properties (boiling point, density, etc) which differ from the registered material. Spectra are not
+stored, they always come from the registered material.
+
+The arrays are aligned so the file can be memory mapped, meaning a :class:`VesselLibrary` only reads the rows of the
+vessels it is asked for.
+"""
+import ast
+import json
+import numpy as np
+from copy import copy
+from typing import List, NamedTuple, Optional, Sequence
+from chemistrylab import material
+from chemistrylab.vessel import Vessel
+
+MAGIC = b"CHEMVESL"
+VERSION = 1
+_ALIGN = 64
+
+#Per vessel arrays stored in layer_state (in order)
+_LAYER_FIELDS = ("_layers_position", "_layers_variance", "_layer_volumes", "_layers_volume", "_lvar", "_layer_colors")
+
+#Species properties which are stored per material
+_SPECIES_FIELDS = ("molar_mass", "boiling_point", "melting_point", "specific_heat", "enthalpy_fusion", "enthalpy_vapor")
+_PHASES = ("s", "l", "g")
+
+VESSEL_DTYPE = np.dtype([
+    ("label", np.int32),
+    ("temperature", np.float64),
+    ("volume", np.float64),
+    ("default_dt", np.float64),
+    ("variance", np.float64),
+    ("ignore_layout", np.bool_),
+    ("mat_start", np.int64),
+    ("n_mats", np.int32),
+    ("member_start", np.int64),
+    ("n_solvents", np.int32),
+    ("n_solutes", np.int32),
+    ("n_layer_mats", np.int32),
+    ("amount_start", np.int64),
+    ("state_start", np.int64),
+    ("state_len", np.int32, (len(_LAYER_FIELDS),)), # -1 where the array is None
+    ("state_f64", np.uint8), # bit i is set if layer array i is float64 (otherwise it is float32)
+    ("image_start", np.int64), # -1 if the vessel has no layer image
+    ("image_len", np.int32),
+])
+
+MATERIAL_DTYPE = np.dtype([
+    ("key", np.int32), # -1 if the material is only referenced by the layers (not in the material dict)
+    ("registry", np.int32),
+    ("name", np.int32),
+    ("phase", "U1"),
+    ("mol", np.float64),
+    ("temperature", np.float64),
+    ("pressure", np.float64),
+    ("polarity", np.float64),
+    ("charge", np.float64),
+    ("color", np.float64),
+    ("solute", np.bool_),
+    ("solvent", np.bool_),
+] + [("density_"+p, np.float64) for p in _PHASES] + [(key, np.float64) for key in _SPECIES_FIELDS])
+
+_SPECIES_COLUMNS = slice(12, None)
+
+
+def _float(x):
+    return np.nan if x is None else x
+
+def _species_row(mat):
+    """The species properties of a material as stored in the material table"""
+    density = mat._density
+    return tuple(_float(density.get(p)) for p in _PHASES) + tuple(_float(getattr(mat._species, key)) for key in _SPECIES_FIELDS)
+
+def _aligned(n):
+    return -(-n//_ALIGN)*_ALIGN
+
+class _StringTable:
+    def __init__(self):
+        self.ids = dict()
+    def __call__(self, s):
+        return self.ids.setdefault(s, len(self.ids))
+    def array(self):
+        return np.array(list(self.ids), dtype=str) if self.ids else np.zeros(0, dtype="U1")
+
+def pack_vessels(vessels: Sequence[Vessel]) -> dict:
+    """
+    Packs vessels into the flat arrays of a vessel library (see the module documentation). Queued events
+    and the vessels' clocks are not saved.
+
+    Args:
+        vessels (Sequence[Vessel]): The vessels to pack
+    Returns:
+        dict: Dictionary of array name -> array
+    """
+    registry_names = {cls:name for name, cls in material.REGISTRY._classes.items()}
+    strings = _StringTable()
+    vessel_rows = np.zeros(len(vessels), dtype=VESSEL_DTYPE)
+    mat_rows, members, amounts, layer_state, images, hashed = [], [], [], [], [], []
+    n_mats = n_members = n_amounts = n_state = n_image = 0
+
+    for row, v in zip(vessel_rows, vessels):
+        # Time the vessel has pending is integrated before it is saved
+        v._touch()
+        mats = list(v.material_dict.values())
+        keys = [strings(key) for key in v.material_dict]
+        index = {id(mat):i for i, mat in enumerate(mats)}
+        # Layers can refer to materials which have since been removed from the vessel
+        for mat in v._layer_mats:
+            if id(mat) not in index:
+                index[id(mat)] = len(mats)
+                mats.append(mat)
+                keys.append(-1)
+        for mat, key in zip(mats, keys):
+            if not type(mat) in registry_names:
+                raise KeyError(f"{type(mat).__name__} is not a registered material, so it cannot be saved")
+            mat_rows.append((key, strings(registry_names[type(mat)]), strings(mat._name), mat.phase, mat.mol,
+                mat.temperature, mat.pressure, mat.polarity, mat.charge, mat._color, mat._solute, mat._solvent)
+                + _species_row(mat))
+
+        vessel_members = [index[id(v.material_dict[s])] for s in v.solvents + v._solutes] + [index[id(mat)] for mat in v._layer_mats]
+        vessel_amounts = np.concatenate([np.ravel(v._solute_amounts), v._solute_mols, v._solvent_mols])
+        state = [getattr(v, key) for key in _LAYER_FIELDS]
+
+        row["label"] = strings(v.label)
+        row["temperature"] = v.temperature
+        row["volume"] = v.volume
+        row["default_dt"] = v.default_dt
+        row["variance"] = v._variance
+        row["ignore_layout"] = v.ignore_layout
+        row["mat_start"], row["n_mats"] = n_mats, len(mats)
+        row["member_start"] = n_members
+        row["n_solvents"], row["n_solutes"], row["n_layer_mats"] = len(v.solvents), len(v._solutes), len(v._layer_mats)
+        row["amount_start"] = n_amounts
+        row["state_start"] = n_state
+        row["state_len"] = [-1 if x is None else len(x) for x in state]
+        row["state_f64"] = sum(1<<i for i, x in enumerate(state) if x is not None and x.dtype == np.float64)
+        row["image_start"] = -1 if v._layers is None else n_image
+        row["image_len"] = 0 if v._layers is None else len(v._layers)
+
+        members.append(vessel_members)
+        amounts.append(vessel_amounts)
+        layer_state += [np.asarray(x, dtype=np.float64) for x in state if x is not None]
+        if v._layers is not None:
+            images.append(v._layers)
+            hashed.append(v._hashed_layers)
+            n_image += len(v._layers)
+        n_mats += len(mats)
+        n_members += len(vessel_members)
+        n_amounts += len(vessel_amounts)
+        n_state += sum(len(x) for x in state if x is not None)
+
+    def cat(arrays, dtype):
+        return np.concatenate(arrays).astype(dtype) if arrays else np.zeros(0, dtype=dtype)
+
+    return dict(
+        vessels=vessel_rows,
+        materials=np.array(mat_rows, dtype=MATERIAL_DTYPE),
+        members=cat(members, np.int32),
+        amounts=cat(amounts, np.float64),
+        layer_state=cat(layer_state, np.float64),
+        layers=cat(images, np.float32),
+        hashed_layers=cat(hashed, np.int16),
+        strings=strings.array(),
+    )
+
+def save_vessels(path: str, vessels: Sequence[Vessel], **meta):
+    """
+    Saves vessels to a vessel library file.
+
+    Args:
+        path (str): Path of the file to write
+        vessels (Sequence[Vessel]): The vessels to save
+        **meta: Any extra (json serializable) information to store in the header, see :attr:`VesselLibrary.meta`
+    """
+    arrays = pack_vessels(vessels)
+    header = dict(version=VERSION, meta=meta, arrays={})
+    offset = 0
+    for name, arr in arrays.items():
+        header["arrays"][name] = (repr(np.lib.format.dtype_to_descr(arr.dtype)), arr.shape, offset)
+        offset += _aligned(arr.nbytes)
+    header = json.dumps(header).encode()
+    # Data starts at the first aligned position after the header
+    start = _aligned(len(MAGIC)+8+len(header))
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(header)).tobytes())
+        f.write(header)
+        for arr in arrays.values():
+            f.write(b"\0"*(start-f.tell()))
+            f.write(np.ascontiguousarray(arr).tobytes())
+            start += _aligned(arr.nbytes)
+        f.write(b"\0"*(start-f.tell()))
+
+
+class VesselLibrary:
+    """
+    A (memory mapped) vessel library file. Vessels are only built from the file when they are indexed.
+
+    Example:
+        >>> save_vessels("starts.vessels", vessels)
+        >>> library = VesselLibrary("starts.vessels")
+        >>> shelf = Shelf(library[:10])
+    """
+    def __init__(self, path: str, mmap: bool = True):
+        """
+        Args:
+            path (str): Path to the vessel library file
+            mmap (bool): If False the whole file is read into memory instead of being memory mapped
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a vessel library file")
+            n = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+            header = json.loads(f.read(n))
+        if header["version"] > VERSION:
+            raise ValueError(f"{path} was written by a newer version ({header['version']}) of the vessel library")
+        start = _aligned(len(MAGIC)+8+n)
+        buffer = np.memmap(path, dtype=np.uint8, mode="r") if mmap else np.fromfile(path, dtype=np.uint8)
+        arrays = dict()
+        for name, (descr, shape, offset) in header["arrays"].items():
+            dtype = np.lib.format.descr_to_dtype(ast.literal_eval(descr))
+            arrays[name] = np.ndarray(tuple(shape), dtype=dtype, buffer=buffer, offset=start+offset)
+        self._set_arrays(arrays, header["meta"])
+
+    def _set_arrays(self, arrays, meta):
+        #: The extra information given to :func:`save_vessels`
+        self.meta = meta
+        self.arrays = arrays
+        self._strings = self.arrays["strings"].tolist()
+        self._prototypes = dict()
+
+    @classmethod
+    def from_vessels(cls, vessels: Sequence[Vessel], **meta):
+        """
+        Makes an in-memory vessel library (without writing a file).
+
+        Args:
+            vessels (Sequence[Vessel]): The vessels to pack into the library
+            **meta: Any extra information to keep in :attr:`meta`
+        Returns:
+            VesselLibrary: A library holding the current state of the vessels
+        """
+        library = cls.__new__(cls)
+        library.path = None
+        library._set_arrays(pack_vessels(vessels), meta)
+        return library
+
+    def __len__(self):
+        return len(self.arrays["vessels"])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.get_many(range(*index.indices(len(self))))
+        if np.ndim(index) > 0:
+            return self.get_many(index)
+        return self.get(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.get(i)
+
+    def _prototype(self, registry, name, species):
+        """
+        Makes (and caches) an instance of a registered material with the given name and species properties.
+
+        Returns:
+            Tuple[Material, bool]: The instance and whether it has attributes outside of the Material slots
+        """
+        # nan is swapped for None so equal properties give equal keys
+        key = (registry, name) + tuple(None if x != x else x for x in species)
+        proto = self._prototypes.get(key)
+        if proto is None:
+            proto = material.REGISTRY[self._strings[registry]]()
+            proto._name = self._strings[name]
+            if not all(material._same(a, b) for a, b in zip(_species_row(proto), species)):
+                density = {p:(None if x != x else x) for p, x in zip(_PHASES, species)}
+                proto._species = proto._species.replace(density=density, **dict(zip(_SPECIES_FIELDS, species[len(_PHASES):])))
+            proto = self._prototypes[key] = (proto, hasattr(proto, "__dict__"))
+        return proto
+
+    def get(self, i: int) -> Vessel:
+        """
+        Builds the i'th vessel in the library.
+
+        Args:
+            i (int): Index of the vessel
+        Returns:
+            Vessel: A new vessel (which does not share memory with the file)
+        """
+        return self.unpack(i).build()
+
+    def get_many(self, indices: Sequence[int]) -> List[Vessel]:
+        """
+        Builds several vessels from the library. This is faster than calling :meth:`get` for each vessel when the
+        vessels are (mostly) next to each other in the file.
+
+        Args:
+            indices (Sequence[int]): Indices of the vessels
+        Returns:
+            List[Vessel]: The new vessels
+        """
+        rows = self.arrays["vessels"][np.asarray(indices, dtype=np.int64)].tolist()
+        if len(rows) == 0:
+            return []
+        lo = min(row[6] for row in rows)
+        hi = max(row[6]+row[7] for row in rows)
+        if hi-lo > 2*sum(row[7] for row in rows):
+            return [self._unpack(row, self.arrays["materials"][row[6]:row[6]+row[7]].tolist()).build() for row in rows]
+        # Convert all of the material rows at once
+        mat_rows = self.arrays["materials"][lo:hi].tolist()
+        return [self._unpack(row, mat_rows[row[6]-lo:row[6]-lo+row[7]]).build() for row in rows]
+
+    def unpack(self, i: int) -> "VesselState":
+        """
+        Reads the i'th vessel in the library into a :class:`VesselState`, which can build copies of the vessel
+        without going back to the library.
+
+        Args:
+            i (int): Index of the vessel
+        Returns:
+            VesselState: The state of the vessel
+        """
+        row = self.arrays["vessels"][i].tolist()
+        mat_start, n_mats = row[6], row[7]
+        return self._unpack(row, self.arrays["materials"][mat_start:mat_start+n_mats].tolist())
+
+    def _unpack(self, row, mat_rows):
+        """Reads a vessel from its row in the vessel table and its rows in the material table"""
+        arrays = self.arrays
+        strings = self._strings
+        (label, temperature, volume, default_dt, variance, ignore_layout, mat_start, n_mats, member_start, n_solvents,
+            n_solutes, n_layer_mats, amount_start, state_start, state_len, state_f64, image_start, image_len) = row
+
+        materials = tuple(self._prototype(r[1], r[2], r[_SPECIES_COLUMNS]) + (r[3:12], strings[r[0]] if r[0] >= 0 else None)
+            for r in mat_rows)
+        members = arrays["members"][member_start:member_start+n_solvents+n_solutes+n_layer_mats].tolist()
+        keys = [m[-1] for m in materials]
+        solvents = tuple(keys[j] for j in members[:n_solvents])
+        solutes = tuple(keys[j] for j in members[n_solvents:n_solvents+n_solutes])
+
+        n = n_solutes*n_solvents
+        amounts = np.array(arrays["amounts"][amount_start:amount_start+n+n_solutes+n_solvents])
+        layer_state = []
+        for j, (key, n_state) in enumerate(zip(_LAYER_FIELDS, state_len.tolist())):
+            if n_state < 0:
+                layer_state.append((key, None))
+                continue
+            dtype = np.float64 if state_f64>>j & 1 else np.float32
+            layer_state.append((key, arrays["layer_state"][state_start:state_start+n_state].astype(dtype)))
+            state_start += n_state
+        if image_start < 0:
+            image = hashed = None
+        else:
+            image = np.array(arrays["layers"][image_start:image_start+image_len])
+            hashed = arrays["hashed_layers"][image_start:image_start+image_len].astype(np.int64)
+
+        return VesselState((strings[label], temperature, volume, ignore_layout, default_dt, variance), materials,
+            solvents, solutes, tuple(members[n_solvents+n_solutes:]), amounts, n, tuple(layer_state), image, hashed)
+
+
+class VesselState(NamedTuple):
+    """
+    The state of a vessel as read from a :class:`VesselLibrary`, which can make any number of (independent) copies
+    of the vessel.
+    """
+    scalars: tuple
+    materials: tuple
+    solvents: tuple
+    solutes: tuple
+    layer_mats: tuple
+    amounts: np.ndarray
+    n_dissolved: int
+    layer_state: tuple
+    layers: Optional[np.ndarray]
+    hashed_layers: Optional[np.ndarray]
+
+    def build(self) -> Vessel:
+        """
+        Returns:
+            Vessel: A new vessel with this state
+        """
+        # Every slot is set below, so __init__ is skipped
+        v = object.__new__(Vessel)
+        v.label, v.temperature, v.volume, v.ignore_layout, v.default_dt, v._variance = self.scalars
+        v._heat_cache = None
+        v.rng = None
+        v.time = v.clock = 0.0
+        v._queue = []
+        v._pending = None
+        v._stale = False
+
+        # Materials share the species of a cached prototype, which avoids the overhead of __init__
+        mats = []
+        material_dict = dict()
+        for proto, has_dict, fields, key in self.materials:
+            if has_dict:
+                mat = copy(proto)
+            else:
+                mat = object.__new__(type(proto))
+                mat._species = proto._species
+            mat.phase, mat.mol, mat.temperature, mat.pressure, mat.polarity, mat.charge, mat._color, mat._solute, mat._solvent = fields
+            mats.append(mat)
+            if key is not None:
+                material_dict[key] = mat
+        v.material_dict = material_dict
+        v._indexed = (material_dict, frozenset(material_dict))
+        v.solvents = self.solvents
+        v.solvent_dict = {mat:i for i,mat in enumerate(self.solvents)}
+        v._layer_mats = [mats[j] for j in self.layer_mats]
+
+        n = self.n_dissolved
+        amounts = self.amounts.copy()
+        v._set_solute_rows(self.solutes, amounts[:n].reshape(len(self.solutes), len(self.solvents)))
+        v._solute_mols = amounts[n:n+len(self.solutes)]
+        v._solvent_mols = amounts[n+len(self.solutes):]
+        for key, x in self.layer_state:
+            setattr(v, key, None if x is None else x.copy())
+        v._layers = None if self.layers is None else self.layers.copy()
+        v._hashed_layers = None if self.hashed_layers is None else self.hashed_layers.copy()
+        return v
+
+
+def load_vessels(path: str, indices: Optional[Sequence[int]] = None) -> List[Vessel]:
+    """
+    Loads vessels from a vessel library file.
+
+    Args:
+        path (str): Path to the vessel library file
+        indices (Optional[Sequence[int]]): Which vessels to load (all of them if None)
+    Returns:
+        List[Vessel]: The loaded vessels
+    """
+    library = VesselLibrary(path)
+    return library[:] if indices is None else library.get_many(indices)
@@ -27,15 +27,57 @@ Property : Intended Units -- Object Type -- Brief Description
     - vapour_enthalpy: heat to vaporize in J
 
 Moreover, the `REGISTRY` variable gives a dictionary of available materials.
+Materials can also be defined by rows of a :class:`MaterialTable` (see :func:`register_table`),
+in which case their classes are only made when they are first looked up.
 '''
 
+import os
+import csv
 import inspect
 import numpy as np
 import math
 import sys
+from copy import deepcopy
+from collections.abc import MutableMapping
 from chemistrylab.util import diff_spectra as spec
 
-REGISTRY = dict()
+class MaterialRegistry(MutableMapping):
+    """
+    Dictionary of material name -> material class. Materials from a :class:`MaterialTable` are kept as
+    pending entries until they are first looked up, at which point their class is made.
+    """
+    def __init__(self):
+        self._classes = dict()
+        self._pending = dict()
+    def __getitem__(self, name):
+        if not name in self._classes:
+            table = self._pending.pop(name)
+            self._classes[name] = table.material_class(name)
+        return self._classes[name]
+    def __setitem__(self, name, material_class):
+        self._pending.pop(name, None)
+        self._classes[name] = material_class
+    def __delitem__(self, name):
+        if name in self._pending:
+            del self._pending[name]
+        else:
+            del self._classes[name]
+    def __contains__(self, name):
+        return name in self._classes or name in self._pending
+    def __iter__(self):
+        yield from self._classes
+        yield from self._pending
+    def __len__(self):
+        return len(self._classes) + len(self._pending)
+    def add_table(self, table):
+        """Adds every material in a :class:`MaterialTable` as a pending entry"""
+        for name in table.names:
+            if name in self:
+                raise Exception(f"Cannot register the same Material ({name}) Twice!")
+        for name in table.names:
+            self._pending[name] = table
+
+REGISTRY = MaterialRegistry()
 def register(*material_classes):
     for material_class in material_classes:
         key = material_class()._name
@@ -43,7 +85,82 @@ def register(*material_classes):
             raise Exception(f"Cannot register the same Material ({key}) Twice!")
         REGISTRY[key] = material_class
 
+def register_table(path: str):
+    """
+    Registers every material in a material table (see :class:`MaterialTable`).
+
+    Args:
+        path (str): Path to the csv file of the table
+    Returns:
+        MaterialTable: The loaded table
+    """
+    table = MaterialTable(path)
+    REGISTRY.add_table(table)
+    return table
+
+class MaterialSpecies:
+    """
+    The properties every instance of a material has in common. These are immutable and interned, so all instances of a
+    material share one MaterialSpecies (and its spectra) rather than each holding a copy. Setting one of these properties
+    on a :class:`Material` gives that material a new MaterialSpecies.
+    """
+    __slots__ = ("name", "molar_mass", "density", "boiling_point", "melting_point", "specific_heat", "enthalpy_fusion",
+        "enthalpy_vapor", "spectra_overlap", "spectra_no_overlap", "index")
+    def __init__(self, *fields):
+        for key, value in zip(self.__slots__, fields):
+            object.__setattr__(self, key, value)
+    def __setattr__(self, key, value):
+        raise AttributeError("MaterialSpecies is immutable")
+    def fields(self):
+        return tuple(getattr(self, key) for key in self.__slots__)
+    def replace(self, **changes):
+        """Returns the (interned) species with the given fields changed"""
+        return get_species(*(changes.get(key, value) for key, value in zip(self.__slots__, self.fields())))
+    def __copy__(self):
+        return self
+    def __deepcopy__(self, memo):
+        return self
+    def __reduce__(self):
+        return (get_species, self.fields())
+
+def _same(a, b):
+    if a is b:
+        return True
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return np.shape(a) == np.shape(b) and np.array_equal(a, b)
+    # nan never equals itself
+    return a == b or (a != a and b != b)
+
+_SPECIES = dict()
+def get_species(*fields):
+    """
+    Returns the shared :class:`MaterialSpecies` with the given fields (in the order of MaterialSpecies.__slots__),
+    making one if needed.
+    """
+    candidates = _SPECIES.setdefault(fields[0], [])
+    for species in candidates:
+        if all(_same(a, b) for a, b in zip(species.fields(), fields)):
+            return species
+    species = MaterialSpecies(*fields)
+    # Only a few variants of each material are kept around
+    if len(candidates) < 8:
+        candidates.append(species)
+    return species
+
+def _species_property(key):
+    """A property which gets / sets one field of the MaterialSpecies of a Material"""
+    def fget(self):
+        return getattr(self._species, key)
+    def fset(self, value):
+        self._species = self._species.replace(**{key: value})
+    return property(fget, fset, doc=f"The {key} of the material (shared with other instances, see :class:`MaterialSpecies`)")
+
+_NO_SPECTRA = np.zeros([0,3])
+_NO_SPECTRA.flags.writeable = False
+
 class Material:
+    __slots__ = ("polarity", "temperature", "pressure", "phase", "charge", "mol", "_color", "_solute", "_solvent", "_species")
+
     def __init__(self,
                  name="",
                  density={'s': 1.0, 'l': 1.0, 'g': 1.0},  # in g/cm**3
@@ -74,29 +191,54 @@ class Material:
         self.phase = phase
         self.charge = charge
         self.mol = mol
-
-        #Properties likely to remain constant
-        self._name = name
-        self._molar_mass = molar_mass
-        self._density = density
         self._color = color
         self._solute = solute
         self._solvent = solvent
-        self._boiling_point = boiling_point
-        self._melting_point = melting_point
-        self._specific_heat = specific_heat
-        self._enthalpy_fusion = enthalpy_fusion
-        self._enthalpy_vapor = enthalpy_vapor
 
         #dealing with spectra
         if spectra_overlap is None:
-            spectra_overlap=np.zeros([0,3])
+            spectra_overlap=_NO_SPECTRA
         if spectra_no_overlap is None:
-            spectra_no_overlap=np.zeros([0,3])
-        
-        self.spectra_overlap = spectra_overlap
-        self.spectra_no_overlap = spectra_no_overlap
-        self._index = index
+            spectra_no_overlap=_NO_SPECTRA
+
+        #Properties likely to remain constant (shared by all instances)
+        self._species = get_species(name, molar_mass, density, boiling_point, melting_point, specific_heat,
+            enthalpy_fusion, enthalpy_vapor, spectra_overlap, spectra_no_overlap, index)
+
+    _name = _species_property("name")
+    _molar_mass = _species_property("molar_mass")
+    _density = _species_property("density")
+    _boiling_point = _species_property("boiling_point")
+    _melting_point = _species_property("melting_point")
+    _specific_heat = _species_property("specific_heat")
+    _enthalpy_fusion = _species_property("enthalpy_fusion")
+    _enthalpy_vapor = _species_property("enthalpy_vapor")
+    spectra_overlap = _species_property("spectra_overlap")
+    spectra_no_overlap = _species_property("spectra_no_overlap")
+    _index = _species_property("index")
+
+    def __copy__(self):
+        new = self.__class__.__new__(self.__class__)
+        for key in Material.__slots__:
+            object.__setattr__(new, key, getattr(self, key))
+        if hasattr(self, "__dict__"):
+            new.__dict__.update(self.__dict__)
+        return new
+    def __deepcopy__(self, memo):
+        # Every slot is either immutable or the (shared) species, so only subclass attributes need a deep copy
+        new = self.__copy__()
+        if hasattr(self, "__dict__"):
+            new.__dict__.update(deepcopy(self.__dict__, memo))
+        return new
+    def __getstate__(self):
+        # Defined explicitly since object.__getstate__ only exists from python 3.11
+        return (getattr(self, "__dict__", None) or None, {key: getattr(self, key) for key in Material.__slots__})
+    def __setstate__(self, state):
+        attrs, slots = state
+        for key, value in slots.items():
+            object.__setattr__(self, key, value)
+        if attrs:
+            self.__dict__.update(attrs)
 
     #Hashing / Naming properties
     def __repr__(self):
@@ -121,16 +263,16 @@ class Material:
     #Derived quantities
     @property
     def heat_capacity(self):
-        return self.mol*self._molar_mass*self._specific_heat
+        return self.mol*self._species.molar_mass*self._species.specific_heat
     @property
     def litres(self):
-        return 1e-3*self.mol*self._molar_mass/self._density[self.phase]
+        return 1e-3*self.mol*self._species.molar_mass/self._species.density[self.phase]
     @property
     def litres_per_mol(self):
-        return 1e-3*self._molar_mass/self._density[self.phase]
+        return 1e-3*self._species.molar_mass/self._species.density[self.phase]
     @property
     def vapour_enthalpy(self):
-        return self.mol*self._enthalpy_vapor
+        return self.mol*self._species.enthalpy_vapor
 
     def ration(self,ratio):
         """
@@ -226,9 +368,148 @@ class Material:
     def get_index(self):
         return self._index
 
+class TableMaterial(Material):
+    """
+    A material whose properties come from a row of a :class:`MaterialTable`.
+    The registry makes one subclass per row (with the row stored in `_kwargs`).
+    """
+    __slots__ = ()
+    _kwargs = dict(name="")
+    def __init__(self, mol=0):
+        super().__init__(mol=mol, **self._kwargs)
+    def __reduce__(self):
+        # The subclasses are made at runtime, so they are looked up by name in the registry when unpickling
+        return (_registered_material, (self._name,), self.__getstate__())
+
+def _registered_material(name):
+    return REGISTRY[name]()
+
+class MaterialTable:
+    """
+    A table of materials stored as a csv file with one row per material, and a .npy file (with the same name)
+    containing the spectra of every material stacked into one [n_peaks, 3] array. Rows refer to their spectra with
+    [start, stop) row ranges, and the .npy file is memory-mapped so spectra are only read when used.
+
+    Columns (empty means None):
+        name, density_s, density_l, density_g, polarity, temperature, pressure, phase, charge, molar_mass, color,
+        solute, solvent, boiling_point, melting_point, specific_heat, enthalpy_fusion, enthalpy_vapor, index,
+        overlap_start, overlap_stop, no_overlap_start, no_overlap_stop
+
+    Args:
+        path (str): Path to the csv file
+    """
+    FLOAT_COLUMNS = ("density_s", "density_l", "density_g", "polarity", "temperature", "pressure", "charge", "molar_mass",
+        "color", "boiling_point", "melting_point", "specific_heat", "enthalpy_fusion", "enthalpy_vapor")
+    INT_COLUMNS = ("solute", "solvent", "index", "overlap_start", "overlap_stop", "no_overlap_start", "no_overlap_stop")
+    COLUMNS = ("name", "phase") + FLOAT_COLUMNS + INT_COLUMNS
+
+    def __init__(self, path: str):
+        self.path = path
+        self.spectra_path = os.path.splitext(path)[0] + ".npy"
+        with open(path, newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            rows = list(reader)
+        columns = list(zip(*rows)) if rows else [()]*len(header)
+        columns = {key: columns[header.index(key)] for key in self.COLUMNS}
+        # Store the table as compact columns
+        self.names = columns["name"]
+        self.phases = columns["phase"]
+        self._floats = np.array([[a or "nan" for a in columns[key]] for key in self.FLOAT_COLUMNS], dtype=np.float64).reshape(len(self.FLOAT_COLUMNS), -1)
+        self._ints = np.array([[a or "-1" for a in columns[key]] for key in self.INT_COLUMNS], dtype=np.float64).astype(np.int64).reshape(len(self.INT_COLUMNS), -1)
+        self._rows = {name: i for i, name in enumerate(self.names)}
+        self._spectra = None
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def spectra(self):
+        """The memory-mapped [n_peaks, 3] array of spectra"""
+        if self._spectra is None:
+            self._spectra = np.load(self.spectra_path, mmap_mode="r")
+        return self._spectra
+
+    def material_kwargs(self, name: str):
+        """
+        Returns:
+            dict: The keyword arguments of :class:`Material` for the given material
+        """
+        i = self._rows[name]
+        floats = {key: float(self._floats[k, i]) for k, key in enumerate(self.FLOAT_COLUMNS)}
+        floats = {key: None if math.isnan(a) else a for key, a in floats.items()}
+        ints = {key: int(self._ints[k, i]) for k, key in enumerate(self.INT_COLUMNS)}
+        return dict(
+            name=name,
+            density={'s': floats["density_s"], 'l': floats["density_l"], 'g': floats["density_g"]},
+            polarity=floats["polarity"],
+            temperature=floats["temperature"],
+            pressure=floats["pressure"],
+            phase=self.phases[i],
+            charge=floats["charge"],
+            molar_mass=floats["molar_mass"],
+            color=floats["color"],
+            solute=bool(ints["solute"]),
+            solvent=bool(ints["solvent"]),
+            boiling_point=floats["boiling_point"],
+            melting_point=floats["melting_point"],
+            specific_heat=floats["specific_heat"],
+            enthalpy_fusion=floats["enthalpy_fusion"],
+            enthalpy_vapor=floats["enthalpy_vapor"],
+            # Views of the memory-mapped spectra
+            spectra_overlap=np.asarray(self.spectra[ints["overlap_start"]:ints["overlap_stop"]]),
+            spectra_no_overlap=np.asarray(self.spectra[ints["no_overlap_start"]:ints["no_overlap_stop"]]),
+            index=None if ints["index"] < 0 else ints["index"],
+        )
+
+    def material_class(self, name: str):
+        """
+        Returns:
+            type: A :class:`TableMaterial` subclass for the given material
+        """
+        return type(name, (TableMaterial,), dict(_kwargs=self.material_kwargs(name), __slots__=()))
+
+    @staticmethod
+    def write(path: str, materials):
+        """
+        Writes a material table (ex. to convert class based materials into a table).
+
+        Args:
+            path (str): Path of the csv file to write (the spectra are written next to it)
+            materials (Iterable[Material]): The materials to include in the table
+        """
+        rows = []
+        spectra = []
+        n_peaks = 0
+        for mat in materials:
+            ranges = []
+            for s in (mat.spectra_overlap, mat.spectra_no_overlap):
+                s = np.asarray(s, dtype=np.float64).reshape(-1, 3)
+                spectra.append(s)
+                ranges += [n_peaks, n_peaks + len(s)]
+                n_peaks += len(s)
+            optional = lambda a: "" if a is None else repr(float(a))
+            rows.append(dict(
+                name=mat._name, phase=mat.phase,
+                density_s=optional(mat._density.get('s')), density_l=optional(mat._density.get('l')), density_g=optional(mat._density.get('g')),
+                polarity=optional(mat.polarity), temperature=optional(mat.temperature), pressure=optional(mat.pressure),
+                charge=optional(mat.charge), molar_mass=optional(mat._molar_mass), color=optional(mat._color),
+                boiling_point=optional(mat._boiling_point), melting_point=optional(mat._melting_point),
+                specific_heat=optional(mat._specific_heat), enthalpy_fusion=optional(mat._enthalpy_fusion),
+                enthalpy_vapor=optional(mat._enthalpy_vapor), solute=int(mat._solute), solvent=int(mat._solvent),
+                index="" if mat._index is None else int(mat._index),
+                overlap_start=ranges[0], overlap_stop=ranges[1], no_overlap_start=ranges[2], no_overlap_stop=ranges[3],
+            ))
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=MaterialTable.COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+        np.save(os.path.splitext(path)[0] + ".npy", np.concatenate(spectra) if spectra else np.zeros([0, 3]))
+
 ## ---------- ## PRE-DEFINED MATERIALS ## ---------- ##
 
 class Air(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          name='Air',
@@ -244,6 +525,7 @@ class Air(Material):
 
 
 class H2O(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          name='H2O',
@@ -265,6 +547,7 @@ class H2O(Material):
 
 
 class H(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          name='H',
@@ -282,6 +565,7 @@ class H(Material):
 
 
 class H2(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          name='H2',
@@ -300,6 +584,7 @@ class H2(Material):
 
 
 class O(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          name='O',
@@ -318,6 +603,7 @@ class O(Material):
 
 
 class O2(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          name='O2',
@@ -336,6 +622,7 @@ class O2(Material):
 
 
 class O3(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          name='O3',
@@ -354,6 +641,7 @@ class O3(Material):
 
 
 class C6H14(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          name='C6H14',
@@ -373,6 +661,7 @@ class C6H14(Material):
 
 
 class NaCl(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          name='NaCl',
@@ -411,6 +700,7 @@ class NaCl(Material):
 
 # Polarity is dependant on charge for atoms
 class Na(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          name='Na',
@@ -452,6 +742,7 @@ class Na(Material):
 
 # Note: Cl is very unstable when not an aqueous ion
 class Cl(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          name='Cl',
@@ -491,6 +782,7 @@ class Cl(Material):
         return [[[prep_Na, prep_Cl], [prep_NaCl]]]
 
 class Cl2(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          name='Cl2',
@@ -509,6 +801,7 @@ class Cl2(Material):
 
 
 class LiF(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          name='LiF',
@@ -527,6 +820,7 @@ class LiF(Material):
 
 
 class Li(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          name='Li',
@@ -545,6 +839,7 @@ class Li(Material):
 
 
 class F2(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          name='F2',
@@ -563,6 +858,7 @@ class F2(Material):
 
 
 class CuSO4(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          name='CuS04',
@@ -584,6 +880,7 @@ class CuSO4(Material):
 
 
 class CuSO4Pentahydrate(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          name='CuS04*5H2O',
@@ -607,6 +904,7 @@ class CuSO4Pentahydrate(Material):
 ## ---------- ## HYDROCARBONS ## ---------- ##
 
 class Dodecane(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          
@@ -630,6 +928,7 @@ class Dodecane(Material):
 
 
 class OneChlorohexane(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          
@@ -655,6 +954,7 @@ class OneChlorohexane(Material):
 
 
 class TwoChlorohexane(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          
@@ -680,6 +980,7 @@ class TwoChlorohexane(Material):
 
 
 class ThreeChlorohexane(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          
@@ -705,6 +1006,7 @@ class ThreeChlorohexane(Material):
 
 
 class FiveMethylundecane(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          
@@ -728,6 +1030,7 @@ class FiveMethylundecane(Material):
 
 
 class FourEthyldecane(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          
@@ -751,6 +1054,7 @@ class FourEthyldecane(Material):
 
 
 class FiveSixDimethyldecane(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          
@@ -774,6 +1078,7 @@ class FiveSixDimethyldecane(Material):
 
 
 class FourEthylFiveMethylnonane(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          
@@ -797,6 +1102,7 @@ class FourEthylFiveMethylnonane(Material):
 
 
 class FourFiveDiethyloctane(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          
@@ -820,6 +1126,7 @@ class FourFiveDiethyloctane(Material):
 
 
 class Ethoxyethane(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          
@@ -844,6 +1151,7 @@ class Ethoxyethane(Material):
 
 
 class EthylAcetate(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          
@@ -868,6 +1176,7 @@ class EthylAcetate(Material):
 
 
 class DiEthylEther(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          
@@ -890,6 +1199,7 @@ class DiEthylEther(Material):
         )
 
 class A(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          
@@ -914,6 +1224,7 @@ class A(Material):
         )
 
 class B(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          
@@ -939,6 +1250,7 @@ class B(Material):
 
 
 class C(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          
@@ -964,6 +1276,7 @@ class C(Material):
 
 
 class D(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          
@@ -989,6 +1302,7 @@ class D(Material):
 
 
 class E(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          
@@ -1014,6 +1328,7 @@ class E(Material):
 
 
 class F(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          
@@ -1039,6 +1354,7 @@ class F(Material):
 
 
 class G(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          
@@ -1064,6 +1380,7 @@ class G(Material):
 
 
 class H(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          
@@ -1089,6 +1406,7 @@ class H(Material):
 
 
 class I(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          
@@ -1116,6 +1434,7 @@ class I(Material):
 
 
 class MethylRed(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          
@@ -1142,6 +1461,7 @@ class MethylRed(Material):
 
 
 class HCl(Material):
+    __slots__ = ()
     def __init__(self, mol=0):
         super().__init__(mol=mol,
                          
@@ -1164,4 +1484,4 @@ class HCl(Material):
         )
 
 
-register(*Material.__subclasses__())
\ No newline at end of file
+register(*(c for c in Material.__subclasses__() if c is not TableMaterial))
\ No newline at end of file
@@ -1,8 +1,12 @@
+import os
+import pickle
 import numpy as np
 import numba
+from collections import OrderedDict
 from scipy.integrate import solve_ivp
+from scipy.linalg import expm
 from chemistrylab import material,vessel
-from typing import NamedTuple, Tuple, Callable, Optional, List
+from typing import NamedTuple, Tuple, Callable, Optional, List, Union
 
 from chemistrylab.reactions.reaction_info import ReactInfo
 
@@ -33,7 +37,7 @@ def _set_amounts(materials, solvents, material_classes, n, vessel):
 
 
 
-@numba.jit(nopython=True)
+@numba.jit(nopython=True, nogil=True)
 def get_rates(stoich_coeff_arr, pre_exp_arr, activ_energy_arr, conc_coeff_arr, num_reagents, temp, conc):
     """
     Finds the rate of reaction :math:`\\frac{dy}{dt}`
@@ -67,7 +71,7 @@ def get_rates(stoich_coeff_arr, pre_exp_arr, activ_energy_arr, conc_coeff_arr, n
     
     return conc_change
 
-@numba.njit
+@numba.njit(nogil=True)
 def newton_solve(stoich_coeff_arr, pre_exp_arr, activ_energy_arr, conc_coeff_arr, num_reagents, temp, conc, dt, N):
     """
 
@@ -145,18 +149,306 @@ def newton_solve(stoich_coeff_arr, pre_exp_arr, activ_energy_arr, conc_coeff_arr
     return conc
    
 
+class SparseStoich(NamedTuple):
+    """
+    CSR-style (compressed sparse row) form of the coefficient arrays of a :class:`~chemistrylab.reactions.reaction_info.ReactInfo`.
+
+    The rate of reaction i is :math:`k_i \\prod_n conc[rate\\_idx_n]^{rate\\_exp_n}` for n in ``range(rate_ptr[i], rate_ptr[i+1])``,
+    and reaction i changes the concentration of material ``change_idx[n]`` by ``change_coef[n]`` times its rate
+    for n in ``range(change_ptr[i], change_ptr[i+1])``. Only nonzero coefficients are stored, so rate calculations are O(nnz).
+    """
+    rate_ptr:    np.ndarray
+    rate_idx:    np.ndarray
+    rate_exp:    np.ndarray
+    change_ptr:  np.ndarray
+    change_idx:  np.ndarray
+    change_coef: np.ndarray
+
+    @staticmethod
+    def from_dense(stoich_coeff_arr: np.ndarray, conc_coeff_arr: np.ndarray):
+        """
+        Args:
+            stoich_coeff_arr (np.ndarray): The [reactions, reactants] array of rate exponents
+            conc_coeff_arr (np.ndarray): The [materials, reactions] array of concentration coefficients
+        Returns:
+            SparseStoich: The sparse form of the coefficient arrays
+        """
+        def csr(arr):
+            arr = np.asarray(arr, dtype=np.float64)
+            if arr.ndim == 1:
+                arr = arr[:, None]
+            rows, cols = np.nonzero(arr)
+            ptr = np.zeros(arr.shape[0]+1, dtype=np.int64)
+            np.cumsum(np.bincount(rows, minlength=arr.shape[0]), out=ptr[1:])
+            return ptr, cols.astype(np.int64), arr[rows, cols]
+        # np.nonzero goes row by row, so changes are listed per reaction in increasing material order
+        return SparseStoich(*csr(stoich_coeff_arr), *csr(np.transpose(conc_coeff_arr)))
+
+
+@numba.njit(nogil=True)
+def _sparse_rates(k, conc, rate_ptr, rate_idx, rate_exp):
+    """Rates of each reaction given rate constants k (see :class:`SparseStoich`)"""
+    rates = np.empty(k.shape[0])
+    for i in range(k.shape[0]):
+        r = k[i]
+        for n in range(rate_ptr[i], rate_ptr[i+1]):
+            r *= conc[rate_idx[n]] ** rate_exp[n]
+        rates[i] = r
+    return rates
+
+@numba.njit(nogil=True)
+def _sparse_changes(rates, change_ptr, change_idx, change_coef, d_conc):
+    """Writes the concentration change due to each reaction rate into d_conc (see :class:`SparseStoich`)"""
+    d_conc[:] = 0
+    for j in range(rates.shape[0]):
+        for n in range(change_ptr[j], change_ptr[j+1]):
+            d_conc[change_idx[n]] += change_coef[n]*rates[j]
+
+@numba.njit(nogil=True)
+def _sparse_jacobian(k, conc, rate_ptr, rate_idx, rate_exp):
+    """Rates of each reaction, and their derivatives with respect to each concentration (see :class:`SparseStoich`)"""
+    rates = _sparse_rates(k, conc, rate_ptr, rate_idx, rate_exp)
+    jac = np.zeros((k.shape[0], conc.shape[0]))
+    for i in range(k.shape[0]):
+        for n in range(rate_ptr[i], rate_ptr[i+1]):
+            d = k[i] * rate_exp[n] * conc[rate_idx[n]] ** (rate_exp[n] - 1)
+            for m in range(rate_ptr[i], rate_ptr[i+1]):
+                if m != n:
+                    d *= conc[rate_idx[m]] ** rate_exp[m]
+            jac[i, rate_idx[n]] = d
+    return rates, jac
+
+@numba.njit(nogil=True)
+def get_rates_sparse(pre_exp_arr, activ_energy_arr, temp, conc, rate_ptr, rate_idx, rate_exp, change_ptr, change_idx, change_coef):
+    """
+    Sparse version of :func:`get_rates`, which runs in O(nnz) rather than O(reactions*materials)
+
+    Args:
+        temp (float): The temperature of the reactions
+        conc (np.array): The concentrations of the materials
+        pre_exp_arr, activ_energy_arr (np.array): See :class:`~chemistrylab.reactions.reaction_info.ReactInfo`
+        rate_ptr, ..., change_coef (np.array): The fields of a :class:`SparseStoich`
+
+    Returns:
+        np.array: Rates of change in concentration :math:`\\frac{dy}{dt}`.
+    """
+    R = 8.314462619
+    conc = np.clip(conc, 0, None)
+    #k are the reaction constants
+    k = pre_exp_arr * np.exp((-1.0 * activ_energy_arr) / (R * temp))
+    rates = _sparse_rates(k, conc, rate_ptr, rate_idx, rate_exp)
+    conc_change = np.zeros(conc.shape[0])
+    _sparse_changes(rates, change_ptr, change_idx, change_coef, conc_change)
+    return conc_change
+
+@numba.njit(nogil=True)
+def newton_solve_sparse(pre_exp_arr, activ_energy_arr, temp, conc, dt, N, rate_ptr, rate_idx, rate_exp, change_ptr, change_idx, change_coef):
+    """
+    Sparse version of :func:`newton_solve` (each step runs in O(nnz) rather than O(reactions*materials))
+
+    Args:
+        temp (float): The temperature of the reactions
+        conc (np.array): The initial concentrations of the materials
+        dt (float): The amount of time to pass
+        N (int): The minimum number of time-steps to break dt into
+        pre_exp_arr, activ_energy_arr (np.array): See :class:`~chemistrylab.reactions.reaction_info.ReactInfo`
+        rate_ptr, ..., change_coef (np.array): The fields of a :class:`SparseStoich`
+
+    Returns:
+        np.array: The final concentrations y(dt)
+    """
+    R = 8.314462619
+    #if your updates are below 5e-4 you can increase factor (I decided this is a good number)
+    targ = 5e-4
+    
+    ddt=dt/N
+    
+    k = (ddt*pre_exp_arr) * np.exp((-1.0 * activ_energy_arr) / (R * temp))
+    
+    factor=1
+    d_conc=conc*0
+    while dt>0:
+        conc = np.clip(conc, 0, None)
+        rates = _sparse_rates(k, conc, rate_ptr, rate_idx, rate_exp)
+        _sparse_changes(rates, change_ptr, change_idx, change_coef, d_conc)
+        
+        #maximum proportion of material reduction        
+        ratio=np.max(-d_conc/(conc+1e-6))
+        
+        #mess with the step size to make sure you don't get any super huge concentration decreases
+        while ratio*factor<targ and factor<10:
+            factor*=2
+        while ratio*factor>0.1:
+            factor*=0.5
+        if factor*ddt>=dt:
+            factor = dt/ddt
+            dt=0
+        
+        dt-=factor*ddt
+        # Add concentration changes
+        conc+=d_conc*factor
+
+    return conc
+
+@numba.njit(nogil=True)
+def newton_solve_sparse_batch(pre_exp_arr, activ_energy_arr, temps, conc, dts, N, rate_ptr, rate_idx, rate_exp, change_ptr, change_idx, change_coef):
+    """
+    Runs :func:`newton_solve_sparse` on each row of a [vessels, materials] concentration array in one call
+
+    Args:
+        temps (np.array): The temperature of each row
+        conc (np.array): The initial concentrations (2D array)
+        dts (np.array): The amount of time to pass for each row
+        *: See :func:`newton_solve_sparse`
+
+    Returns:
+        np.array: The final concentrations of each row
+    """
+    out = np.empty_like(conc)
+    for i in range(conc.shape[0]):
+        out[i] = newton_solve_sparse(pre_exp_arr, activ_energy_arr, temps[i], conc[i].copy(), dts[i], N,
+            rate_ptr, rate_idx, rate_exp, change_ptr, change_idx, change_coef)
+    return out
+
+
+def linear_reactions(stoich_coeff_arr: np.ndarray, conc_coeff_arr: np.ndarray):
+    """
+    Finds the reactions in linear sub-networks. These are groups of materials which only ever react with each other,
+    and only through first-order reactions (rate proportional to the concentration of a single reactant).
+    Such groups evolve independently of the rest of the network, and exactly as :math:`y(t+dt) = e^{K dt}y(t)`.
+
+    Args:
+        stoich_coeff_arr (np.ndarray): The [reactions, reactants] array of rate exponents
+        conc_coeff_arr (np.ndarray): The [materials, reactions] array of concentration coefficients
+    Returns:
+        np.ndarray: A boolean mask of the reactions which belong to a linear sub-network
+    """
+    stoich = np.asarray(stoich_coeff_arr, dtype=np.float64)
+    if stoich.ndim == 1:
+        stoich = stoich[:, None]
+    conc_coeff = np.asarray(conc_coeff_arr, dtype=np.float64)
+    # Union-find over the materials, joining everything involved in the same reaction
+    parent = list(range(conc_coeff.shape[0]))
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    roots = []
+    for j in range(stoich.shape[0]):
+        involved = np.union1d(np.nonzero(stoich[j])[0], np.nonzero(conc_coeff[:, j])[0])
+        for i in involved[1:]:
+            parent[find(i)] = find(involved[0])
+        roots.append(involved[0] if len(involved) else -1)
+    roots = [find(i) if i >= 0 else -1 for i in roots]
+    first_order = (np.count_nonzero(stoich, axis=1) == 1) & (stoich.sum(axis=1) == 1)
+    nonlinear_roots = {root for root, linear in zip(roots, first_order) if not linear}
+    return np.array([bool(linear) and root not in nonlinear_roots for root, linear in zip(roots, first_order)], dtype=bool)
+
+
+def _read_only(arr):
+    arr = np.array(arr)
+    arr.setflags(write=False)
+    return arr
+
+
+class CompiledReaction(NamedTuple):
+    """
+    Preprocessed reaction information which is shared (read-only) between every :class:`Reaction` made from it.
+    Use :func:`load_reaction` to get these through the process-wide cache.
+    """
+    react_info:       ReactInfo
+    sparse:           SparseStoich
+    material_classes: Tuple[type]
+
+    @staticmethod
+    def compile(react_info: ReactInfo):
+        """
+        Args:
+            react_info (ReactInfo): Named Tuple containing all necessary reaction information
+        Returns:
+            CompiledReaction: A read-only copy of react_info (with tuples instead of lists) alongside its sparse form
+        """
+        react_info = ReactInfo(**{key: _read_only(val) if "_arr" in key else (tuple(val) if isinstance(val, list) else val)
+            for key, val in react_info._asdict().items()})
+        sparse = SparseStoich.from_dense(react_info.stoich_coeff_arr, react_info.conc_coeff_arr)
+        sparse = SparseStoich(*(_read_only(arr) for arr in sparse))
+        return CompiledReaction(react_info, sparse, tuple(material.REGISTRY[key] for key in react_info.MATERIALS))
+
+    def save(self, fn: str):
+        """
+        Saves the reaction in a binary form which is faster to load than json (see :func:`load_reaction`)
+
+        Args:
+            fn (str): The filename to save as.
+        """
+        # Material classes are looked up again on load, so only the arrays and names are stored
+        with open(fn, "wb") as f:
+            pickle.dump((self.react_info, self.sparse), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(fn: str):
+        """
+        Args:
+            fn (str): A file created by :meth:`CompiledReaction.save`
+        Returns:
+            CompiledReaction: The reaction stored in the file
+        """
+        with open(fn, "rb") as f:
+            react_info, sparse = pickle.load(f)
+        for arr in react_info + sparse:
+            if isinstance(arr, np.ndarray):
+                arr.setflags(write=False)
+        return CompiledReaction(react_info, sparse, tuple(material.REGISTRY[key] for key in react_info.MATERIALS))
+
+
+_REACTION_CACHE = dict()
+
+def load_reaction(fn: str):
+    """
+    Loads a reaction from a json file (see :meth:`ReactInfo.from_json`), or a binary file made with :meth:`CompiledReaction.save`.
+
+    Reactions are cached for the whole process, so each file is only parsed and compiled once (or again if it is modified).
+
+    Args:
+        fn (str): The file to load
+    Returns:
+        CompiledReaction: The (shared, read-only) compiled reaction
+    """
+    path = os.path.realpath(fn)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _REACTION_CACHE.get(path)
+    if cached is None or cached[0] != mtime:
+        if path.endswith(".json"):
+            compiled = CompiledReaction.compile(ReactInfo.from_json(path))
+        else:
+            compiled = CompiledReaction.load(path)
+        cached = _REACTION_CACHE[path] = (mtime, compiled)
+    return cached[1]
+
+
 class Reaction():
-    def __init__(self,react_info: ReactInfo, solver: str = 'RK45', newton_steps: int = 100):
+    def __init__(self,react_info: Union[ReactInfo, CompiledReaction], solver: str = 'RK45', newton_steps: int = 100,
+            steady_state_tol: Optional[float] = None):
         """
 
         A class to update concentrations of the materials in a vessel according to a reaction.
 
         Args:
-            react_info (ReactInfo): Named Tuple containing all necessary reaction information
+            react_info (Union[ReactInfo, CompiledReaction]): Named Tuple containing all necessary reaction information
+                (a CompiledReaction from :func:`load_reaction` skips all preprocessing)
             solver (str): Which solver to use
             newton_steps (int): How many steps to use when the solver is 'newton'
+            steady_state_tol (Optional[float]): If set, react jumps directly to the steady state whenever it is estimated
+                to be reached (to within this many mol/L) before dt is up (see :meth:`steady_state`)
         """
         
+        if isinstance(react_info, CompiledReaction):
+            compiled = react_info
+        else:
+            compiled = CompiledReaction.compile(react_info)
+        react_info = compiled.react_info
+
         if not solver in {'RK45', 'RK23', 'DOP853', 'DBF', 'LSODA','newton'}:
             solver='RK45'
         self.solver=solver
@@ -171,7 +463,7 @@ class Reaction():
         #Concatenate all of the materials (this should realistically be done in the reaction file since it has a direct
         #Impact on the conc_coeff_arr
         self.materials=react_info.MATERIALS
-        self.material_classes = tuple(material.REGISTRY[key] for key in self.materials)
+        self.material_classes = compiled.material_classes
         
         #Necessary for calculating rates
         self.stoich_coeff_arr = react_info.stoich_coeff_arr
@@ -179,6 +471,53 @@ class Reaction():
         self.activ_energy_arr = react_info.activ_energy_arr
         self.conc_coeff_arr = react_info.conc_coeff_arr
         self.num_reagents = len(self.reactants)
+        #Sparse form of the coefficient arrays used by the rate calculations
+        self.sparse = compiled.sparse
+
+        #Linear sub-networks are integrated exactly with a matrix exponential (see linear_reactions)
+        linear = linear_reactions(self.stoich_coeff_arr, self.conc_coeff_arr)
+        self.linear_species = np.unique(np.nonzero(self.conc_coeff_arr[:, linear])[0])
+        self._linear_reagents = np.argmax(self.stoich_coeff_arr[linear], axis=1)
+        self._linear_coeff = self.conc_coeff_arr[np.ix_(self.linear_species, linear)]
+        self._linear_rate_args = (self.pre_exp_arr[linear], self.activ_energy_arr[linear])
+        self.steady_state_tol = steady_state_tol
+        self._mass_balance = None
+        #Maximum number of (temperature, dt) propagators to keep
+        self.propagator_cache_size = 64
+        self._propagators = OrderedDict()
+        #Everything else goes to the solver
+        self.n_nonlinear = int((~linear).sum())
+        if linear.any():
+            self._nonlinear_args = (self.pre_exp_arr[~linear], self.activ_energy_arr[~linear],
+                SparseStoich.from_dense(self.stoich_coeff_arr[~linear], self.conc_coeff_arr[:, ~linear]))
+        else:
+            self._nonlinear_args = (self.pre_exp_arr, self.activ_energy_arr, self.sparse)
+
+    def propagator(self, temp: float, dt: float):
+        """
+        Args:
+            temp (float): The temperature of the system in Kelvin.
+            dt (float): The time-step in seconds.
+        Returns:
+            np.ndarray: The matrix :math:`e^{K dt}` taking the concentrations of :attr:`linear_species` from time t to t+dt
+        """
+        key = (temp, dt)
+        P = self._propagators.get(key)
+        if P is not None:
+            self._propagators.move_to_end(key)
+            return P
+        R = 8.314462619
+        pre_exp, activ_energy = self._linear_rate_args
+        k = pre_exp * np.exp((-1.0 * activ_energy) / (R * temp))
+        # column of each reagent in the linear block
+        cols = np.searchsorted(self.linear_species, self._linear_reagents)
+        K = np.zeros((self.linear_species.shape[0],)*2)
+        np.add.at(K, (slice(None), cols), self._linear_coeff*k)
+        P = expm(K*dt)
+        self._propagators[key] = P
+        if len(self._propagators) > self.propagator_cache_size:
+            self._propagators.popitem(last=False)
+        return P
 
     def update_concentrations(self,vessel: vessel.Vessel, dt: float = 0):
         """
@@ -203,6 +542,114 @@ class Reaction():
         #set the updated concentrations
         _set_amounts(self.materials, self.solvents, self.material_classes, new_n, vessel)
         
+    def update_concentrations_batch(self, vessels: List[vessel.Vessel], dt: np.ndarray):
+        """
+        Same as calling :meth:`update_concentrations` on each vessel, but the reactions of every vessel are
+        integrated together (see :meth:`react_batch`).
+
+        Args:
+            vessels (List[Vessel]): The vessels to perform the reaction on
+            dt (np.ndarray): The amount of time passed in each vessel (0 for the vessel's default_dt)
+        """
+        n = np.array([_get_amounts(self.materials, v) for v in vessels]).reshape(len(vessels), len(self.materials))
+        active = np.nonzero(n.sum(axis=1) >= 1e-12)[0]
+        if active.shape[0] == 0:
+            return
+        vessels = [vessels[i] for i in active]
+        temperature = np.array([v.temperature for v in vessels], dtype=np.float64)
+        current_volume = np.array([v.filled_volume() for v in vessels], dtype=np.float64)
+        dt = np.array([t if t != 0 else v.default_dt for v, t in zip(vessels, dt[active])], dtype=np.float64)
+
+        new_n = self.react_batch(n[active], temperature, current_volume, dt)
+        for v, row in zip(vessels, new_n):
+            _set_amounts(self.materials, self.solvents, self.material_classes, row, v)
+
+    def _rates_and_jacobian(self, k, conc):
+        """
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The rate of each reaction, and their derivatives with respect to each concentration
+        """
+        return _sparse_jacobian(k, np.clip(conc, 0, None), *self.sparse[:3])
+
+    def _get_mass_balance(self):
+        """
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Orthonormal bases of the concentration changes the reactions can make, and of what they conserve
+        """
+        if self._mass_balance is None:
+            U, S, _ = np.linalg.svd(self.conc_coeff_arr)
+            rank = int((S > 1e-10 * S.max()).sum()) if S.size else 0
+            self._mass_balance = (U[:, :rank], U[:, rank:])
+        return self._mass_balance
+
+    def _rate_constants(self, temp):
+        R = 8.314462619
+        return self.pre_exp_arr * np.exp((-1.0 * self.activ_energy_arr) / (R * temp))
+
+    def steady_state(self, conc: np.ndarray, temp: float, max_iter: int = 50):
+        """
+        Solves for the steady state reached from the given concentrations, using Newton's method on the rate equations
+        together with mass balance constraints (everything conserved by the reactions keeps its current value).
+
+        Args:
+            conc (np.ndarray): The current concentrations of the materials (mol/L)
+            temp (float): The temperature of the system in Kelvin.
+            max_iter (int): The maximum number of Newton iterations
+        Returns:
+            Tuple[Optional[np.ndarray], float]:
+                - The steady state concentrations (None if no stable steady state was found)
+                - The slowest relaxation rate (1/s) of the linearized dynamics around the steady state
+        """
+        Q, W = self._get_mass_balance()
+        N = self.conc_coeff_arr
+        k = self._rate_constants(temp)
+        scale = np.abs(conc).max() + 1e-12
+        y = conc.copy()
+        for _ in range(max_iter):
+            rates, jac = self._rates_and_jacobian(k, y)
+            F = np.concatenate([Q.T @ (N @ rates), W.T @ (y - conc)])
+            J = np.vstack([Q.T @ N @ jac, W.T])
+            try:
+                step = np.linalg.solve(J, -F)
+            except np.linalg.LinAlgError:
+                return None, 0.0
+            y_next = np.clip(y + step, 0, None)
+            converged = np.abs(y_next - y).max() <= 1e-12 * scale
+            y = y_next
+            if converged:
+                break
+        else:
+            return None, 0.0
+        rates, jac = self._rates_and_jacobian(k, y)
+        # Clipping can break mass balance, in which case this is not a reachable steady state
+        if np.abs(W.T @ (y - conc)).max() > 1e-8 * scale:
+            return None, 0.0
+        # A steady state is only reached if every mode of the linearized dynamics decays
+        eig = np.linalg.eigvals(Q.T @ N @ jac @ Q) if Q.shape[1] else np.zeros(0)
+        rate = float(np.min(-eig.real)) if eig.size else np.inf
+        if rate <= 0:
+            return None, 0.0
+        return y, rate
+
+    def _fast_forward(self, conc, temp, dt):
+        """
+        Returns the steady state if it is estimated to be reached (to within steady_state_tol) in less than dt, otherwise None
+        """
+        # Skip the solve if dt is under one relaxation time of the fastest mode (the 2-norm bounds how fast any mode decays)
+        Q, W = self._get_mass_balance()
+        rates, jac = self._rates_and_jacobian(self._rate_constants(temp), conc)
+        if Q.shape[1] == 0 or np.linalg.norm(Q.T @ self.conc_coeff_arr @ jac @ Q, 2) * dt < 1:
+            return None
+        y, rate = self.steady_state(conc, temp)
+        if y is None:
+            return None
+        tol = self.steady_state_tol
+        distance = np.abs(y - conc).max()
+        # Close to the steady state, the distance to it decays like exp(-rate*t)
+        if distance <= tol or np.log(distance / tol) / rate < dt:
+            return y
+        return None
+
     def react(self, n: np.array, temp: float, volume: float, dt: float):
         """
         Args:
@@ -217,29 +664,89 @@ class Reaction():
         self.temp = temp
         conc=n/volume
         
-        
-        if self.solver=='newton':
+        if self.steady_state_tol is not None:
+            new_conc = self._fast_forward(conc, temp, dt)
+            if new_conc is not None:
+                new_n = new_conc * volume
+                new_n *= (new_n > self.threshold)
+                return new_n
+
+        pre_exp_arr, activ_energy_arr, sparse = self._nonlinear_args
+        if self.n_nonlinear == 0:
+            new_conc = conc.copy()
+        elif self.solver=='newton':
             #newton solver should be faster but less accurate
-            new_conc = newton_solve(self.stoich_coeff_arr, self.pre_exp_arr,
-                         self.activ_energy_arr, self.conc_coeff_arr,
-                         self.num_reagents, self.temp, conc, dt, self.newton_steps)
+            new_conc = newton_solve_sparse(pre_exp_arr, activ_energy_arr,
+                         self.temp, conc, dt, self.newton_steps, *sparse)
         else:
-            new_conc = solve_ivp(self, (0, dt), conc, method=self.solver).y[:, -1]
+            new_conc = solve_ivp(self._nonlinear_rates, (0, dt), conc, method=self.solver).y[:, -1]
+        #linear sub-networks are unaffected by the solver and can be integrated exactly
+        if self.linear_species.shape[0] > 0:
+            lin = self.linear_species
+            new_conc[lin] = self.propagator(temp, dt) @ conc[lin]
         new_n = new_conc * volume
         #set negligible amounts to 0
         new_n *= (new_n > self.threshold)
         
         return new_n
     
+    def react_batch(self, n: np.array, temp: np.array, volume: np.array, dt: np.array):
+        """
+        Runs :meth:`react` on several systems at once, with one call to the solver kernel for all of them
+        (when using the newton solver).
+
+        Args:
+            n (np.array): A [systems, materials] array of the amounts of each material.
+            temp (np.array): The temperature of each system in Kelvin.
+            volume (np.array): The volume of each system in Litres.
+            dt (np.array): The time-step of each system in seconds.
+        Returns:
+            np.array: The new amounts of each material in each system
+        """
+        conc = n/volume[:, None]
+        new_conc = np.empty_like(conc)
+        todo = np.ones(conc.shape[0], dtype=bool)
+        if self.steady_state_tol is not None:
+            for i in range(conc.shape[0]):
+                fast = self._fast_forward(conc[i], temp[i], dt[i])
+                if fast is not None:
+                    new_conc[i] = fast
+                    todo[i] = False
+        rows = np.nonzero(todo)[0]
+
+        pre_exp_arr, activ_energy_arr, sparse = self._nonlinear_args
+        if self.n_nonlinear == 0:
+            new_conc[rows] = conc[rows]
+        elif self.solver=='newton':
+            new_conc[rows] = newton_solve_sparse_batch(pre_exp_arr, activ_energy_arr,
+                         temp[rows], conc[rows], dt[rows], self.newton_steps, *sparse)
+        else:
+            for i in rows:
+                self.temp = temp[i]
+                new_conc[i] = solve_ivp(self._nonlinear_rates, (0, dt[i]), conc[i], method=self.solver).y[:, -1]
+        #linear sub-networks are unaffected by the solver and can be integrated exactly
+        if self.linear_species.shape[0] > 0:
+            lin = self.linear_species
+            for i in rows:
+                new_conc[i, lin] = self.propagator(temp[i], dt[i]) @ conc[i, lin]
+        new_n = new_conc * volume[:, None]
+        #set negligible amounts to 0
+        new_n *= (new_n > self.threshold)
+        return new_n
+
     def __call__(self, t, conc):
         """
         a function that calculates the change in concentration given a current concentration
         remember to set the temperature before you call this function
         This function is mainly used with the scipy ODE solvers
         """
-        return get_rates(self.stoich_coeff_arr, self.pre_exp_arr,
-                         self.activ_energy_arr, self.conc_coeff_arr,
-                         self.num_reagents, self.temp, conc)
+        return get_rates_sparse(self.pre_exp_arr, self.activ_energy_arr,
+                         self.temp, conc, *self.sparse)
+
+    def _nonlinear_rates(self, t, conc):
+        """Same as __call__, but leaving out reactions in linear sub-networks"""
+        pre_exp_arr, activ_energy_arr, sparse = self._nonlinear_args
+        return get_rates_sparse(pre_exp_arr, activ_energy_arr, self.temp, conc, *sparse)
     
     
 NoneType = type(None)
@@ -251,4 +758,11 @@ def react(vessel: vessel.Vessel, dt: float, other_vessel: NoneType, reaction: Re
     reaction.update_concentrations(vessel , dt)
     return 0
 
-vessel.Vessel.register(func = react, name = 'react')
\ No newline at end of file
+def react_batch(vessels: List[vessel.Vessel], dt: np.ndarray, other_vessel: NoneType, reaction: Reaction):
+    """
+    Batched version of :func:`react`, which integrates the reaction in every vessel at once
+    """
+    reaction.update_concentrations_batch(vessels, dt)
+    return [0]*len(vessels)
+
+vessel.Vessel.register(func = react, name = 'react', batched = react_batch)
\ No newline at end of file
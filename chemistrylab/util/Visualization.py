@@ -57,6 +57,7 @@ class numbaVisualizer():
         self.viz=dict(
             spectra=self.render_spectra,
             layers=self.render_layers,
+            layers_expected=self.render_layers,
             PVT=self.render_PVT,
         )
 
@@ -137,6 +138,7 @@ class matplotVisualizer():
         self.viz=dict(
             spectra=self.render_spectra,
             layers=self.render_layers,
+            layers_expected=self.render_layers,
             PVT=self.render_PVT,
             targets=self.render_target,
         )
@@ -144,6 +146,7 @@ class matplotVisualizer():
         self.heights = dict(
             spectra=2,
             layers=6,
+            layers_expected=6,
             PVT=1,
             targets=0.25,
         )
@@ -308,6 +311,7 @@ class pygameVisualizer():
         self.viz=dict(
             spectra=self.render_spectra,
             layers=self.render_layers,
+            layers_expected=self.render_layers,
             PVT=self.render_PVT,
             targets=self.render_target,
         )
@@ -315,6 +319,7 @@ class pygameVisualizer():
         self.heights = dict(
             spectra=0.5,
             layers=1,
+            layers_expected=1,
             PVT=0.25,
             targets=0.125,
         )
@@ -0,0 +1,223 @@
+'''
+Awaitable stepping of chemistrylab benches, for driving many environments from an asyncio event loop.
+
+Steps are offloaded to an executor so env compute can overlap with other awaits (ex. requests to a policy server).
+Steps requested in the same iteration of the event loop are grouped into batches, so the executor is
+dispatched once per batch instead of once per environment.
+'''
+
+import asyncio
+import multiprocessing as mp
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, List, Optional, Union
+
+import gymnasium as gym
+
+
+def _pipe_worker(remote, parent_remote, env_fn):
+    """Worker loop for an environment hosted in its own process by :class:`AsyncGenBench`"""
+    parent_remote.close()
+    env = env_fn()
+    try:
+        while True:
+            cmd, args, kwargs = remote.recv()
+            if cmd == "close":
+                env.close()
+                break
+            try:
+                remote.send((True, getattr(env, cmd)(*args, **kwargs)))
+            except Exception as e:
+                remote.send((False, e))
+    except (KeyboardInterrupt, EOFError):
+        pass
+    finally:
+        remote.close()
+
+
+class _ProcessEnv:
+    """Handle to an environment running in a subprocess"""
+    def __init__(self, ctx, env_fn):
+        self.remote, work_remote = ctx.Pipe()
+        self.process = ctx.Process(target=_pipe_worker, args=(work_remote, self.remote, env_fn), daemon=True)
+        self.process.start()
+        work_remote.close()
+
+    def send(self, cmd, args, kwargs):
+        self.remote.send((cmd, args, kwargs))
+
+    def recv(self):
+        ok, result = self.remote.recv()
+        if not ok:
+            raise result
+        return result
+
+    def close(self):
+        self.remote.send(("close", (), {}))
+        self.process.join()
+        self.remote.close()
+
+
+def _run_thread_batch(envs, batch):
+    """Runs a batch of (cmd, index, args, kwargs) requests on in-process environments"""
+    results = []
+    for cmd, i, args, kwargs in batch:
+        try:
+            results.append((True, getattr(envs[i], cmd)(*args, **kwargs)))
+        except Exception as e:
+            results.append((False, e))
+    return results
+
+
+def _run_process_batch(envs, batch):
+    """
+    Runs a batch of (cmd, index, args, kwargs) requests on subprocess environments.
+    Every request is sent before any reply is read, so the environments step in parallel.
+    """
+    for cmd, i, args, kwargs in batch:
+        envs[i].send(cmd, args, kwargs)
+    results = []
+    for cmd, i, args, kwargs in batch:
+        try:
+            results.append((True, envs[i].recv()))
+        except Exception as e:
+            results.append((False, e))
+    return results
+
+
+class AsyncGenBench:
+    """
+    Runs a set of benches (or any gymnasium environments) behind an awaitable reset / step API.
+
+    Args:
+        env_fns (List[Callable[[], gym.Env]]): Functions which create each environment (ex. ``partial(gym.make, "GenWurtzExtract-v2")``)
+        executor (Union[str, Executor]): Where environments are stepped:
+
+            - ``"thread"``: In this process, using a thread pool. This is best when most of the step is spent in numba code which releases the GIL.
+            - ``"process"``: Each environment lives in its own subprocess (env_fns must be picklable if the start method is not fork).
+            - A ``ThreadPoolExecutor``: In this process, using the given executor.
+            - A ``ProcessPoolExecutor``: The same as ``"process"``, using the pool's multiprocessing context, with up to
+              ``max_workers`` batches running at once. (Environments keep their state between steps, so each one lives in
+              its own subprocess rather than in the pool's workers, which would step pickled copies of them.)
+
+        max_concurrency (Optional[int]): The maximum number of batches being run by the executor at once (defaults to the
+            ``max_workers`` of a given process pool, otherwise the number of cpus)
+        max_batch (Optional[int]): The maximum number of requests grouped into a single batch (defaults to grouping evenly over ``max_concurrency`` batches)
+
+    Only one request may be pending for each environment at a time.
+
+    Example:
+        >>> bench = AsyncGenBench([partial(gym.make, "GenWurtzExtract-v2")]*8)
+        >>> async def actor(i):
+        ...     obs, info = await bench.async_reset(i)
+        ...     done = False
+        ...     while not done:
+        ...         action = await policy(obs)
+        ...         obs, reward, terminated, truncated, info = await bench.async_step(i, action)
+        ...         done = terminated or truncated
+        >>> await asyncio.gather(*[actor(i) for i in range(bench.num_envs)])
+    """
+    def __init__(self, env_fns: List[Callable[[], gym.Env]], executor: Union[str, Executor] = "thread",
+            max_concurrency: Optional[int] = None, max_batch: Optional[int] = None):
+
+        self.num_envs = len(env_fns)
+        self.max_batch = max_batch
+        ctx = mp.get_context()
+        if isinstance(executor, ProcessPoolExecutor):
+            ctx = executor._mp_context
+            max_concurrency = max_concurrency or executor._max_workers
+            executor = "process"
+        elif isinstance(executor, Executor) and not isinstance(executor, ThreadPoolExecutor):
+            raise TypeError(f"Executors other than a ThreadPoolExecutor or ProcessPoolExecutor cannot step the environments (got {executor})")
+        self.max_concurrency = max_concurrency or mp.cpu_count()
+        self._own_executor = not isinstance(executor, Executor)
+        if executor == "process":
+            self.envs = [_ProcessEnv(ctx, fn) for fn in env_fns]
+            self._run_batch = _run_process_batch
+            # The executor threads only wait on pipes (the work happens in the subprocesses)
+            self._executor = ThreadPoolExecutor(self.max_concurrency)
+        elif executor == "thread" or isinstance(executor, ThreadPoolExecutor):
+            self.envs = [fn() for fn in env_fns]
+            self._run_batch = _run_thread_batch
+            self._executor = ThreadPoolExecutor(self.max_concurrency) if executor == "thread" else executor
+        else:
+            raise ValueError(f"executor must be 'thread', 'process' or a thread/process pool (got {executor})")
+        self._pending = []
+        self._busy = set()
+        self._flush_scheduled = False
+        self._semaphore = None
+        self.closed = False
+
+    async def async_reset(self, index: int, seed: Optional[int] = None, options: Optional[dict] = None):
+        """
+        Args:
+            index (int): The environment to reset
+            seed (Optional[int]): The seed passed to the environment's reset
+            options (Optional[dict]): The options passed to the environment's reset
+        Returns:
+            Tuple[np.ndarray, dict]: The result of ``env.reset(seed=seed, options=options)``
+        """
+        return await self._request("reset", index, (), dict(seed=seed, options=options))
+
+    async def async_step(self, index: int, action):
+        """
+        Args:
+            index (int): The environment to step
+            action: The action to take in that environment
+        Returns:
+            Tuple[np.ndarray, float, bool, bool, dict]: The result of ``env.step(action)``
+        """
+        return await self._request("step", index, (action,), {})
+
+    def _request(self, cmd, index, args, kwargs):
+        if self.closed:
+            raise RuntimeError("AsyncGenBench is closed")
+        if index in self._busy:
+            raise RuntimeError(f"Environment {index} already has a pending request")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._busy.add(index)
+        self._pending.append((cmd, index, args, kwargs, future))
+        # Wait until the current iteration of the event loop is done before dispatching,
+        # so every request made in this iteration ends up in the same set of batches
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            loop.call_soon(self._flush)
+        return future
+
+    def _flush(self):
+        self._flush_scheduled = False
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        size = self.max_batch or -(-len(pending) // self.max_concurrency)
+        for start in range(0, len(pending), size):
+            asyncio.ensure_future(self._dispatch(pending[start:start+size]))
+
+    async def _dispatch(self, batch):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        requests = [request[:4] for request in batch]
+        try:
+            async with self._semaphore:
+                loop = asyncio.get_running_loop()
+                results = await loop.run_in_executor(self._executor, self._run_batch, self.envs, requests)
+        except BaseException as e:
+            results = [(False, e)]*len(batch)
+        for (cmd, i, args, kwargs, future), (ok, result) in zip(batch, results):
+            self._busy.discard(i)
+            if future.cancelled():
+                continue
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(result)
+
+    def close(self):
+        """Closes every environment (and the executor if it was created by this object)"""
+        if self.closed:
+            return
+        for env in self.envs:
+            env.close()
+        if self._own_executor:
+            self._executor.shutdown()
+        self.closed = True
@@ -0,0 +1,308 @@
+'''
+Offline RL dataset generation for chemistrylab benches.
+
+Each (env id, policy, seed) job is a shard of the dataset, and shards are built in parallel worker processes.
+A shard is a directory of compressed chunk files (``chunk-00000.npz``, ...) holding whole episodes of transitions,
+plus an ``index.json`` with the offset, length and return of every episode. The index is rewritten after each chunk,
+so an interrupted build resumes from the last chunk written.
+
+Example:
+    >>> jobs = make_jobs(["GenWurtzReact-v2", "GenWurtzExtract-v2"], ["random"], seeds=range(4), episodes=100)
+    >>> stats = build_dataset("data/wurtz", jobs, n_workers=8)
+    >>> data = load_shard("data/wurtz/" + stats[0].name)
+
+Command line:
+    >>python -m chemistrylab.util.dataset data/wurtz --envs GenWurtzReact-v2 --policies random --seeds 0 1 2 3 --episodes 100
+'''
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import importlib
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import NamedTuple, Optional, Sequence, Union, Callable, Dict, List, Iterator
+
+import gymnasium as gym
+import numpy as np
+
+import chemistrylab
+from chemistrylab.lab.lab import RandomAgent
+
+# Policies which can be given by name (any other string is imported as "module:attribute")
+POLICIES = {"random": RandomAgent}
+
+# Arrays stored for each transition
+FIELDS = ("observations", "actions", "rewards", "next_observations", "terminals", "timeouts")
+
+
+class DatasetJob(NamedTuple):
+    env_id: str
+    policy: Union[str, Callable] = "random"
+    seed: int = 0
+    episodes: int = 1
+    policy_kwargs: Optional[dict] = None
+
+    @property
+    def name(self) -> str:
+        """The directory name of the job's shard"""
+        policy = self.policy if isinstance(self.policy, str) else policy_name(self.policy)
+        kwargs = "".join(f"-{k}={v}" for k, v in sorted((self.policy_kwargs or {}).items()))
+        return re.sub(r"[^\w.=-]", "_", f"{self.env_id}__{policy}{kwargs}__{self.seed}")
+
+def policy_name(policy: Callable) -> str:
+    """Returns a name for a policy callable (functions and classes, partials of them, or callable instances)"""
+    name = getattr(policy, "__name__", None)
+    if name is None and hasattr(policy, "func"):
+        name = getattr(policy.func, "__name__", None)
+    return type(policy).__name__ if name is None else name
+
+DatasetJob.env_id.__doc__ = "The id of the environment to run"
+DatasetJob.policy.__doc__ = """A name in POLICIES, an import path ("module:attribute") or a (picklable) callable mapping
+an environment to an agent with a stable baselines style predict function"""
+DatasetJob.seed.__doc__ = "Seed of the job (each episode is seeded from it and the episode number)"
+DatasetJob.episodes.__doc__ = "The number of episodes to run"
+DatasetJob.policy_kwargs.__doc__ = "Extra keyword arguments for the policy (ex. the level of a heuristic)"
+
+
+class ShardStats(NamedTuple):
+    name: str
+    episodes: int
+    transitions: int
+    seconds: float
+    resumed: int
+
+    @property
+    def transitions_per_second(self):
+        return self.transitions/max(self.seconds, 1e-12)
+
+ShardStats.transitions.__doc__ = "The number of transitions generated (not counting resumed ones)"
+ShardStats.seconds.__doc__ = "Time spent generating the transitions"
+ShardStats.resumed.__doc__ = "The number of episodes which were already in the shard"
+
+
+def make_jobs(env_ids: Sequence[str], policies: Sequence[Union[str, Callable]], seeds: Sequence[int] = (0,),
+        episodes: int = 1, policy_kwargs: Optional[dict] = None) -> List[DatasetJob]:
+    """
+    Args:
+        env_ids (Sequence[str]): The environments to run
+        policies (Sequence[Union[str, Callable]]): The policies to run on each environment
+        seeds (Sequence[int]): The seeds of each (env, policy) pair
+        episodes (int): The number of episodes of each job
+        policy_kwargs (Optional[dict]): Extra keyword arguments for the policies
+    Returns:
+        List[DatasetJob]: One job for each combination of env, policy and seed
+    """
+    return [DatasetJob(env_id, policy, seed, episodes, policy_kwargs)
+        for env_id in env_ids for policy in policies for seed in seeds]
+
+
+def resolve_policy(policy: Union[str, Callable]) -> Callable:
+    """
+    Args:
+        policy (Union[str, Callable]): A name in POLICIES, an import path ("module:attribute") or a callable
+    Returns:
+        Callable: A function making an agent for an environment
+    """
+    if not isinstance(policy, str):
+        return policy
+    if policy in POLICIES:
+        return POLICIES[policy]
+    if ":" not in policy:
+        raise KeyError(f"{policy} is not a registered policy or an import path")
+    module, attr = policy.split(":")
+    return getattr(importlib.import_module(module), attr)
+
+
+def episode_seed(seed: int, episode: int) -> int:
+    """Returns the reset seed of an episode (episodes do not depend on the ones before them, so shards can resume)"""
+    return int(np.random.SeedSequence([seed, episode]).generate_state(1)[0])
+
+
+def _read_index(path):
+    with open(os.path.join(path, "index.json")) as f:
+        return json.load(f)
+
+
+def _write_atomic(path, write):
+    """Writes a file through a temporary file, so an interrupted write never leaves a partial file"""
+    with open(path + ".tmp", "wb") as f:
+        write(f)
+    os.replace(path + ".tmp", path)
+
+
+def _run_episode(env, agent, seed, buffers):
+    """Runs an episode, adding its transitions to the buffers. Returns the (length, return) of the episode"""
+    env.action_space.seed(seed)
+    obs, _ = env.reset(seed=seed)
+    length, ret, done = 0, 0.0, False
+    while not done:
+        action = agent.predict(obs)[0]
+        next_obs, reward, terminated, truncated, _ = env.step(action)
+        for key, value in zip(FIELDS, (obs, action, reward, next_obs, terminated, truncated)):
+            buffers[key].append(value)
+        obs = next_obs
+        length += 1
+        ret += float(reward)
+        done = terminated or truncated
+    return length, ret
+
+
+def build_shard(root: str, job: DatasetJob, chunk_size: int = 10000) -> ShardStats:
+    """
+    Runs a job, writing its transitions to the shard directory root/job.name. Episodes which are already in the
+    shard (from an interrupted build) are kept.
+
+    Args:
+        root (str): The dataset directory
+        job (DatasetJob): The job to run
+        chunk_size (int): The (approximate) number of transitions in each chunk. Chunks end on episode boundaries.
+    Returns:
+        ShardStats: The number of new episodes and transitions, and the time it took
+    """
+    path = os.path.join(root, job.name)
+    os.makedirs(path, exist_ok=True)
+    if os.path.exists(os.path.join(path, "index.json")):
+        index = _read_index(path)
+    else:
+        index = dict(env_id=job.env_id, policy=job.name.split("__")[1], seed=job.seed, chunks=[], episodes=[])
+    index["target_episodes"] = job.episodes
+    resumed = len(index["episodes"])
+
+    env = gym.make(job.env_id)
+    agent = resolve_policy(job.policy)
+    start = time.perf_counter()
+    transitions = 0
+    offset = sum(c["transitions"] for c in index["chunks"])
+    buffers, episodes = {key: [] for key in FIELDS}, []
+
+    def flush():
+        name = "chunk-%05d.npz" % len(index["chunks"])
+        arrays = {key: np.asarray(value) for key, value in buffers.items()}
+        _write_atomic(os.path.join(path, name), lambda f: np.savez_compressed(f, **arrays))
+        index["chunks"].append(dict(file=name, transitions=len(buffers["rewards"]), episodes=len(episodes)))
+        index["episodes"] += episodes
+        index["complete"] = len(index["episodes"]) >= job.episodes
+        _write_atomic(os.path.join(path, "index.json"), lambda f: f.write(json.dumps(index).encode()))
+        for value in buffers.values():
+            value.clear()
+        episodes.clear()
+
+    for episode in range(resumed, job.episodes):
+        # make a new agent for each episode, so heuristics with a step counter start from scratch
+        length, ret = _run_episode(env, agent(env, **(job.policy_kwargs or {})), episode_seed(job.seed, episode), buffers)
+        episodes.append([offset, length, ret])
+        offset += length
+        transitions += length
+        if len(buffers["rewards"]) >= chunk_size:
+            flush()
+    if episodes or not index["chunks"]:
+        flush()
+    env.close()
+    return ShardStats(job.name, job.episodes-resumed, transitions, time.perf_counter()-start, resumed)
+
+
+def build_dataset(root: str, jobs: Sequence[DatasetJob], n_workers: int = 1, chunk_size: int = 10000,
+        start_method: Optional[str] = None, verbose: bool = False) -> List[ShardStats]:
+    """
+    Builds (or resumes building) a dataset, running jobs in parallel processes.
+
+    Args:
+        root (str): The dataset directory
+        jobs (Sequence[DatasetJob]): The jobs to run (see :func:`make_jobs`)
+        n_workers (int): The number of worker processes (jobs run in this process if n_workers <= 1)
+        chunk_size (int): The (approximate) number of transitions in each chunk
+        start_method (Optional[str]): The multiprocessing start method (defaults to the platform default)
+        verbose (bool): Whether to print the transitions/sec of each shard as it finishes
+    Returns:
+        List[ShardStats]: The stats of each job (in the order of the jobs)
+    """
+    names = [job.name for job in jobs]
+    if len(set(names)) != len(names):
+        raise ValueError("Every job of a dataset needs a different (env_id, policy, seed)")
+    os.makedirs(root, exist_ok=True)
+    start = time.perf_counter()
+    stats = {}
+
+    def report(s):
+        stats[s.name] = s
+        if verbose:
+            print("%-60s %6d episodes %8d transitions %10.1f transitions/s" % (s.name, s.episodes, s.transitions, s.transitions_per_second))
+
+    if n_workers <= 1:
+        for job in jobs:
+            report(build_shard(root, job, chunk_size))
+    else:
+        with ProcessPoolExecutor(n_workers, mp_context=mp.get_context(start_method)) as pool:
+            for future in as_completed([pool.submit(build_shard, root, job, chunk_size) for job in jobs]):
+                report(future.result())
+    if verbose:
+        total = sum(s.transitions for s in stats.values())
+        print("%d transitions in %.1fs (%.1f transitions/s)" % (total, time.perf_counter()-start, total/max(time.perf_counter()-start, 1e-12)))
+    return [stats[name] for name in names]
+
+
+def load_shard(path: str, fields: Sequence[str] = FIELDS) -> Dict[str, np.ndarray]:
+    """
+    Args:
+        path (str): The shard directory
+        fields (Sequence[str]): The arrays to load
+    Returns:
+        Dict[str, np.ndarray]: The transitions of the shard (concatenated over the chunks), and an ``episodes``
+        array of the (offset, length, return) of each episode
+    """
+    index = _read_index(path)
+    arrays = {key: [] for key in fields}
+    for chunk in index["chunks"]:
+        with np.load(os.path.join(path, chunk["file"])) as data:
+            for key in fields:
+                arrays[key].append(data[key])
+    out = {key: np.concatenate(value) for key, value in arrays.items() if value}
+    out["episodes"] = np.array(index["episodes"], dtype=np.float64).reshape(-1, 3)
+    return out
+
+
+def iter_episodes(path: str) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Iterates over the episodes of a shard, loading one chunk at a time.
+
+    Args:
+        path (str): The shard directory
+    Yields:
+        Dict[str, np.ndarray]: The transitions of an episode
+    """
+    index = _read_index(path)
+    episodes = iter(index["episodes"])
+    offset = 0
+    for chunk in index["chunks"]:
+        with np.load(os.path.join(path, chunk["file"])) as data:
+            arrays = {key: data[key] for key in FIELDS}
+        for _ in range(chunk["episodes"]):
+            start, length, _ = next(episodes)
+            yield {key: value[start-offset:start-offset+length] for key, value in arrays.items()}
+        offset += chunk["transitions"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate an offline RL dataset from chemistrylab benches")
+    parser.add_argument("root", help="The dataset directory")
+    parser.add_argument("--envs", nargs="+", required=True, help="Environment ids")
+    parser.add_argument("--policies", nargs="+", default=["random"], help='Policy names or import paths ("module:attribute")')
+    parser.add_argument("--seeds", nargs="+", type=int, default=[0])
+    parser.add_argument("--episodes", type=int, default=100, help="Episodes per (env, policy, seed)")
+    parser.add_argument("--level", type=int, default=None, help="Level passed to heuristic policies")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--path", nargs="*", default=[], help="Directories added to sys.path (ex. RL_rollout/Heuristic_Policies)")
+    args = parser.parse_args()
+    sys.path += args.path
+    # let worker processes (which may not be forked) find the policies too
+    os.environ["PYTHONPATH"] = os.pathsep.join(args.path + [os.environ.get("PYTHONPATH", "")])
+    kwargs = None if args.level is None else dict(level=args.level)
+    # only the imported (heuristic) policies take a level
+    jobs = make_jobs(args.envs, [p for p in args.policies if p in POLICIES], args.seeds, args.episodes)
+    jobs += make_jobs(args.envs, [p for p in args.policies if not p in POLICIES], args.seeds, args.episodes, kwargs)
+    build_dataset(args.root, jobs, args.workers, args.chunk_size, verbose=True)
@@ -0,0 +1,473 @@
+'''
+Vectorized environments for running many chemistrylab benches at once.
+
+These follow the stable_baselines3 VecEnv interface (and subclass it when stable_baselines3 is installed),
+so they can be passed directly to stable_baselines3 algorithms.
+'''
+
+import os
+import pickle
+import multiprocessing as mp
+from concurrent.futures import Executor, ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import Callable, List, Optional, Sequence
+
+import gymnasium as gym
+import numpy as np
+
+try:
+    from stable_baselines3.common.vec_env.base_vec_env import VecEnv as _VecEnvBase
+except ImportError:
+    class _VecEnvBase:
+        """
+        Minimal version of stable_baselines3's VecEnv, used when stable_baselines3 is not installed.
+        """
+        def __init__(self, num_envs, observation_space, action_space):
+            self.num_envs = num_envs
+            self.observation_space = observation_space
+            self.action_space = action_space
+            self.reset_infos = [{} for _ in range(num_envs)]
+            self._seeds = [None for _ in range(num_envs)]
+            self._options = [{} for _ in range(num_envs)]
+
+        def _reset_seeds(self):
+            self._seeds = [None for _ in range(self.num_envs)]
+
+        def _reset_options(self):
+            self._options = [{} for _ in range(self.num_envs)]
+
+        def seed(self, seed=None):
+            if seed is None:
+                seed = int(np.random.randint(0, 2**32 - 1, dtype=np.uint32))
+            self._seeds = [seed + idx for idx in range(self.num_envs)]
+            return self._seeds
+
+        def step(self, actions):
+            self.step_async(actions)
+            return self.step_wait()
+
+        def _get_indices(self, indices):
+            if indices is None:
+                return range(self.num_envs)
+            if isinstance(indices, int):
+                return [indices]
+            return indices
+
+
+def _is_wrapped(env, wrapper_class):
+    """Checks if an environment is wrapped with a given wrapper class"""
+    while isinstance(env, gym.Wrapper):
+        if isinstance(env, wrapper_class):
+            return True
+        env = env.env
+    return False
+
+
+def _env_command(env, data):
+    """Runs one of the (rarely used) get_attr / set_attr / env_method / env_is_wrapped commands on an env"""
+    cmd, name, args, kwargs = data
+    if cmd == "get_attr":
+        return env.get_wrapper_attr(name) if hasattr(env, "get_wrapper_attr") else getattr(env, name)
+    if cmd == "set_attr":
+        return setattr(env.unwrapped, name, args[0])
+    if cmd == "env_method":
+        method = env.get_wrapper_attr(name) if hasattr(env, "get_wrapper_attr") else getattr(env, name)
+        return method(*args, **kwargs)
+    if cmd == "env_is_wrapped":
+        return _is_wrapped(env, args[0])
+    raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+
+
+############################### Reset Prefetching ###############################
+
+_prefetch_executor = None
+
+def _get_prefetch_executor():
+    """The (per process) thread which prepares resets in the background"""
+    global _prefetch_executor
+    if _prefetch_executor is None:
+        _prefetch_executor = ThreadPoolExecutor(1, thread_name_prefix="chemistrylab-reset")
+    return _prefetch_executor
+
+
+class PrefetchReset(gym.Wrapper):
+    """
+    Prepares the next episode of a chemistrylab bench (its reset shelf, target, initial reward and first
+    observation) in a background thread while the current episode runs, so that the next reset without a
+    seed is just a swap. Seeded resets are done as usual.
+
+    Args:
+        env (gym.Env): An environment whose unwrapped env is a :class:`~chemistrylab.benches.general_bench.GenBench`
+        executor (Optional[Executor]): Where to prepare resets (defaults to a single thread shared by the process)
+    """
+    def __init__(self, env: gym.Env, executor: Optional[Executor] = None):
+        super().__init__(env)
+        self._executor = executor or _get_prefetch_executor()
+
+    def reset(self, *, seed=None, options=None):
+        obs, info = self.env.reset(seed=seed, options=options)
+        self.env.unwrapped.prefetch_reset(self._executor)
+        return obs, info
+
+    def close(self):
+        self.env.unwrapped._wait_for_reset()
+        return super().close()
+
+
+def _prefetching(env_fn):
+    """Wraps the env made by env_fn in :class:`PrefetchReset`"""
+    return PrefetchReset(env_fn())
+
+
+############################### Thread Vec Env ###############################
+
+
+class ThreadVecEnv(_VecEnvBase):
+    """
+    A vectorized environment which steps its environments in a pool of threads.
+
+    The numba kernels used by the benches release the GIL, so threads step environments in parallel while
+    inside them, without the startup or IPC cost of subprocesses. The envs are split into one contiguous
+    chunk per thread, so each step only dispatches ``n_threads`` jobs.
+
+    Args:
+        env_fns (List[Callable[[], gym.Env]]): Functions which create each environment
+        n_threads (Optional[int]): The number of threads to use (defaults to min(n_envs, cpu count))
+        prefetch_resets (bool): If True, each env prepares its next episode in the background
+            (see :class:`PrefetchReset`), so automatic resets do not stall the step.
+    """
+    def __init__(self, env_fns: List[Callable[[], gym.Env]], n_threads: Optional[int] = None, prefetch_resets: bool = False):
+        self.envs = [_prefetching(fn) if prefetch_resets else fn() for fn in env_fns]
+        n_envs = len(self.envs)
+        env = self.envs[0]
+        super().__init__(n_envs, env.observation_space, env.action_space)
+        self.n_threads = n_threads or min(n_envs, os.cpu_count())
+        self._chunks = [chunk for chunk in np.array_split(np.arange(n_envs), self.n_threads) if len(chunk)]
+        self._executor = ThreadPoolExecutor(self.n_threads)
+        self.observations = np.zeros((n_envs,)+tuple(env.observation_space.shape), dtype=env.observation_space.dtype)
+        self._rewards = np.zeros(n_envs, dtype=np.float32)
+        self._dones = np.zeros(n_envs, dtype=bool)
+        self._infos = [{} for _ in range(n_envs)]
+        self._actions = None
+        self._futures = []
+        self.closed = False
+
+    def _step_chunk(self, chunk):
+        for i in chunk:
+            env = self.envs[i]
+            obs, reward, terminated, truncated, info = env.step(self._actions[i])
+            done = terminated or truncated
+            if done:
+                info = dict(info)
+                info["TimeLimit.truncated"] = truncated and not terminated
+                info["terminal_observation"] = obs
+                obs, self.reset_infos[i] = env.reset()
+            self.observations[i] = obs
+            self._rewards[i] = reward
+            self._dones[i] = done
+            self._infos[i] = info
+
+    def _reset_chunk(self, chunk):
+        for i in chunk:
+            obs, self.reset_infos[i] = self.envs[i].reset(seed=self._seeds[i], options=self._options[i])
+            self.observations[i] = obs
+
+    def _run(self, fn):
+        for future in [self._executor.submit(fn, chunk) for chunk in self._chunks]:
+            future.result()
+
+    def step_async(self, actions: np.ndarray):
+        self._actions = actions
+        self._futures = [self._executor.submit(self._step_chunk, chunk) for chunk in self._chunks]
+
+    def step_wait(self):
+        for future in self._futures:
+            future.result()
+        self._futures = []
+        return self.observations.copy(), self._rewards.copy(), self._dones.copy(), list(self._infos)
+
+    def reset(self):
+        self._run(self._reset_chunk)
+        self._reset_seeds()
+        self._reset_options()
+        return self.observations.copy()
+
+    def close(self):
+        if self.closed:
+            return
+        for future in self._futures:
+            future.result()
+        self._executor.shutdown()
+        for env in self.envs:
+            env.close()
+        self.closed = True
+
+    def _command(self, cmd, name, indices, *args, **kwargs):
+        return [_env_command(self.envs[i], (cmd, name, args, kwargs)) for i in self._get_indices(indices)]
+
+    def get_attr(self, attr_name: str, indices=None) -> List:
+        return self._command("get_attr", attr_name, indices)
+
+    def set_attr(self, attr_name: str, value, indices=None) -> None:
+        self._command("set_attr", attr_name, indices, value)
+
+    def env_method(self, method_name: str, *method_args, indices=None, **method_kwargs) -> List:
+        return self._command("env_method", method_name, indices, *method_args, **method_kwargs)
+
+    def env_is_wrapped(self, wrapper_class, indices=None) -> List[bool]:
+        return self._command("env_is_wrapped", None, indices, wrapper_class)
+
+    def get_images(self) -> Sequence[Optional[np.ndarray]]:
+        return self.env_method("render")
+
+
+############################### Shared Memory Vec Env ###############################
+
+# One-byte commands sent to shared memory workers
+_STEP = b"s"
+_RESET = b"r"
+_CLOSE = b"c"
+_OTHER = b"o"
+
+
+class SharedMemoryLayout:
+    """
+    Describes how the arrays of a :class:`SharedMemoryVecEnv` are laid out in a single shared memory block.
+
+    Args:
+        n_envs (int): The number of environments
+        observation_space (gym.spaces.Box): The observation space of each environment
+        action_space (gym.Space): The action space of each environment (Box or Discrete)
+
+    The block holds (in order) the observations, terminal observations, actions, rewards,
+    terminated / truncated / done flags and reset seeds for every environment.
+    """
+    def __init__(self, n_envs, observation_space, action_space):
+        self.n_envs = n_envs
+        obs_shape = (n_envs,) + tuple(observation_space.shape)
+        act_shape = (n_envs,) + tuple(action_space.shape or ())
+        act_dtype = np.int64 if isinstance(action_space, gym.spaces.Discrete) else action_space.dtype
+        self.fields = (
+            ("observations", obs_shape, observation_space.dtype),
+            ("terminal_observations", obs_shape, observation_space.dtype),
+            ("actions", act_shape, act_dtype),
+            ("rewards", (n_envs,), np.float64),
+            ("terminated", (n_envs,), np.bool_),
+            ("truncated", (n_envs,), np.bool_),
+            ("dones", (n_envs,), np.bool_),
+            ("seeds", (n_envs,), np.int64),
+            ("has_seed", (n_envs,), np.bool_),
+        )
+        self.offsets = []
+        offset = 0
+        for name, shape, dtype in self.fields:
+            self.offsets.append(offset)
+            nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            # keep every array 8-byte aligned
+            offset += -(-nbytes // 8) * 8
+        self.nbytes = max(offset, 8)
+
+    def views(self, buf):
+        """
+        Args:
+            buf (memoryview): The buffer of the shared memory block
+        Returns:
+            dict: (name, array) pairs where each array is a zero-copy view into the buffer.
+        """
+        return {
+            name: np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset)
+            for (name, shape, dtype), offset in zip(self.fields, self.offsets)
+        }
+
+
+def _attach_shared_memory(name):
+    """
+    Attaches to an existing shared memory block. Workers share the resource tracker of the process which
+    created the block, so that process remains responsible for unlinking it.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # track was added in python 3.13 (registering twice with the same tracker is harmless)
+        return shared_memory.SharedMemory(name=name)
+
+
+def _shared_memory_worker(remote, parent_remote, env_fn, index, prefetch_resets=False):
+    """
+    Worker loop for a :class:`SharedMemoryVecEnv`. Observations, rewards and done flags are written directly
+    into shared memory; the pipe only carries one-byte commands and (rarely) pickled info dicts.
+    """
+    parent_remote.close()
+    env = _prefetching(env_fn) if prefetch_resets else env_fn()
+    discrete = isinstance(env.action_space, gym.spaces.Discrete)
+    remote.send((env.observation_space, env.action_space))
+    shm_name, layout = remote.recv()
+    shm = _attach_shared_memory(shm_name)
+    arr = layout.views(shm.buf)
+    obs_buf, term_buf = arr["observations"], arr["terminal_observations"]
+    try:
+        while True:
+            cmd = remote.recv_bytes()
+            tag = cmd[:1]
+            if tag == _STEP:
+                action = arr["actions"][index]
+                action = int(action) if discrete else np.array(action)
+                obs, reward, terminated, truncated, info = env.step(action)
+                done = terminated or truncated
+                reset_info = None
+                if done:
+                    info = dict(info)
+                    info["TimeLimit.truncated"] = truncated and not terminated
+                    term_buf[index] = obs
+                    obs, reset_info = env.reset()
+                obs_buf[index] = obs
+                arr["rewards"][index] = reward
+                arr["terminated"][index] = terminated
+                arr["truncated"][index] = truncated
+                arr["dones"][index] = done
+                # Only send something back if there is information to send
+                remote.send_bytes(pickle.dumps((info, reset_info)) if (info or done) else b"")
+            elif tag == _RESET:
+                seed = int(arr["seeds"][index]) if arr["has_seed"][index] else None
+                options = pickle.loads(cmd[1:]) if len(cmd) > 1 else None
+                obs, reset_info = env.reset(seed=seed, options=options)
+                obs_buf[index] = obs
+                remote.send_bytes(pickle.dumps(reset_info))
+            elif tag == _OTHER:
+                remote.send_bytes(pickle.dumps(_env_command(env, pickle.loads(cmd[1:]))))
+            elif tag == _CLOSE:
+                env.close()
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        del obs_buf, term_buf, arr
+        shm.close()
+        remote.close()
+
+
+class SharedMemoryVecEnv(_VecEnvBase):
+    """
+    A vectorized environment where each environment runs in its own process, and observations, rewards and
+    dones are written by the workers directly into one ``multiprocessing.shared_memory`` block.
+
+    Compared to stable_baselines3's SubprocVecEnv, no observations or actions are pickled: each step only sends
+    a one-byte command to each worker (info dicts are only sent back when they are non-empty).
+
+    Args:
+        env_fns (List[Callable[[], gym.Env]]): Functions which create each environment (ex. ``partial(gym.make, "GenWurtzExtract-v2")``).
+            These need to be picklable if the start method is not fork.
+        start_method (Optional[str]): The multiprocessing start method (defaults to the platform default)
+        copy_obs (bool): If True, step and reset return a copy of the observations. If False they return
+            :attr:`observations` itself, which is overwritten in-place on the next step.
+        prefetch_resets (bool): If True, each worker prepares its env's next episode in a background thread
+            (see :class:`PrefetchReset`), so automatic resets do not stall the step.
+
+    Attributes:
+        observations (np.ndarray): A zero-copy [n_envs, \\*obs_shape] view of the observations in shared memory.
+    """
+    def __init__(self, env_fns: List[Callable[[], gym.Env]], start_method: Optional[str] = None, copy_obs: bool = True,
+            prefetch_resets: bool = False):
+        self.waiting = False
+        self.closed = False
+        self.copy_obs = copy_obs
+        n_envs = len(env_fns)
+        ctx = mp.get_context(start_method)
+        # Start the resource tracker first so the workers inherit it instead of starting their own
+        resource_tracker.ensure_running()
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(n_envs)])
+        self.processes = []
+        for i, (work_remote, remote, env_fn) in enumerate(zip(self.work_remotes, self.remotes, env_fns)):
+            args = (work_remote, remote, env_fn, i, prefetch_resets)
+            process = ctx.Process(target=_shared_memory_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        spaces = [remote.recv() for remote in self.remotes]
+        observation_space, action_space = spaces[0]
+        self.layout = SharedMemoryLayout(n_envs, observation_space, action_space)
+        self._shm = shared_memory.SharedMemory(create=True, size=self.layout.nbytes)
+        arr = self.layout.views(self._shm.buf)
+        self.observations = arr["observations"]
+        self._terminal_observations = arr["terminal_observations"]
+        self._actions = arr["actions"]
+        self._rewards = arr["rewards"]
+        self._dones = arr["dones"]
+        self._seed_arr = arr["seeds"]
+        self._has_seed = arr["has_seed"]
+        for remote in self.remotes:
+            remote.send((self._shm.name, self.layout))
+
+        super().__init__(n_envs, observation_space, action_space)
+
+    def _obs(self):
+        return self.observations.copy() if self.copy_obs else self.observations
+
+    def step_async(self, actions: np.ndarray):
+        self._actions[:] = np.asarray(actions).reshape(self._actions.shape)
+        for remote in self.remotes:
+            remote.send_bytes(_STEP)
+        self.waiting = True
+
+    def step_wait(self):
+        infos = []
+        for i, remote in enumerate(self.remotes):
+            msg = remote.recv_bytes()
+            info, reset_info = pickle.loads(msg) if msg else ({}, None)
+            if self._dones[i]:
+                info["terminal_observation"] = self._terminal_observations[i].copy()
+                self.reset_infos[i] = reset_info
+            infos.append(info)
+        self.waiting = False
+        return self._obs(), self._rewards.astype(np.float32), self._dones.copy(), infos
+
+    def reset(self):
+        for i, seed in enumerate(self._seeds):
+            self._has_seed[i] = seed is not None
+            self._seed_arr[i] = 0 if seed is None else seed
+        for remote, options in zip(self.remotes, self._options):
+            remote.send_bytes(_RESET + (pickle.dumps(options) if options else b""))
+        self.reset_infos = [pickle.loads(remote.recv_bytes()) for remote in self.remotes]
+        self._reset_seeds()
+        self._reset_options()
+        return self._obs()
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv_bytes()
+        for remote in self.remotes:
+            remote.send_bytes(_CLOSE)
+        for process in self.processes:
+            process.join()
+        # Drop views into the block before releasing it
+        del self.observations, self._terminal_observations, self._actions, self._rewards
+        del self._dones, self._seed_arr, self._has_seed
+        self._shm.close()
+        self._shm.unlink()
+        self.closed = True
+
+    def _command(self, cmd, name, indices, *args, **kwargs):
+        remotes = [self.remotes[i] for i in self._get_indices(indices)]
+        msg = _OTHER + pickle.dumps((cmd, name, args, kwargs))
+        for remote in remotes:
+            remote.send_bytes(msg)
+        return [pickle.loads(remote.recv_bytes()) for remote in remotes]
+
+    def get_attr(self, attr_name: str, indices=None) -> List:
+        return self._command("get_attr", attr_name, indices)
+
+    def set_attr(self, attr_name: str, value, indices=None) -> None:
+        self._command("set_attr", attr_name, indices, value)
+
+    def env_method(self, method_name: str, *method_args, indices=None, **method_kwargs) -> List:
+        return self._command("env_method", method_name, indices, *method_args, **method_kwargs)
+
+    def env_is_wrapped(self, wrapper_class, indices=None) -> List[bool]:
+        return self._command("env_is_wrapped", None, indices, wrapper_class)
+
+    def get_images(self) -> Sequence[Optional[np.ndarray]]:
+        return self.env_method("render")
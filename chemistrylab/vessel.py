@@ -1,4 +1,6 @@
-from typing import NamedTuple, Tuple, Callable, Optional, List
+from typing import NamedTuple, Tuple, Callable, Optional, List, Sequence, Union
+from itertools import count
+import heapq
 import numpy as np
 import numba
 import pandas as pd
@@ -8,11 +10,16 @@ class Event(NamedTuple):
     name: str
     parameter: tuple
     other_vessel: Optional[object]
+    time: Optional[float] = None
 
 #Apparently documenting this isn't trivial :(
 Event.name.__doc__ = "The registered name of the event function."
 Event.parameter.__doc__ = "The parameters of the registered event function"
 Event.other_vessel.__doc__ = "The other vessel needed for this event if requred (ex the target vessel when pouring)."
+Event.time.__doc__ = "The simulation time of the event, or None to perform it right away (see :meth:`Vessel.push_event_to_queue`)."
+
+# Breaks ties between queued events with the same time (in the order they were pushed)
+_event_order = count()
 
 
 def _rebuild_solute_dict(solvent_dict, solute_dict, solvents):
@@ -26,8 +33,8 @@ def _rebuild_solute_dict(solvent_dict, solute_dict, solvents):
         new_solvent_dict (dict): New set of (key,index) pairs
         new_solute_dict (dict): New set of (key,arr) pairs
     
-    Note: This can be called less frequently if you allow solvents with zero amount to persist
-    in the materials dict.
+    Note: Solvents with zero amount keep their slot, so this is only needed for full rebuilds
+    (see :meth:`Vessel.rebuild_indices`).
     """
     # needs to be called when adding or removing solvents (after you set the
     # mols dissolved in any removed solvents to 0)
@@ -38,7 +45,7 @@ def _rebuild_solute_dict(solvent_dict, solute_dict, solvents):
             for mat in solute_dict}
     return new_solvent_dict, new_solute_dict
 
-@numba.jit(nopython=True)
+@numba.jit(nopython=True, nogil=True)
 def _validate_solute_amounts(mol_solute, mol_solvent, mol_dissolved):
     """
     Performs a series of consistency checks on the mol_dissolved array.
@@ -80,6 +87,64 @@ def _validate_solute_amounts(mol_solute, mol_solvent, mol_dissolved):
             mol_dissolved[i] += (u_mol-checksum)*norm_solvent
 
 
+@numba.jit(nopython=True, nogil=True)
+def _heat_contact_kernel(temperature, Tf, ht, use_dQ, C_base, mol, boil, enthalpy, cap, order):
+    """
+    Solves the heat-contact boiling problem in one pass over materials sorted by boiling point.
+
+    Args:
+        temperature (float): The current temperature of the vessel
+        Tf (float): The temperature of the heat source (ignored when use_dQ is True)
+        ht (float): Heat transfer coefficient multiplied by how long you have (or heat Q when use_dQ is True)
+        use_dQ (bool): Whether exp and log are linearized so ht is treated as an amount of heat
+        C_base (float): Heat capacity of everything that is not a material (ie. the air)
+        mol (array): The amount of each material (1D, size N)
+        boil (array): The boiling point of each material (1D, size N)
+        enthalpy (array): The enthalpy of vaporization of each material (J/mol)
+        cap (array): The heat capacity of each material (J/mol*K)
+        order (array): Indices of materials sorted by boiling point
+
+    Returns:
+        Tuple[float, int, array]:
+            - The final temperature of the vessel
+            - How many materials (in boiling point order) reached their boiling point
+            - The amount of each material which boiled off
+    """
+    if use_dQ:
+        Tf = temperature+1
+    C = C_base
+    for i in range(mol.shape[0]):
+        C += mol[i]*cap[i]
+    d_mol = np.zeros(mol.shape[0])
+    # Estimated final temperature before taking boiling into account
+    x = -ht/C
+    T = Tf+(temperature-Tf)*((1+x) if use_dQ else np.exp(x))
+    n = 0
+    while n < order.shape[0]:
+        k = order[n]
+        bp = boil[k]
+        if not (T > bp and T > temperature):
+            break
+        #amount of transfer-time required to reach boiling temperature
+        y = (Tf-bp)/(Tf-temperature)
+        ht += ((y-1) if use_dQ else np.log(y))*C
+        temperature = bp
+        if use_dQ:
+            Tf = temperature+1
+        boil_enthalpy = mol[k]*enthalpy[k]
+        # ht = dQ/(T_f-T_boil)
+        ht_used = min(ht, boil_enthalpy/(Tf-bp))
+        ht -= ht_used
+        fraction = (ht_used*(Tf-bp)/boil_enthalpy) if ht_used > 0 else 0.0
+        d_mol[k] = mol[k]*fraction
+        #Heat capacity is lower now that some material has boiled off
+        C -= d_mol[k]*cap[k]
+        x = -ht/C
+        T = Tf+(temperature-Tf)*((1+x) if use_dQ else np.exp(x))
+        n += 1
+    return T, n, d_mol
+
+
 layer_values=np.linspace(0, 1, 100, endpoint=True, dtype=np.float32)-1.9e-2
 
 class Vessel:
@@ -115,6 +180,11 @@ class Vessel:
     +------------------+-----------------------------------------------------+-----------------------------------------+
 
     """
+    __slots__ = ("label", "default_dt", "temperature", "volume", "material_dict", "solute_dict", "solvent_dict",
+        "solvents", "_solutes", "_solute_amounts", "_solute_mols", "_solvent_mols", "_indexed", "_layers_position",
+        "_layers_variance", "_layer_volumes", "_layers_volume", "_variance", "_layers", "_hashed_layers", "ignore_layout",
+        "_layer_mats", "_layer_colors", "_lvar", "_heat_cache", "rng",
+        "time", "clock", "_queue", "_pending", "_stale")
 
     def __init__(
             self, 
@@ -135,55 +205,139 @@ class Vessel:
         self.temperature=temperature
         self.volume=volume
         self.material_dict=dict() # String keys, Material values
-        self.solute_dict=dict() # String Keys, float array values
+        self.solute_dict=dict() # String Keys, float array values (rows of _solute_amounts)
         self.solvent_dict=dict() #String Keys, index values
-        self.solvents=[]
+        self.solvents=()
+        # Solvent and solute slots are maintained incrementally (see _update_members)
+        self._solutes=()
+        self._solute_amounts=np.zeros([0,0])
+        self._solute_mols=np.zeros(0)
+        self._solvent_mols=np.zeros(0)
+        self._indexed=(self.material_dict,frozenset())
         self._layers_position = np.zeros(1, dtype=np.float32)
         self._layers_variance = np.array([self.volume/3.46], dtype=np.float32)
         self._layer_volumes = np.array([self.volume], dtype=np.float32)
         self._variance = 1e-5
+        self._layers_volume = None
         self._layers = None
+        self._hashed_layers = None
         self.ignore_layout=ignore_layout
         self._layer_mats=[]
+        self._layer_colors = None
+        self._lvar = None
+        self._heat_cache=None
+        # Generator for the random parts of the simulation (numba's global random state is used if None)
+        self.rng = None
+        # Simulation time the state is integrated up to, and the time the vessel has been advanced to (see advance)
+        self.time = 0.0
+        self.clock = 0.0
+        # Heap of (time, order, event) for timestamped events, and [events, dt] pairs of deferred time based events
+        # (None when there is nothing to integrate)
+        self._queue = []
+        self._pending = None
+        # Whether the layers are updated when the pending time is integrated (even if none has passed)
+        self._stale = False
 
     def __repr__(self):
         return self.label
 
-    def validate_solutes(self, checksum: bool = True):
-        """
-        Turns the solute dict into a 2D array, gets a 1D array
-        of solute amounts, as well as a 1D array of solvent amounts, then
-        performs consistency checks with _validate_solute_amounts.
-        """
-        if self.ignore_layout:return
-        n_solvents=len(self.solvents)
-        #gather a list of solutes
-        solutes = tuple(a for a in self.material_dict if self.material_dict[a].is_solute())
-        if n_solvents==0 or len(solutes)==0:return
-        #get mol information for solutes and solvents
-        solute_mols = np.array([self.material_dict[key].mol for key in solutes])
-        solvent_mols = np.array([self.material_dict[key].mol for key in self.solvents])
-
-        #get all of the dissolved amounts
-        null = np.zeros(n_solvents)
-        old_dict=self.solute_dict
-        mol_dissolved=np.stack([old_dict[key] if key in old_dict else null for key in solutes])
-        #run the validation
-        _validate_solute_amounts(solute_mols, solvent_mols, mol_dissolved)
-        #set the new solute dict
-        self.solute_dict={key:mol_dissolved[i] for i,key in enumerate(solutes)}
+    def __getstate__(self):
+        state = {key:getattr(self, key) for key in self.__slots__}
+        # solute_dict holds views into _solute_amounts, so it is rebuilt on load
+        state["solute_dict"] = None
+        return state
+
+    def __setstate__(self, state):
+        for key, value in state.items():
+            setattr(self, key, value)
+        self.solute_dict = {key:self._solute_amounts[i] for i,key in enumerate(self._solutes)}
+
+    def _set_solute_rows(self, solutes, amounts):
+        """
+        Sets the [solutes, solvents] array of dissolved amounts, and points each entry in the solute dict at
+        its row of this array.
+        """
+        self._solutes = solutes
+        self._solute_amounts = amounts
+        self.solute_dict = {key:amounts[i] for i,key in enumerate(solutes)}
+
+    def _add_solvents(self, new_solvents):
+        """
+        Gives each new solvent a slot after the existing solvents (existing slots do not move).
+        """
+        n_old = len(self.solvents)
+        self.solvents = tuple(self.solvents) + new_solvents
+        self.solvent_dict = {mat:i for i,mat in enumerate(self.solvents)}
+        n_solvents = len(self.solvents)
+        #copy over variances and amounts (last entry is for air)
+        pad = np.zeros(len(new_solvents), dtype=np.float32)
+        self._layers_variance = np.concatenate(
+            [self._layers_variance[:n_old], pad, self._layers_variance[-1:]]).astype(np.float32)
+        self._layer_volumes = np.concatenate(
+            [self._layer_volumes[:n_old], pad, self._layer_volumes[-1:]]).astype(np.float32)
+        self._layers_position = np.zeros(n_solvents+1, dtype=np.float32)
+        #new solvent columns start out empty
+        amounts = np.zeros([len(self._solutes), n_solvents])
+        amounts[:, :n_old] = self._solute_amounts
+        self._set_solute_rows(self._solutes, amounts)
+        self._solvent_mols = np.concatenate([self._solvent_mols, np.zeros(len(new_solvents))])
+
+    def _add_solutes(self, new_solutes):
+        """
+        Gives each new solute an (empty) row after the existing solutes, and marks it for validation.
+        """
+        amounts = np.zeros([len(self._solutes)+len(new_solutes), len(self.solvents)])
+        amounts[:len(self._solutes)] = self._solute_amounts
+        self._set_solute_rows(self._solutes+new_solutes, amounts)
+        self._solute_mols = np.concatenate([self._solute_mols, np.full(len(new_solutes), np.nan)])
+
+    def _update_members(self):
+        """
+        Incrementally updates the solvent and solute slots using only the keys which were added to the
+        material dict since the last update. Solvents with zero amount keep their slot.
+
+        If the material dict was replaced or had keys removed, :meth:`rebuild_indices` is used instead.
+        Changes are found by comparing the set of keys (not their number), so swapping one material for
+        another is also caught.
+        """
+        mdict = self.material_dict
+        indexed, keys = self._indexed
+        current = mdict.keys()
+        if mdict is indexed and current == keys:
+            return
+        if mdict is not indexed or not current >= keys:
+            self.rebuild_indices()
+            return
+        new_keys = tuple(a for a in mdict if a not in keys)
+        self._indexed = (mdict, frozenset(mdict))
+
+        had_solvents = len(self.solvents) > 0
+        new_solvents = tuple(a for a in new_keys if mdict[a].is_solvent())
+        if new_solvents:
+            self._add_solvents(new_solvents)
+        if len(self.solvents) == 0:
+            return
+        # Solutes are only tracked once there is something to dissolve them in
+        if had_solvents:
+            new_solutes = tuple(a for a in new_keys if mdict[a].is_solute())
+        else:
+            new_solutes = tuple(a for a in mdict if mdict[a].is_solute())
+        if new_solutes:
+            self._add_solutes(new_solutes)
 
-    def validate_solvents(self):
+    def rebuild_indices(self):
         """
-        Updates the solute_dict and solvent_dict / solvent array when the solvents have changed
-        
+        Rebuilds the solvent and solute slots from scratch, keeping any dissolved amounts which are still valid.
+
+        This happens automatically when the material dict is replaced, but it needs to be called manually if
+        the solute / solvent flags of a material already in the vessel are changed.
         """
         if self.ignore_layout:return
-        new_solvents = tuple(a for a in self.material_dict if self.material_dict[a].is_solvent())
-        #union should be the same length as both new_solvents and solvents
-        union = tuple(a for a in new_solvents if a in self.solvent_dict)
-        if len(new_solvents)!=len(self.solvents) or len(new_solvents)!= len(union) :
-
+        mdict = self.material_dict
+        new_solvents = tuple(a for a in mdict if mdict[a].is_solvent())
+        new_solutes = tuple(a for a in mdict if mdict[a].is_solute()) if new_solvents else ()
+        old_dict = {key:self._solute_amounts[i] for i,key in enumerate(self._solutes)}
+        if new_solvents != tuple(self.solvents):
             #copy over variances
             self._layers_variance = np.array([self._layers_variance[self.solvent_dict[sol]]
             if sol in self.solvent_dict else 0 for sol in new_solvents]+[self._layers_variance[-1]],
@@ -192,20 +346,58 @@ class Vessel:
             self._layer_volumes = np.array([self._layer_volumes[self.solvent_dict[sol]]
             if sol in self.solvent_dict else 0 for sol in new_solvents]+[self._layer_volumes[-1]],
             dtype = np.float32)
-            #make a new solvent dict
-            self.solvent_dict,self.solute_dict = _rebuild_solute_dict(
-                self.solvent_dict, self.solute_dict, new_solvents
-            )
-            
-            n_solvents=len(new_solvents)
-            # If we went from 0 to 1+ solvents we need to dissolve the solutes
-            if len(self.solvents)==0 and n_solvents:
-                for key,arr in self.solute_dict.items():
-                    arr+=self.material_dict[key].mol/n_solvents
-                
-            self.solvents=new_solvents
             #last entry is for air
-            self._layers_position = np.zeros(n_solvents+1, dtype=np.float32)
+            self._layers_position = np.zeros(len(new_solvents)+1, dtype=np.float32)
+            _, old_dict = _rebuild_solute_dict(self.solvent_dict, old_dict, new_solvents)
+            self.solvents = new_solvents
+            self.solvent_dict = {mat:i for i,mat in enumerate(new_solvents)}
+
+        amounts = np.zeros([len(new_solutes), len(new_solvents)])
+        for i,key in enumerate(new_solutes):
+            if key in old_dict:
+                amounts[i] = old_dict[key]
+        self._set_solute_rows(new_solutes, amounts)
+        # Every row is checked on the next call to validate_solutes
+        self._solute_mols = np.full(len(new_solutes), np.nan)
+        self._solvent_mols = np.zeros(len(new_solvents))
+        self._indexed = (mdict, frozenset(mdict))
+
+    def validate_solutes(self, checksum: bool = True):
+        """
+        Gets a 1D array of solute amounts as well as a 1D array of solvent amounts, then performs
+        consistency checks with _validate_solute_amounts on the rows of the dissolved amount array
+        which could have changed since the last validation. These are the rows of solutes whose
+        amount changed, or all rows if a solvent was emptied.
+        """
+        if self.ignore_layout:return
+        self._update_members()
+        if len(self.solvents)==0 or len(self._solutes)==0:return
+        #get mol information for solutes and solvents
+        mdict = self.material_dict
+        solute_mols = np.array([mdict[key].mol for key in self._solutes], dtype=np.float64)
+        solvent_mols = np.array([mdict[key].mol for key in self.solvents], dtype=np.float64)
+
+        dirty = solute_mols != self._solute_mols
+        if np.any((solvent_mols<1e-12) & (self._solvent_mols>=1e-12)):
+            dirty[:] = True
+        rows = np.flatnonzero(dirty)
+        #run the validation
+        if len(rows) == len(dirty):
+            _validate_solute_amounts(solute_mols, solvent_mols, self._solute_amounts)
+        elif len(rows) > 0:
+            mol_dissolved = self._solute_amounts[rows]
+            _validate_solute_amounts(solute_mols[rows], solvent_mols, mol_dissolved)
+            self._solute_amounts[rows] = mol_dissolved
+        self._solute_mols = solute_mols
+        self._solvent_mols = solvent_mols
+
+    def validate_solvents(self):
+        """
+        Updates the solute_dict and solvent_dict / solvent array when solvents have been added
+        
+        """
+        if self.ignore_layout:return
+        self._update_members()
 
     def _handle_overflow(self):
         """
@@ -283,6 +475,9 @@ class Vessel:
         This function calls a set of event functions in sequence specified by `events`, then returns
         a tuple of status codes (one for each event).
 
+        Any pending time is integrated first (see :meth:`sync`). Events with a time are not performed right away,
+        instead they wait in the vessel's queue until its clock reaches their time.
+
         Args:
             events (Tuple[Event]): The sequence of events to be executed.
             dt (float): The amount of time elapsed (defaults to 0).
@@ -291,16 +486,112 @@ class Vessel:
         Returns:
             Tuple[int]: A sequence of status codes for each event. At the moment, 0 represents normal execution,
             and -1 represents an illegal state reached (like a vessel overflow or boiling an empty vessel).
+            Queued events have a status of None.
         """
+        self._touch()
         event_dict = type(self)._event_dict
         status=[]
         for event in events:
+            if event.time is not None:
+                heapq.heappush(self._queue, (event.time, next(_event_order), event))
+                status.append(None)
+                continue
+            if event.other_vessel is not None:
+                event.other_vessel._touch()
             status.append(event_dict[event.name](self, dt, event.other_vessel, *event.parameter))
         if (not self.ignore_layout) and update_layers:
-            self._mix(0,None,dt)
-            self._update_layers(0,None)
+            self._mix_and_update_layers(dt)
+        self.clock += dt
+        self.time = self.clock
+        return status
+
+    def advance(self, dt: float, events: Tuple[Event] = tuple(), events_dt: Optional[float] = None, update_layers: bool = True):
+        """
+        Moves the vessel's clock forward by dt without doing any work. Settling the layers (and running the given
+        time based events, such as reactions) is deferred until the vessel is next touched or observed, when all of
+        the pending time is integrated in one larger step (see :meth:`sync`).
+
+        Args:
+            dt (float): The amount of time elapsed
+            events (Tuple[Event]): Events which act over the elapsed time. Consecutive advances with the same events
+                are merged, so the events are run once with the total time.
+            events_dt (Optional[float]): The time given to the events (defaults to dt)
+            update_layers (bool): Whether or not to update layer information when the time is integrated (the layers
+                are always settled if any time passes)
+        """
+        self.clock += dt
+        self._stale = self._stale or update_layers
+        pending = self._pending
+        if pending is None:
+            pending = self._pending = []
+        if events:
+            events_dt = dt if events_dt is None else events_dt
+            if pending and pending[-1][0] is events:
+                pending[-1][1] += events_dt
+            else:
+                pending.append([events, events_dt])
+
+    def sync(self) -> List[int]:
+        """
+        Integrates the vessel's state up to its clock. Queued events which are due are performed in order of time,
+        each after integrating up to its time.
+
+        Returns:
+            List[int]: The status codes of the queued events which were performed
+        """
+        status = []
+        queue = self._queue
+        event_dict = type(self)._event_dict
+        while queue and queue[0][0] <= self.clock:
+            t, _, event = heapq.heappop(queue)
+            self._integrate(max(t, self.time))
+            if event.other_vessel is not None:
+                event.other_vessel._touch()
+            status.append(event_dict[event.name](self, 0, event.other_vessel, *event.parameter))
+            if not self.ignore_layout:
+                self._mix_and_update_layers(0)
+        if self._pending is not None:
+            self._integrate(self.clock)
         return status
 
+    def _touch(self):
+        """Syncs the vessel if it has pending time or queued events"""
+        if self._pending is not None or self._queue:
+            self.sync()
+
+    def _integrate(self, t: float, deferred: Optional[list] = None):
+        """
+        Settles the layers from the vessel's time up to t in one step, and runs the deferred time based events over
+        their share of that time. If a deferred list is given, (vessel, [(event, dt), ...]) is appended to it instead
+        of running the events (see :func:`sync_all`).
+        """
+        gap = t - self.time
+        pending = self._pending
+        if pending is None:
+            self.time = max(self.time, t)
+            return
+        total = self.clock - self.time
+        frac = 1.0 if total <= 0 else gap/total
+        final = t >= self.clock
+        if not self.ignore_layout and (gap > 0 or (final and self._stale)):
+            self._mix_and_update_layers(gap)
+        todo = []
+        remaining = []
+        for events, dt in pending:
+            if dt*frac > 0:
+                todo += [(event, dt*frac) for event in events]
+            if not final:
+                remaining.append([events, dt*(1-frac)])
+        self._pending = None if final else remaining
+        self._stale = self._stale and not final
+        self.time = t
+        if deferred is not None:
+            deferred.append((self, todo))
+            return
+        event_dict = type(self)._event_dict
+        for event, dt in todo:
+            event_dict[event.name](self, dt, event.other_vessel, *event.parameter)
+
     def _heat_contact(self, dt, other_vessel, Tf, ht) -> int:
         """
         Rough Estimate of heat transfer so we can simulate putting something on a bunson burner
@@ -325,61 +616,59 @@ class Vessel:
         if use_dQ:
             # Adding heat (dQ) is the same as linearly approximating the exponential and log functions and setting
             # The reservoir temperature to one unit above the current temperature (trust me)
-            exp= lambda x:1+x
-            ln = lambda x:x-1
             Tf = self.temperature+1
-        else:
-            ln=np.log
-            exp=np.exp
-
-
-        other_mats=other_vessel.material_dict
-        # Estimated final temperature before taking boiling into account
-        T = Tf+(self.temperature-Tf)*exp(-ht/self.heat_capacity())
 
         mdict=self.material_dict
+        mats = tuple(mdict.values())
+        boil, enthalpy, cap, order = self._heat_properties(mats)
+        mol = np.array([mat.mol for mat in mats], dtype=np.float64)
+        C_air = 1.2292875 #Heat capacity of air in J/L*K (near STP)
+
         #case for changing the heat of an empty vessel
-        total_mats = sum(mat.mol for key,mat in mdict.items())
-        if total_mats<1e-12:
-            self.temperature = T
+        if mol.sum()<1e-12:
+            C = self.volume*C_air+np.dot(mol, cap)
+            self.temperature = Tf+(self.temperature-Tf)*((1-ht/C) if use_dQ else np.exp(-ht/C))
             # -1 if placing an empty beaker on something hot
             return 0 if Tf<373 else -1
-        #get sorted boiling points
-        bp = sorted([(key,mdict[key]._boiling_point) for key in mdict],key = lambda x:x[1])
-
-        key,boil=bp[0]
-        i=0
-        while T>boil and T>self.temperature:
-            material = mdict[key]
-            #amount of transfer-time required to reach boiling temperature
-            ht += ln((Tf-boil)/(Tf-self.temperature))*self.heat_capacity() #i
-            self.temperature = boil #i
-            if use_dQ: Tf = self.temperature+1
-            boil_enthalpy=material.vapour_enthalpy #ii
-            # ht = dQ/(T_f-T_boil)
-            ht_used=min(ht,boil_enthalpy/(Tf-boil)) #ii
-            ht-=ht_used #iii
-            # Move the boiled material (iii)
-            fraction = (ht_used*(Tf-boil)/boil_enthalpy) if ht_used > 0 else 0
+
+        T, n_boiled, d_mol = _heat_contact_kernel(float(self.temperature), float(Tf), float(ht), use_dQ,
+            self.volume*C_air, mol, boil, enthalpy, cap, order)
+        self.temperature=T
+        if n_boiled == 0:
+            return other_vessel._handle_overflow()
+
+        # Move the boiled material
+        other_mats=other_vessel.material_dict
+        keys = tuple(mdict)
+        for k in order[:n_boiled]:
+            key, material = keys[k], mats[k]
             if key in other_mats:
-                d_mol = material.mol*fraction
-                other_mats[key].mol += d_mol
-                material.mol -= d_mol
+                other_mats[key].mol += d_mol[k]
+                material.mol -= d_mol[k]
             else:
-                other_mats[key] = material.ration(fraction)
+                other_mats[key] = material.ration(d_mol[k]/mol[k] if mol[k] > 0 else 0)
 
-            #Heat capacity is called again since it should be lower now
-            T = Tf+(self.temperature-Tf)*exp(-ht/self.heat_capacity())
-            i+=1
-            if i>=len(bp):break
-            key,boil=bp[i]
-        self.temperature=T
-        
         self.validate_solutes()
         other_vessel.validate_solvents()
         other_vessel.validate_solutes()
 
         return other_vessel._handle_overflow()
+
+    def _heat_properties(self, mats):
+        """
+        Gathers dense arrays of boiling points, vapour enthalpies (J/mol) and heat capacities (J/mol*K),
+        as well as the boiling point sort order. These are cached until the set of material objects changes.
+        """
+        cache = self._heat_cache
+        if cache is not None and len(cache[0]) == len(mats) and all(a is b for a,b in zip(cache[0],mats)):
+            return cache[1]
+        boil = np.array([mat._boiling_point for mat in mats], dtype=np.float64)
+        enthalpy = np.array([mat._enthalpy_vapor for mat in mats], dtype=np.float64)
+        cap = np.array([mat._molar_mass*mat._specific_heat for mat in mats], dtype=np.float64)
+        # A stable sort keeps the material dict order between equal boiling points
+        order = np.argsort(boil, kind="stable")
+        self._heat_cache = (mats, (boil, enthalpy, cap, order))
+        return self._heat_cache[1]
         
     def _change_heat(self, dt, other_vessel, dQ) -> int:
         """
@@ -447,8 +736,6 @@ class Vessel:
             if drained_volume<=1e-12:continue
             #how much solvent is drained (percent wise)
             fraction=np.clip(drained_volume/self._layers_volume[i],0,1)
-            if mat.litres<1e-12:
-                self.DEBUG=self._hashed_layers*1,self.solvents
             #drain out the solvent
             if key in other_mats:
                 d_mol=mat.mol*fraction
@@ -481,14 +768,21 @@ class Vessel:
         This updates the amounts dissolved, layer positions and layer variances  
         """
         if self.ignore_layout:return -2
+        args = self._mix_args(t)
+        self._set_mix_result(separate.mix(*args), args[0])
+        return 0
+
+    def _mix_args(self, t):
+        """
+        Gathers the (dense) arguments of separate.mix for mixing for time t
+        """
         t=np.float32(t) #or replace dt
         # Make air layer properties
         d_air = 1.225 #in g/L
         c_air = 0.65 #chosen color of air
 
-        #This is just to ensure the order of solutes does not change
-        s_names = tuple(s for s in self.solute_dict)
-        #Grab solute and solvent objects
+        #Grab solute and solvent objects (in slot order)
+        s_names = self._solutes
         solutes = tuple(self.material_dict[s] for s in s_names)
         solvents = [self.material_dict[s] for s in self.solvents]
         #Get solvent volumes
@@ -513,15 +807,12 @@ class Vessel:
 
         #Get solute properties
         solute_polarity = np.array([mat.polarity for mat in solutes], dtype=np.float32)
-        #Hopefully this is the correct 2D array shape
-        if len(s_names)>0:
-            solute_amount = np.stack([self.solute_dict[a] for a in s_names]).astype(np.float32)
-        else:
-            solute_amount=np.zeros([0,len(solvents)],dtype=np.float32)
+        # [solutes, solvents] array of dissolved amounts
+        solute_amount = self._solute_amounts.astype(np.float32)
 
         solute_svolume = np.array([mat.litres_per_mol for mat in solutes], dtype=np.float32)
         
-        self._layers_position, self._layers_volume, self._layers_variance, self._variance, new_solute_amount, self._lvar = separate.mix(
+        return (
             layer_volume,
             self._layer_volumes.astype(np.float32),
             solute_svolume,
@@ -535,12 +826,16 @@ class Vessel:
             t
         )
 
-        self._layer_volumes = layer_volume
+    def _set_mix_result(self, result, layer_volume):
+        """
+        Stores the output of separate.mix, where layer_volume is the volume of each layer passed to it
+        """
+        self._layers_position, self._layers_volume, self._layers_variance, self._variance, new_solute_amount, self._lvar = result
 
-        for i,s in enumerate(s_names):
-            self.solute_dict[s] = new_solute_amount[i]
+        self._layer_volumes = layer_volume
 
-        return 0
+        # Write in place so the solute dict entries stay views of the dissolved amount array
+        self._solute_amounts[:] = new_solute_amount
    
     def _update_layers(self, dt, other_vessel) -> int:
 
@@ -555,31 +850,64 @@ class Vessel:
             self._layers_position.astype(np.float32),
             self._lvar.astype(np.float32),
             self._layer_colors,
-            layer_values
+            layer_values,
+            self._layer_randoms()
         )
 
+    def _layer_randoms(self):
+        """
+        Returns:
+            Optional[np.ndarray]: The uniform random numbers for sampling a layer image (drawn from :attr:`rng`),
+            or None if the vessel has no generator.
+        """
+        return None if self.rng is None else self.rng.random(100)
+
+    def _mix_and_update_layers(self, t):
+        """
+        Equivalent to calling _mix then _update_layers, but done in a single (GIL-free) call to separate.mix_and_map
+        """
+        args = self._mix_args(t)
+        *result, self._layers, self._hashed_layers = separate.mix_and_map(*args, self._layer_colors, layer_values, self._layer_randoms())
+        self._set_mix_result(result, args[0])
+
     def get_layers(self):
         """
         Returns:
             List[float]: The color of each vessel layer.
         """
+        self._touch()
         if self._layers is None:
-            self._mix(0,None,0)
-            self._update_layers(0,None)
+            self._mix_and_update_layers(0)
         return self._layers
 
+    def get_layer_distribution(self):
+        """
+        Returns:
+            Tuple[np.ndarray]: The volume, position, variance and color of each layer (air last), as used by
+            :func:`~chemistrylab.extract_algorithms.separate.map_to_state`.
+        """
+        self._touch()
+        if self._layers is None:
+            self._mix_and_update_layers(0)
+        return self._layers_volume, self._layers_position, self._lvar, self._layer_colors
+
     @classmethod
-    def register(self, func: Callable, name: str):
+    def register(self, func: Callable, name: str, batched: Optional[Callable] = None):
         """
         The method to register an event function which updates a vessel instance.
 
         Args:
             func (Callable[[Vessel, Tuple, Optional[Vessel]], int]): An event function which acts on one or two vessels.
             name (str): The name of the event function for registration.
+            batched (Optional[Callable[[List[Vessel], np.ndarray, Optional[Vessel]], List[int]]]): An implementation
+                of the event which acts on many vessels at once (each with its own dt), returning a status code for
+                each vessel. It is used by :func:`run_event` and :func:`sync_all`.
         """
         if name in self._event_dict:
             raise Exception(f"Cannot register the same Event ({name}) Twice!")
         self._event_dict[name]=func
+        if batched is not None:
+            self._batched_event_dict[name]=batched
     
     #ANY SUBCLASSES SHOULD DEFINE THIS EXPLICITLY!!!
     _event_dict = {
@@ -590,4 +918,56 @@ class Vessel:
             'update layer': _update_layers,
             'change heat': _change_heat,
             'heat contact': _heat_contact,
-        }
\ No newline at end of file
+        }
+    # Batched event functions (see register)
+    _batched_event_dict = {}
+
+
+def run_event(event: Event, vessels: Sequence[Vessel], dt: Union[float, Sequence[float]] = 0) -> List[int]:
+    """
+    Performs an event on several vessels of the same type. If the event was registered with a batched
+    implementation (see :meth:`Vessel.register`), it handles all of the vessels in one call.
+
+    Args:
+        event (Event): The event to perform (its time is ignored)
+        vessels (Sequence[Vessel]): The vessels to perform it on
+        dt (Union[float, Sequence[float]]): The amount of time elapsed (for all vessels or for each one)
+    Returns:
+        List[int]: The status code of the event in each vessel
+    """
+    if len(vessels) == 0:
+        return []
+    dt = np.broadcast_to(np.asarray(dt, dtype=np.float64), (len(vessels),))
+    vessel_type = type(vessels[0])
+    batched = vessel_type._batched_event_dict.get(event.name)
+    if batched is not None and len(vessels) > 1:
+        return list(batched(vessels, dt, event.other_vessel, *event.parameter))
+    func = vessel_type._event_dict[event.name]
+    return [func(v, float(t), event.other_vessel, *event.parameter) for v, t in zip(vessels, dt)]
+
+def sync_all(vessels: Sequence[Vessel]):
+    """
+    Same as calling :meth:`Vessel.sync` on each vessel, except that the deferred time based events are gathered
+    and run together with :func:`run_event`, so events with a batched implementation (such as reactions) are run
+    on every vessel at once.
+
+    Args:
+        vessels (Sequence[Vessel]): The vessels to sync
+    """
+    deferred = []
+    for v in vessels:
+        if v._queue:
+            v.sync()
+        elif v._pending is not None:
+            v._integrate(v.clock, deferred)
+    # The i-th deferred event of each vessel are run together, which keeps the order of events within a vessel
+    for i in range(max((len(todo) for v, todo in deferred), default=0)):
+        groups = dict()
+        for v, todo in deferred:
+            if i < len(todo):
+                event, dt = todo[i]
+                group = groups.setdefault((id(event), type(v)), (event, [], []))
+                group[1].append(v)
+                group[2].append(dt)
+        for event, group_vessels, dts in groups.values():
+            run_event(event, group_vessels, dts)
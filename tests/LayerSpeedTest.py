@@ -0,0 +1,56 @@
+import os
+import sys
+
+sys.path.append('..')
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gymnasium as gym
+import chemistrylab
+import numpy as np
+from chemistrylab.extract_algorithms import separate
+from chemistrylab.benches.characterization_bench import CharacterizationBench
+
+#time.time() isn't the very best for timing but I don't care
+import time
+
+def gather_vessels(env_id, n_envs, steps=10, seed=0):
+    """Returns the working vessels of n_envs benches after some random actions"""
+    vessels = []
+    rng = np.random.default_rng(seed)
+    for i in range(n_envs):
+        env = gym.make(env_id).unwrapped
+        env.reset(seed=seed+i)
+        for _ in range(steps):
+            env.step(rng.integers(env.n_actions-1))
+        vessels += env.shelf.get_working_vessels()
+    return vessels
+
+def time_layers(vessels, repeats):
+    """Returns the time per vessel (in seconds) of map_to_state, expected_layers (one vessel at a time) and a batched expected_layers"""
+    dists = [v.get_layer_distribution() for v in vessels]
+    dists = [(A.astype(np.float32), B.astype(np.float32), C.astype(np.float32), colors) for A, B, C, colors in dists]
+    #warm up (compiles the numba kernels)
+    for d in dists:
+        separate.map_to_state(*d, separate.x)
+    CharacterizationBench.get_layers_expected_batch(vessels)
+    t0 = time.perf_counter()
+    for x in range(repeats):
+        for d in dists:
+            separate.map_to_state(*d, separate.x)
+    t1 = time.perf_counter()
+    for x in range(repeats):
+        for d in dists:
+            separate.expected_layers(*d)
+    t2 = time.perf_counter()
+    for x in range(repeats):
+        CharacterizationBench.get_layers_expected_batch(vessels)
+    t3 = time.perf_counter()
+    n = repeats*len(vessels)
+    return (t1-t0)/n, (t2-t1)/n, (t3-t2)/n
+
+if __name__ == "__main__":
+    for n_envs in [1, 8, 64]:
+        vessels = gather_vessels("GenWurtzExtract-v2", n_envs)
+        sampled, expected, batched = time_layers(vessels, max(10, 1000//n_envs))
+        print("%3d vessels  map_to_state: %6.2f us  expected_layers: %6.2f us  batched: %6.2f us (per vessel)"%(
+            len(vessels), sampled*1e6, expected*1e6, batched*1e6))
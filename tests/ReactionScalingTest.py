@@ -0,0 +1,66 @@
+import os
+import sys
+
+sys.path.append('..')
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import glob
+import numpy as np
+from chemistrylab.reactions.reaction_info import ReactInfo, REACTION_PATH
+from chemistrylab.reactions.reaction import get_rates, get_rates_sparse, SparseStoich
+
+#time.time() isn't the very best for timing but I don't care
+import time
+
+def synthetic_network(n_species, n_reactions, seed=0):
+    """
+    Makes a random reaction network where each elementary reaction has one or two reactants and one or two products
+
+    Returns:
+        Tuple[np.ndarray]: pre_exp_arr, activ_energy_arr, stoich_coeff_arr and conc_coeff_arr
+    """
+    rng = np.random.default_rng(seed)
+    stoich = np.zeros((n_reactions, n_species))
+    conc_coeff = np.zeros((n_species, n_reactions))
+    for i in range(n_reactions):
+        species = rng.choice(n_species, size=4, replace=False)
+        n_react = rng.integers(1, 3)
+        for j in species[:n_react]:
+            stoich[i, j] = 1
+            conc_coeff[j, i] = -1
+        for j in species[n_react:n_react+rng.integers(1, 3)]:
+            conc_coeff[j, i] = 1
+    pre_exp = rng.uniform(1, 10, n_reactions)
+    activ_energy = rng.uniform(1e3, 1e4, n_reactions)
+    return pre_exp, activ_energy, stoich, conc_coeff
+
+def time_rates(pre_exp, activ_energy, stoich, conc_coeff, repeats):
+    """Returns the time per call (in seconds) of the dense and sparse rate calculations"""
+    sparse = SparseStoich.from_dense(stoich, conc_coeff)
+    conc = np.random.default_rng(0).random(conc_coeff.shape[0])
+    n = stoich.shape[1]
+    #warm up (compiles the numba kernels)
+    dense_rates = get_rates(stoich, pre_exp, activ_energy, conc_coeff, n, 300.0, conc)
+    sparse_rates = get_rates_sparse(pre_exp, activ_energy, 300.0, conc, *sparse)
+    assert np.allclose(dense_rates, sparse_rates)
+    t0 = time.perf_counter()
+    for x in range(repeats):
+        get_rates(stoich, pre_exp, activ_energy, conc_coeff, n, 300.0, conc)
+    t1 = time.perf_counter()
+    for x in range(repeats):
+        get_rates_sparse(pre_exp, activ_energy, 300.0, conc, *sparse)
+    t2 = time.perf_counter()
+    return (t1-t0)/repeats, (t2-t1)/repeats
+
+if __name__ == "__main__":
+    for fn in sorted(glob.glob(REACTION_PATH+"/*.json")):
+        info = ReactInfo.from_json(fn)
+        if info.activ_energy_arr.ndim != 1:
+            continue
+        dense, sparse = time_rates(info.pre_exp_arr, info.activ_energy_arr, info.stoich_coeff_arr, info.conc_coeff_arr, 10000)
+        print("%-20s dense: %8.2f us  sparse: %8.2f us"%(os.path.basename(fn), dense*1e6, sparse*1e6))
+
+    for n_reactions in [100, 1000, 10000]:
+        network = synthetic_network(max(n_reactions//10, 10), n_reactions)
+        dense, sparse = time_rates(*network, max(10, 100000//n_reactions))
+        print("%-20s dense: %8.2f us  sparse: %8.2f us (%.1fx)"%("%d reactions"%n_reactions, dense*1e6, sparse*1e6, dense/sparse))
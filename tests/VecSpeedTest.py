@@ -0,0 +1,66 @@
+import os
+import sys
+
+sys.path.append('..')
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gymnasium as gym
+import chemistrylab
+import numpy as np
+from functools import partial
+from chemistrylab.util.vec_env import ThreadVecEnv
+
+#time.time() isn't the very best for timing but I don't care
+import time
+
+def run_vec_env(env_id, n_envs, n_threads, steps=200):
+    """Returns the number of environment steps per second of a ThreadVecEnv"""
+    venv = ThreadVecEnv([partial(gym.make, env_id)]*n_envs, n_threads=n_threads)
+    venv.reset()
+    actions = [np.array([venv.action_space.sample() for _ in range(n_envs)]) for _ in range(steps)]
+    #warm up (compiles the numba kernels)
+    for a in actions[:10]:
+        venv.step(a)
+    t0 = time.perf_counter()
+    for a in actions:
+        venv.step(a)
+    t = time.perf_counter()
+    venv.close()
+    return n_envs*steps/(t-t0)
+
+def run_autoreset(env_id, n_envs, prefetch_resets, steps=300, policy_time=2e-3):
+    """
+    Returns the mean and 99th percentile time (in seconds) spent in ThreadVecEnv.step, where every env ends its
+    episode with probability 1/10 each step. policy_time seconds are spent outside of the env between steps
+    (as an agent would), which is when prefetched resets get made.
+    """
+    venv = ThreadVecEnv([partial(gym.make, env_id)]*n_envs, n_threads=1, prefetch_resets=prefetch_resets)
+    venv.reset()
+    rng = np.random.default_rng(0)
+    end = venv.action_space.n - 1
+    actions = [np.where(rng.random(n_envs)<0.1, end, rng.integers(0, end, n_envs)) for _ in range(steps)]
+    times = []
+    for a in actions:
+        t0 = time.perf_counter()
+        venv.step(a)
+        times.append(time.perf_counter()-t0)
+        time.sleep(policy_time)
+    venv.close()
+    times = np.array(times[10:])
+    return times.mean(), np.percentile(times, 99)
+
+if __name__ == "__main__":
+    n_envs = os.cpu_count()*2
+    for env_id in ["GenWurtzExtract-v2", "GenWurtzDistill-v2", "GenWurtzReact-v2"]:
+        base = run_vec_env(env_id, n_envs, 1)
+        print(env_id, "1 thread: %.0f steps/s"%base)
+        n_threads = 2
+        while n_threads <= os.cpu_count():
+            rate = run_vec_env(env_id, n_envs, n_threads)
+            print(env_id, "%d threads: %.0f steps/s (%.2fx)"%(n_threads, rate, rate/base))
+            n_threads *= 2
+
+    for env_id in ["GenWurtzExtract-v2", "GenWurtzDistill-v2"]:
+        for prefetch in [False, True]:
+            mean, p99 = run_autoreset(env_id, n_envs, prefetch)
+            print(env_id, "prefetch_resets=%s: step %.0f us (p99 %.0f us)"%(prefetch, mean*1e6, p99*1e6))
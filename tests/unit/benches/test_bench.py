@@ -67,3 +67,80 @@ class BenchTestCase(TestCase):
             for seed in range(1,300,10):
                 v_start,v_end,react_info = run_env_no_overflow(env_id,seed)
                 self.assertTrue(check_conservation(v_start,v_end))            
+
+    def test_compiled_actions(self):
+        for env_id in ENVS:
+            env = gym.make(env_id).unwrapped
+            env.reset(seed=1)
+            self.assertEqual(len(env._compiled), env.n_actions)
+            for compiled, (events, action) in zip(env._compiled, env.actions):
+                self.assertEqual(compiled.terminal, action.terminal)
+                for (v, func, other, param), (v2, event) in zip(compiled.events, events):
+                    self.assertEqual(v, v2)
+                    self.assertIs(func, type(env.shelf[v])._event_dict[event.name])
+                    self.assertIs(None if other is None else env.shelf[other], event.other_vessel)
+                    self.assertEqual(str(param), str(event.parameter))
+
+    def test_step_many(self):
+        env1 = gym.make("GenWurtzReact-v2").unwrapped
+        env2 = gym.make("GenWurtzReact-v2").unwrapped
+        env1.reset(seed=3)
+        env2.reset(seed=3)
+        action = np.random.default_rng(0).random(env1.n_actions).astype(np.float32)
+        total = 0
+        for _ in range(4):
+            o1, r, d1, *_ = env1.step(action)
+            total += r
+        o2, r2, d2, _, info = env2.step_many(action, repeat=4)
+        self.assertEqual(info["n_steps"], 4)
+        self.assertTrue(np.allclose(o1, o2))
+        self.assertAlmostEqual(total, r2)
+        #stops early when the episode is done
+        _, _, done, _, info = env2.step_many([action]*100)
+        self.assertTrue(done)
+        self.assertEqual(info["n_steps"], env2.max_steps-4)
+        #a single continuous action given as a plain list is repeated, not split up
+        env1.reset(seed=3)
+        env2.reset(seed=3)
+        o1, r1, *_ = env1.step_many(action, repeat=2)
+        o2, r2, _, _, info = env2.step_many([float(a) for a in action], repeat=2)
+        self.assertEqual(info["n_steps"], 2)
+        self.assertTrue(np.allclose(o1, o2))
+        self.assertAlmostEqual(r1, r2)
+        #discrete benches take lists of actions
+        env = gym.make("GenWurtzExtract-v2").unwrapped
+        env.reset(seed=0)
+        self.assertEqual(env.step_many([0, 0, 0])[-1]["n_steps"], 3)
+
+    def test_bandit_evaluate(self):
+        env = gym.make("FictReactBandit-v1").unwrapped
+        env.reset(seed=0)
+        actions = np.random.default_rng(0).random((6, env.action_space.shape[0])).astype(np.float32)
+        returns = env.evaluate(actions, n_workers=1)
+        self.assertEqual(env.steps, 0)
+        for a, ret in zip(actions, returns):
+            env.reset(seed=0)
+            self.assertAlmostEqual(env.step(a)[1], ret)
+        self.assertTrue(np.allclose(env.evaluate(actions, n_workers=2), returns))
+        #candidates do not depend on each other, or on the bench's random state
+        state = env.np_random.bit_generator.state
+        self.assertTrue(np.array_equal(env.evaluate(actions[::-1], n_workers=1)[::-1], returns))
+        self.assertTrue(np.array_equal(env.evaluate(actions[2:3], n_workers=1), returns[2:3]))
+        self.assertEqual(env.np_random.bit_generator.state, state)
+
+    def test_quantized_observations(self):
+        from chemistrylab.benches.characterization_bench import dequantize
+        for env_id in ["GenWurtzReact-v2", "GenWurtzExtract-v2", "GenWurtzDistill-v2"]:
+            env1 = gym.make(env_id).unwrapped
+            env2 = gym.make(env_id, obs_dtype=np.uint8).unwrapped
+            self.assertEqual(env2.observation_space.dtype, np.uint8)
+            self.assertEqual(env2.observation_space.shape, env1.observation_space.shape)
+            o1, _ = env1.reset(seed=5)
+            o2, _ = env2.reset(seed=5)
+            action = env1.action_space.sample()
+            for _ in range(3):
+                self.assertTrue(env2.observation_space.contains(o2))
+                self.assertEqual(o2.nbytes*4, o1.nbytes)
+                self.assertLessEqual(np.abs(dequantize(o2)-o1).max(), 1/510+1e-6)
+                o1, *_ = env1.step(action)
+                o2, *_ = env2.step(action)
@@ -0,0 +1,64 @@
+import sys
+sys.path.append('../../../')
+
+import os
+import numpy as np
+import gymnasium as gym
+from functools import partial
+from unittest import TestCase
+
+import chemistrylab
+from chemistrylab.util.vec_env import ThreadVecEnv
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../../RL_rollout'))
+from Heuristic_Policies import *
+
+
+N = 6
+
+
+def scalar_actions(policies, obs):
+    return np.array([p.predict(o)[0] for p, o in zip(policies, obs)])
+
+
+class VecHeuristicTestCase(TestCase):
+
+    def test_react_heuristics(self):
+        rng = np.random.default_rng(0)
+        obs = rng.random((N, 213)).astype(np.float32)
+        obs[:, :100] *= rng.choice([0.005, 0.05, 1], (N, 1))
+        for Vec, Scalar in [(VecWurtzReactHeuristic, WurtzReactHeuristic), (VecFictReact2Heuristic, FictReact2Heuristic)]:
+            act, _ = Vec(None, n_envs=N).predict(obs)
+            self.assertEqual(act.shape[0], N)
+            self.assertTrue(np.allclose(act, scalar_actions([Scalar(None) for _ in range(N)], obs)))
+
+    def test_sequence_heuristics(self):
+        rng = np.random.default_rng(0)
+        cases = [(VecWurtzExtractHeuristic, WurtzExtractHeuristic, [1, 2, 3]), (VecWaterOilHeuristic, WaterOilHeuristic, [2, 3]),
+            (VecWurtzDistillHeuristic, WurtzDistillHeuristic, [2])]
+        for Vec, Scalar, levels in cases:
+            for level in levels:
+                vec = Vec(None, level, n_envs=N)
+                scalar = [Scalar(None, level) for _ in range(N)]
+                for t in range(60):
+                    obs = (rng.random((N, 100)) < rng.random((N, 1))).astype(np.float32)
+                    act, _ = vec.predict(obs)
+                    # the scalar extraction heuristic indexes observations of a single env VecEnv
+                    expected = scalar_actions(scalar, obs[:, None] if Vec is VecWurtzExtractHeuristic else obs)
+                    self.assertTrue(np.array_equal(act, expected))
+                    self.assertTrue(np.array_equal(vec.steps, [p.step for p in scalar]))
+
+    def test_vec_env_rollout(self):
+        env = ThreadVecEnv([partial(gym.make, "GenWurtzDistill-v2")]*2)
+        try:
+            model = VecWurtzDistillHeuristic(env, level=3)
+            scalar = [WurtzDistillHeuristic(e.unwrapped, level=3) for e in env.envs]
+            obs = env.reset()
+            episode_start = np.ones(env.num_envs, dtype=bool)
+            for t in range(12):
+                expected = np.array([p.predict(None)[0] for p in scalar])
+                act, _ = model.predict(obs, episode_start=episode_start)
+                self.assertTrue(np.array_equal(act, expected))
+                obs, rew, episode_start, info = env.step(act)
+        finally:
+            env.close()
@@ -0,0 +1,49 @@
+import sys
+sys.path.append('../../../')
+
+import numpy as np
+import chemistrylab
+from chemistrylab.lab.lab import Lab, BenchJob
+from unittest import TestCase
+
+
+class LabTestCase(TestCase):
+
+    def test_run_flow(self):
+        benches = ["GenWurtzReact-v2", "GenWurtzExtract-v2", "GenWurtzDistill-v2"]
+        with Lab(benches, n_workers=2) as lab:
+            stages = lab.run_flow(benches, n=2, target="dodecane", outputs=[(0,), (0,), None])
+            self.assertEqual(len(stages), 3)
+            for stage in stages:
+                self.assertEqual([r.target for r in stage], ["dodecane"]*2)
+            # only the outputs of the last stage are left on the shelf
+            self.assertEqual([r.outputs for r in stages[-1]], [(0, 1, 2), (3, 4, 5)])
+            self.assertEqual(len(lab.shelf), 6)
+            stats = lab.throughput()
+            self.assertEqual(set(stats), set(benches))
+            self.assertTrue(all(s.jobs == 2 for s in stats.values()))
+            self.assertIn("GenWurtzDistill-v2", lab.report())
+
+    def test_shared_vessels(self):
+        with Lab(["GenWurtzReact-v2", "GenWurtzExtract-v2"]) as lab:
+            lab.run([BenchJob("GenWurtzReact-v2", outputs=(0,))])
+            with self.assertRaises(ValueError):
+                lab.run([BenchJob("GenWurtzExtract-v2", (0,)), BenchJob("GenWurtzExtract-v2", (0,))])
+            with self.assertRaises(IndexError):
+                lab.run([BenchJob("GenWurtzExtract-v2", (1,))])
+            self.assertEqual(len(lab.shelf), 1)
+
+    def test_step(self):
+        lab = Lab(["GenWurtzReact-v2"])
+        lab.reset()
+        reward, analysis, done = lab.step([0, 0, 0, 0])
+        self.assertFalse(done)
+        self.assertEqual(len(lab.shelf), 1)
+        # characterize the new vessel
+        reward, analysis, done = lab.step([3, 0, 0, 0])
+        self.assertEqual(reward, 0)
+        self.assertEqual(analysis.shape, (200,))
+        # no vessel in this slot
+        reward, analysis, done = lab.step([3, 0, 5, 0])
+        self.assertEqual(reward, -10)
+        self.assertTrue(lab.step([4, 0, 0, 0])[2])
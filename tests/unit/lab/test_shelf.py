@@ -0,0 +1,106 @@
+import sys
+sys.path.append('../../../')
+
+import os
+import shutil
+import tempfile
+import numpy as np
+from chemistrylab import vessel, material
+from chemistrylab.benches.extract_bench import wurtz_vessel, make_solvent
+from chemistrylab.lab.shelf import Shelf
+from chemistrylab.lab.vessel_library import VesselLibrary, save_vessels
+from unittest import TestCase
+
+
+class ShelfTestCase(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "shelf.vessels")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def make_vessels(self):
+        v = wurtz_vessel("dodecane")[0]
+        h2o = make_solvent("H2O")
+        h2o.push_event_to_queue([vessel.Event("pour by volume",(0.2,),v)])
+        v.push_event_to_queue([vessel.Event("mix",(-1,),None)])
+        return [v, h2o, vessel.Vessel("beaker")]
+
+    def assertSameVessel(self, v1, v2, layers=True):
+        self.assertEqual(v1.label, v2.label)
+        self.assertEqual(v1.temperature, v2.temperature)
+        self.assertEqual(list(v1.material_dict), list(v2.material_dict))
+        for key, mat in v1.material_dict.items():
+            mat2 = v2.material_dict[key]
+            self.assertIs(type(mat2), type(mat))
+            self.assertIs(mat2._species, mat._species)
+            self.assertEqual((mat.mol, mat.phase, mat._solute, mat._solvent), (mat2.mol, mat2.phase, mat2._solute, mat2._solvent))
+        self.assertEqual(tuple(v1.solvents), tuple(v2.solvents))
+        self.assertEqual(v1._solutes, v2._solutes)
+        self.assertTrue(np.array_equal(v1._solute_amounts, v2._solute_amounts))
+        if layers and v1._layers is not None:
+            self.assertTrue(np.array_equal(v1.get_layers(), v2.get_layers()))
+            self.assertTrue(np.array_equal(v1._hashed_layers, v2._hashed_layers))
+
+    def test_save_load(self):
+        vessels = self.make_vessels()
+        shelf = Shelf(vessels, n_working=2)
+        shelf.save(self.path)
+        loaded = Shelf.load(self.path)
+        self.assertEqual(loaded.n_working, 2)
+        self.assertEqual(len(loaded), len(vessels))
+        for v1, v2 in zip(vessels, loaded.vessels):
+            self.assertSameVessel(v1, v2)
+        # The modified Na/Cl from extract_bench keep their boiling point
+        self.assertEqual(loaded[0].material_dict["Na"]._boiling_point, material.NaCl()._boiling_point)
+        # The solute dict is a view of the dissolved amounts
+        self.assertTrue(np.shares_memory(loaded[0].solute_dict["Na"], loaded[0]._solute_amounts))
+        # Loaded vessels behave the same as the originals (apart from the random noise in the layer image)
+        for v, beaker in [(vessels[0], vessels[2]), (loaded[0], loaded[2])]:
+            v.push_event_to_queue([vessel.Event("pour by percent",(0.5,),beaker), vessel.Event("change heat",(1000,),beaker)])
+        self.assertSameVessel(vessels[0], loaded[0], layers=False)
+        self.assertSameVessel(vessels[2], loaded[2], layers=False)
+
+    def test_load_vessel(self):
+        vessels = self.make_vessels()
+        save_vessels(self.path, vessels)
+        shelf = Shelf([vessel.Vessel("beaker")])
+        added = shelf.load_vessel(self.path, 1)
+        self.assertEqual(len(shelf), 2)
+        self.assertIs(shelf[1], added[0])
+        self.assertSameVessel(shelf[1], vessels[1])
+        shelf.load_vessel(self.path)
+        self.assertEqual(len(shelf), 5)
+        library = VesselLibrary(self.path)
+        self.assertEqual(len(library), 3)
+        for v1, v2 in zip(library[[2, 0]], [vessels[2], vessels[0]]):
+            self.assertSameVessel(v1, v2)
+
+    def test_vessel_bank(self):
+        from chemistrylab.benches import distillation_bench
+        from chemistrylab.lab.shelf import VariableShelf, VesselBank
+        calls = []
+        def make(target, salt):
+            calls.append((target, salt))
+            return distillation_bench.wurtz_vessel(target, salt)[0]
+        bank = VesselBank(make, variants=[False, True])
+        shelf = VariableShelf([bank, lambda x:vessel.Vessel("Beaker 1")], [], n_working=2, bank=True)
+        rng = np.random.default_rng(0)
+        draws = [rng.choice(2) > 0.5 for x in range(20)]
+        rng = np.random.default_rng(0)
+        for salt in draws:
+            shelf.reset("dodecane", rng)
+            self.assertEqual("NaCl" in shelf[0].material_dict, salt)
+            self.assertTrue(all(v.rng is rng for v in shelf))
+            self.assertSameVessel(shelf[0], make("dodecane", salt))
+            calls.pop()
+        # Each variant of the vessel was only made once
+        self.assertEqual(len(calls), len(set(calls)))
+        self.assertIn(("dodecane", False), calls)
+        self.assertIn(("dodecane", True), calls)
+        # Vessels from the bank are independent of each other
+        v1, v2 = bank.get("dodecane"), bank.get("dodecane")
+        v1.material_dict["dodecane"].mol = 0.5
+        self.assertEqual(v2.material_dict["dodecane"].mol, 1)
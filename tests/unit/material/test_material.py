@@ -0,0 +1,98 @@
+import sys
+sys.path.append('../../../')
+
+import os
+import copy
+import pickle
+import shutil
+import tempfile
+import numpy as np
+from unittest import TestCase
+
+from chemistrylab import material
+
+
+class MaterialTableTestCase(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.originals = {}
+        mats = []
+        for name in list(material.REGISTRY):
+            mat = material.REGISTRY[name]()
+            self.originals["table_"+name] = mat
+            mat = copy.deepcopy(mat)
+            mat._name = "table_"+name
+            mats.append(mat)
+        self.path = os.path.join(self.tmp, "materials.csv")
+        material.MaterialTable.write(self.path, mats)
+        self.table = material.register_table(self.path)
+
+    def tearDown(self):
+        for name in self.table.names:
+            del material.REGISTRY[name]
+        shutil.rmtree(self.tmp)
+
+    def test_table_matches_classes(self):
+        self.assertEqual(len(self.table), len(self.originals))
+        for name, orig in self.originals.items():
+            #materials are only made when looked up
+            self.assertIn(name, material.REGISTRY._pending)
+            mat = material.REGISTRY[name]()
+            self.assertNotIn(name, material.REGISTRY._pending)
+            self.assertIsInstance(mat, material.TableMaterial)
+            self.assertEqual(mat._name, name)
+            for key in ["phase", "_density", "_solute", "_solvent", "_index", "polarity", "charge", "_molar_mass", "_color", "_boiling_point", "_specific_heat"]:
+                self.assertEqual(getattr(mat, key), getattr(orig, key))
+            self.assertTrue(np.array_equal(mat.get_spectra_overlap(), np.reshape(orig.get_spectra_overlap(), (-1, 3))))
+            self.assertTrue(np.array_equal(mat.get_spectra_no_overlap(), np.reshape(orig.get_spectra_no_overlap(), (-1, 3))))
+
+    def test_table_materials(self):
+        mat = material.REGISTRY["table_H2O"]()
+        mat.mol = 2.0
+        part = mat.ration(0.25)
+        self.assertIs(type(part), type(mat))
+        self.assertAlmostEqual(part.mol, 0.5)
+        copied = pickle.loads(pickle.dumps(mat))
+        self.assertIs(type(copied), type(mat))
+        self.assertEqual(copied.mol, 1.5)
+        with self.assertRaises(Exception):
+            material.register_table(self.path)
+
+    def test_explicit_state(self):
+        # pickling must not rely on object.__getstate__ (which only exists from python 3.11)
+        a = material.REGISTRY["table_dodecane"]()
+        a.mol, a.temperature = 3.0, 310.0
+        func, args, state = a.__reduce__()
+        self.assertIsInstance(state, tuple)
+        b = func(*args)
+        b.__setstate__(state)
+        self.assertIs(type(b), type(a))
+        self.assertEqual((b.mol, b.temperature), (3.0, 310.0))
+        self.assertIs(b._species, a._species)
+        c = pickle.loads(pickle.dumps(material.Dodecane(mol=2.0)))
+        self.assertEqual(c.mol, 2.0)
+
+
+class MaterialSpeciesTestCase(TestCase):
+
+    def test_species_shared(self):
+        a, b = material.Dodecane(mol=1.0), material.Dodecane(mol=2.0)
+        self.assertIs(a._species, b._species)
+        self.assertFalse(hasattr(a, "__dict__"))
+        for c in [copy.deepcopy(a), pickle.loads(pickle.dumps(a))]:
+            self.assertIs(c._species, a._species)
+            self.assertEqual(c.mol, 1.0)
+        with self.assertRaises(AttributeError):
+            a._species.name = "X"
+
+    def test_species_copy_on_write(self):
+        a, b = material.NaCl(), material.NaCl()
+        a._boiling_point = 10.0
+        self.assertEqual(a._boiling_point, 10.0)
+        self.assertNotEqual(b._boiling_point, 10.0)
+        self.assertEqual(a._name, b._name)
+        self.assertTrue(np.array_equal(a.get_spectra_overlap(), b.get_spectra_overlap()))
+        # A material changed back to its original properties shares the original species
+        a._boiling_point = b._boiling_point
+        self.assertIs(a._species, b._species)
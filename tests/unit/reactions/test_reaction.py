@@ -0,0 +1,130 @@
+import sys
+sys.path.append('../../../')
+
+import os
+import shutil
+import tempfile
+import numpy as np
+from unittest import TestCase
+
+from chemistrylab.reactions.reaction_info import ReactInfo, REACTION_PATH
+from chemistrylab.reactions.reaction import (Reaction, CompiledReaction, SparseStoich, load_reaction,
+    get_rates, get_rates_sparse, newton_solve, newton_solve_sparse, linear_reactions)
+from scipy.integrate import solve_ivp
+
+
+class ReactionTestCase(TestCase):
+
+    def test_sparse_matches_dense(self):
+        for name in ["chloro_wurtz.json", "fict_react.json", "precipitation.json"]:
+            info = ReactInfo.from_json(os.path.join(REACTION_PATH, name))
+            sparse = SparseStoich.from_dense(info.stoich_coeff_arr, info.conc_coeff_arr)
+            conc = np.random.default_rng(0).random(len(info.MATERIALS))
+            dense_args = (info.stoich_coeff_arr, info.pre_exp_arr, info.activ_energy_arr, info.conc_coeff_arr, len(info.REACTANTS), 400.0)
+            self.assertTrue(np.allclose(get_rates(*dense_args, conc), get_rates_sparse(info.pre_exp_arr, info.activ_energy_arr, 400.0, conc, *sparse)))
+            self.assertTrue(np.allclose(
+                newton_solve(*dense_args, conc.copy(), 1.0, 100),
+                newton_solve_sparse(info.pre_exp_arr, info.activ_energy_arr, 400.0, conc.copy(), 1.0, 100, *sparse)
+            ))
+
+    def test_load_reaction_cache(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            fn = os.path.join(tmp, "chloro_wurtz.json")
+            shutil.copy(os.path.join(REACTION_PATH, "chloro_wurtz.json"), fn)
+            compiled = load_reaction(fn)
+            self.assertIs(load_reaction(fn), compiled)
+            self.assertFalse(compiled.react_info.pre_exp_arr.flags.writeable)
+            #modifying the file invalidates the cache
+            st = os.stat(fn)
+            os.utime(fn, ns=(st.st_atime_ns, st.st_mtime_ns+10**9))
+            self.assertIsNot(load_reaction(fn), compiled)
+            #binary round trip
+            compiled.save(os.path.join(tmp, "chloro_wurtz.rxn"))
+            loaded = load_reaction(os.path.join(tmp, "chloro_wurtz.rxn"))
+            self.assertEqual(loaded.react_info.MATERIALS, compiled.react_info.MATERIALS)
+            self.assertEqual(loaded.material_classes, compiled.material_classes)
+            for a, b in zip(loaded.sparse, compiled.sparse):
+                self.assertTrue(np.array_equal(a, b))
+            #reactions made from the same compiled reaction share their arrays
+            self.assertIs(Reaction(compiled).sparse, Reaction(compiled).sparse)
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_linear_network_is_exact(self):
+        info = ReactInfo.from_json(os.path.join(REACTION_PATH, "decomp.json"))
+        self.assertTrue(linear_reactions(info.stoich_coeff_arr, info.conc_coeff_arr).all())
+        reaction = Reaction(info)
+        n = np.array([1.0, 0.0, 0.0, 0.0])
+        for dt in [0.1, 10.0, 1000.0]:
+            reaction.temp = 400.0
+            ref = solve_ivp(reaction, (0, dt), n, method="LSODA", rtol=1e-12, atol=1e-14).y[:, -1]
+            self.assertTrue(np.allclose(reaction.react(n, 400.0, 1.0, dt), ref, atol=1e-10))
+
+    def test_nonlinear_networks_use_solver(self):
+        for name in ["chloro_wurtz.json", "fict_react.json", "precipitation.json"]:
+            info = ReactInfo.from_json(os.path.join(REACTION_PATH, name))
+            self.assertFalse(linear_reactions(info.stoich_coeff_arr, info.conc_coeff_arr).any())
+            self.assertEqual(Reaction(info).linear_species.shape[0], 0)
+
+    def test_propagator_cache_eviction(self):
+        reaction = Reaction(ReactInfo.from_json(os.path.join(REACTION_PATH, "decomp.json")))
+        reaction.propagator_cache_size = 3
+        for temp in range(10):
+            reaction.propagator(300.0+temp, 1.0)
+        #touching an entry keeps it in the cache
+        reaction.propagator(307.0, 1.0)
+        reaction.propagator(310.0, 1.0)
+        self.assertEqual(list(reaction._propagators), [(309.0, 1.0), (307.0, 1.0), (310.0, 1.0)])
+
+    def test_steady_state_fast_forward(self):
+        info = ReactInfo.from_json(os.path.join(REACTION_PATH, "precipitation.json"))
+        reaction = Reaction(info, steady_state_tol=1e-6)
+        n = np.array([0.5, 0.1, 0.2, 10, 0, 0])
+        for dt in [1e-3, 1.0, 30.0]:
+            self.assertIsNotNone(reaction._fast_forward(n, 300.0, dt))
+            out = reaction.react(n, 300.0, 1.0, dt)
+            reaction.temp = 300.0
+            ref = solve_ivp(reaction, (0, dt), n, method="LSODA", rtol=1e-10, atol=1e-13).y[:, -1]
+            self.assertTrue(np.allclose(out, ref, atol=1e-8))
+        #too short a wait to reach the steady state
+        self.assertIsNone(reaction._fast_forward(n, 300.0, 1e-6))
+
+    def test_no_steady_state_falls_back(self):
+        info = ReactInfo.from_json(os.path.join(REACTION_PATH, "chloro_wurtz.json"))
+        reaction = Reaction(info, steady_state_tol=1e-6)
+        n = np.random.default_rng(1).random(len(info.MATERIALS))
+        for dt in [1e-3, 1.0, 30.0]:
+            self.assertIsNone(reaction._fast_forward(n, 300.0, dt))
+
+    def test_react_batch_matches_react(self):
+        rng = np.random.default_rng(2)
+        for name in ["chloro_wurtz.json", "decomp.json", "precipitation.json"]:
+            info = ReactInfo.from_json(os.path.join(REACTION_PATH, name))
+            for reaction in [Reaction(info), Reaction(info, steady_state_tol=1e-6)]:
+                n = rng.random((4, len(info.MATERIALS)))
+                temp = np.array([300.0, 350.0, 400.0, 300.0])
+                volume = np.array([1.0, 0.5, 2.0, 1.0])
+                dt = np.array([1e-3, 0.1, 1.0, 30.0])
+                batch = reaction.react_batch(n, temp, volume, dt)
+                for i in range(4):
+                    self.assertTrue(np.allclose(batch[i], reaction.react(n[i], temp[i], volume[i], dt[i]), rtol=1e-12, atol=1e-14))
+
+    def test_batched_react_event(self):
+        from chemistrylab import vessel
+        from chemistrylab.benches.reaction_bench import get_mat
+        from copy import deepcopy
+        reaction = Reaction(load_reaction(os.path.join(REACTION_PATH, "chloro_wurtz.json")))
+        vessels = [get_mat("diethyl ether", 4), get_mat("diethyl ether", 2)]
+        for v, mats in zip(vessels, [["1-chlorohexane", "Na"], ["2-chlorohexane", "Na"]]):
+            for mat in mats:
+                get_mat(mat, 1).push_event_to_queue([vessel.Event("pour by percent", (1,), v)])
+        event = vessel.Event("react", (reaction,), None)
+        copies = deepcopy(vessels)
+        self.assertEqual(vessel.run_event(event, vessels, [0.5, 0.1]), [0, 0])
+        for v, dt in zip(copies, [0.5, 0.1]):
+            v.push_event_to_queue([event], dt=dt, update_layers=False)
+        for v, v2 in zip(vessels, copies):
+            self.assertEqual(set(v.material_dict), set(v2.material_dict))
+            for key, mat in v.material_dict.items():
+                self.assertAlmostEqual(mat.mol, v2.material_dict[key].mol, places=12)
@@ -0,0 +1,74 @@
+import sys
+sys.path.append('../../../')
+
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+import gymnasium as gym
+from functools import partial
+from unittest import TestCase
+
+import chemistrylab
+from chemistrylab.util.async_env import AsyncGenBench, _ProcessEnv
+
+
+class AsyncGenBenchTestCase(TestCase):
+
+    def run_episodes(self, executor):
+        bench = AsyncGenBench([partial(gym.make, "GenWurtzExtract-v2")]*4, executor=executor, max_concurrency=2)
+        async def actor(i):
+            obs, info = await bench.async_reset(i, seed=i)
+            # the last action ends the experiment
+            obs, reward, terminated, truncated, info = await bench.async_step(i, 40)
+            return obs.shape, terminated
+        async def run_all():
+            return await asyncio.wait_for(asyncio.gather(*[actor(i) for i in range(4)]), 60)
+        try:
+            return asyncio.run(run_all())
+        finally:
+            bench.close()
+
+    def test_thread_executor(self):
+        for shape, terminated in self.run_episodes("thread"):
+            self.assertTrue(terminated)
+
+    def test_process_executor(self):
+        for shape, terminated in self.run_episodes("process"):
+            self.assertTrue(terminated)
+
+    def test_executor_instances(self):
+        with ThreadPoolExecutor(2) as pool:
+            for shape, terminated in self.run_episodes(pool):
+                self.assertTrue(terminated)
+        # environments get their own subprocesses, made with the pool's context and concurrency
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(3, mp_context=ctx) as pool:
+            bench = AsyncGenBench([partial(gym.make, "GenWurtzExtract-v2")]*2, executor=pool)
+            try:
+                self.assertEqual(bench.max_concurrency, 3)
+                self.assertTrue(all(isinstance(env, _ProcessEnv) for env in bench.envs))
+                self.assertTrue(all(isinstance(env.process, ctx.Process) for env in bench.envs))
+                async def episode():
+                    await bench.async_reset(0, seed=0)
+                    return await bench.async_step(0, 40)
+                self.assertTrue(asyncio.run(episode())[2])
+            finally:
+                bench.close()
+        class InlineExecutor(Executor):
+            pass
+        with self.assertRaises(TypeError):
+            AsyncGenBench([partial(gym.make, "GenWurtzExtract-v2")], executor=InlineExecutor())
+
+    def test_one_request_per_env(self):
+        bench = AsyncGenBench([partial(gym.make, "GenWurtzExtract-v2")], max_concurrency=1)
+        async def double_step():
+            await bench.async_reset(0)
+            first = asyncio.ensure_future(bench.async_step(0, 0))
+            await asyncio.sleep(0)
+            with self.assertRaises(RuntimeError):
+                await bench.async_step(0, 0)
+            await first
+        try:
+            asyncio.run(double_step())
+        finally:
+            bench.close()
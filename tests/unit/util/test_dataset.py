@@ -0,0 +1,72 @@
+import sys
+sys.path.append('../../../')
+
+import os
+import json
+import shutil
+import tempfile
+from functools import partial
+import numpy as np
+from unittest import TestCase
+
+import chemistrylab
+from chemistrylab.lab.lab import RandomAgent
+from chemistrylab.util.dataset import make_jobs, build_dataset, load_shard, iter_episodes, FIELDS
+
+
+class DatasetTestCase(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_build_and_resume(self):
+        jobs = make_jobs(["GenWurtzExtract-v2"], ["random"], seeds=[0, 1], episodes=4)
+        stats = build_dataset(self.root, jobs, chunk_size=1)
+        self.assertEqual([s.episodes for s in stats], [4, 4])
+        path = os.path.join(self.root, jobs[0].name)
+        data = load_shard(path)
+        n = len(data["rewards"])
+        self.assertEqual(n, stats[0].transitions)
+        for key in FIELDS:
+            self.assertEqual(len(data[key]), n)
+        # episode offsets line up with the episode ends
+        offsets, lengths = data["episodes"][:, 0].astype(int), data["episodes"][:, 1].astype(int)
+        self.assertTrue(np.all(offsets[1:] == (offsets+lengths)[:-1]))
+        ends = offsets+lengths-1
+        self.assertTrue(np.all(data["terminals"][ends] | data["timeouts"][ends]))
+        for ep, (start, length, ret) in zip(iter_episodes(path), data["episodes"]):
+            self.assertEqual(len(ep["rewards"]), length)
+            self.assertAlmostEqual(ep["rewards"].sum(), ret, places=4)
+
+        # interrupt the build after the second chunk
+        with open(os.path.join(path, "index.json")) as f:
+            index = json.load(f)
+        index["chunks"] = index["chunks"][:2]
+        index["episodes"] = index["episodes"][:2]
+        index["complete"] = False
+        with open(os.path.join(path, "index.json"), "w") as f:
+            json.dump(index, f)
+        os.remove(os.path.join(path, "chunk-00003.npz"))
+
+        stats = build_dataset(self.root, jobs, chunk_size=1)
+        self.assertEqual([(s.resumed, s.episodes) for s in stats], [(2, 2), (4, 0)])
+        resumed = load_shard(path)
+        for key in FIELDS + ("episodes",):
+            self.assertTrue(np.array_equal(resumed[key], data[key]))
+
+    def test_worker_processes(self):
+        jobs = make_jobs(["GenWurtzReact-v2"], ["random"], seeds=[0, 1], episodes=1)
+        stats = build_dataset(self.root, jobs, n_workers=2)
+        for job, s in zip(jobs, stats):
+            self.assertEqual(s.name, job.name)
+            self.assertEqual(len(load_shard(os.path.join(self.root, job.name))["rewards"]), s.transitions)
+
+    def test_partial_policy(self):
+        jobs = make_jobs(["GenWurtzReact-v2"], [partial(RandomAgent)], seeds=[0], episodes=1)
+        self.assertEqual(jobs[0].name, "GenWurtzReact-v2__RandomAgent__0")
+        stats = build_dataset(self.root, jobs)
+        self.assertEqual(stats[0].episodes, 1)
+        self.assertEqual(len(load_shard(os.path.join(self.root, jobs[0].name))["rewards"]), stats[0].transitions)
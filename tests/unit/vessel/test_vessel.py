@@ -0,0 +1,123 @@
+import sys
+sys.path.append('../../../')
+
+import numpy as np
+from chemistrylab import vessel, material
+from chemistrylab.benches.extract_bench import wurtz_vessel, make_solvent
+from copy import deepcopy
+from unittest import TestCase
+
+
+class VesselTestCase(TestCase):
+
+    def test_solvent_slots_are_stable(self):
+        v = wurtz_vessel("dodecane")[0]
+        solvents = tuple(v.solvents)
+        #pour a new solvent in
+        h2o = make_solvent("H2O")
+        h2o.push_event_to_queue([vessel.Event("pour by volume",(0.1,),v)])
+        self.assertEqual(tuple(v.solvents[:len(solvents)]), solvents)
+        self.assertEqual(v.solvents[-1], "H2O")
+        #drain everything out, the (now empty) solvents keep their slots
+        beaker = vessel.Vessel("beaker", volume = 10)
+        v.push_event_to_queue([vessel.Event("pour by percent",(1,),beaker)])
+        self.assertEqual(tuple(v.solvents), solvents+("H2O",))
+        for key in v.solvents:
+            self.assertTrue(v.material_dict[key].mol<1e-12)
+            
+    def test_solute_dict_consistent(self):
+        v = wurtz_vessel("dodecane")[0]
+        for x in range(5):
+            v.push_event_to_queue([vessel.Event("mix",(-0.5,),None)])
+            v.material_dict["Na"].mol *= 0.5
+            v.validate_solutes()
+            for key, arr in v.solute_dict.items():
+                self.assertTrue(abs(arr.sum()-v.material_dict[key].mol)<1e-6)
+                self.assertTrue(np.all(arr>=0))
+
+    def test_deepcopy_keeps_views(self):
+        v = wurtz_vessel("dodecane")[0]
+        v2 = deepcopy(v)
+        v2.solute_dict["Na"] *= 0
+        self.assertTrue(np.all(v2._solute_amounts[v2._solutes.index("Na")]==0))
+        self.assertTrue(v.solute_dict["Na"].sum()>0)
+
+    def test_pickle_shares_species(self):
+        import pickle
+        v = wurtz_vessel("dodecane")[0]
+        v2 = pickle.loads(pickle.dumps(v))
+        self.assertFalse(hasattr(v2, "__dict__"))
+        self.assertEqual(set(v2.material_dict), set(v.material_dict))
+        for key, mat in v.material_dict.items():
+            self.assertIs(v2.material_dict[key]._species, mat._species)
+        self.assertTrue(np.shares_memory(v2.solute_dict["Na"], v2._solute_amounts))
+
+    def test_expected_layers(self):
+        from chemistrylab.extract_algorithms import separate
+        from chemistrylab.benches.characterization_bench import CharacterizationBench
+        v = wurtz_vessel("dodecane")[0]
+        h2o = make_solvent("H2O")
+        h2o.push_event_to_queue([vessel.Event("pour by volume",(0.2,),v)])
+        v.push_event_to_queue([vessel.Event("mix",(-10,),None)])
+        vessels = [v, wurtz_vessel("diethyl ether")[0]]
+        for t in [0.01, 0.1, 1.0, 10.0]:
+            v.push_event_to_queue(dt=t)
+            A, B, C, colors = [a.astype(np.float32) for a in v.get_layer_distribution()]
+            expected = separate.expected_layers(A, B, C, colors)
+            self.assertTrue(np.all((expected >= colors.min()-1e-6) & (expected <= colors.max()+1e-6)))
+            #close to the average of many samples
+            samples = np.mean([separate.map_to_state(A, B, C, colors)[0] for _ in range(200)], axis=0)
+            self.assertLess(np.abs(samples-expected).mean(), 0.15)
+            #batches pad vessels with fewer layers
+            batch = CharacterizationBench.get_layers_expected_batch(vessels)
+            for row, ves in zip(batch, vessels):
+                self.assertTrue(np.allclose(row, separate.expected_layers(*ves.get_layer_distribution())))
+
+    def test_advance_is_lazy(self):
+        v = wurtz_vessel("dodecane")[0]
+        v.push_event_to_queue([vessel.Event("mix",(-10,),None)])
+        v2 = deepcopy(v)
+        layers = v._layers
+        for x in range(5):
+            v.advance(0.5)
+        # Nothing is integrated until the vessel is observed
+        self.assertIs(v._layers, layers)
+        self.assertEqual((v.time, v.clock), (0, 2.5))
+        v.get_layers()
+        self.assertEqual(v.time, 2.5)
+        # The pending time is integrated in one step
+        v2.push_event_to_queue(dt=2.5)
+        self.assertTrue(np.allclose(v._layers_position, v2._layers_position))
+        self.assertTrue(np.allclose(v._solute_amounts, v2._solute_amounts))
+
+    def test_timestamped_events(self):
+        v = wurtz_vessel("dodecane")[0]
+        beaker = vessel.Vessel("beaker", volume = 10)
+        status = v.push_event_to_queue([vessel.Event("pour by percent",(0.5,),beaker,1.0)])
+        self.assertEqual(status, [None])
+        v.advance(0.6)
+        self.assertEqual(v.sync(), [])
+        self.assertEqual(len(beaker.material_dict), 0)
+        v.advance(0.6)
+        self.assertEqual(v.sync(), [0])
+        self.assertGreater(len(beaker.material_dict), 0)
+        self.assertEqual((v.time, v.clock), (1.2, 1.2))
+
+    def test_swapped_material_updates_slots(self):
+        v = wurtz_vessel("dodecane")[0]
+        v.validate_solutes()
+        # swap a solute for another one (the number of materials stays the same)
+        del v.material_dict["dodecane"]
+        product = material.FiveMethylundecane(mol=0.1)
+        product.set_solute_flag(True)
+        v.material_dict["5-methylundecane"] = product
+        v.validate_solutes()
+        self.assertEqual(set(v._solutes), {"Na", "Cl", "5-methylundecane"})
+        self.assertEqual(set(v.solute_dict), {"Na", "Cl", "5-methylundecane"})
+        self.assertTrue(abs(v.solute_dict["5-methylundecane"].sum()-0.1) < 1e-6)
+        # swap the solvent
+        del v.material_dict["diethyl ether"]
+        v.material_dict["H2O"] = material.H2O(mol=1.0)
+        v.validate_solvents()
+        self.assertEqual(tuple(v.solvents), ("H2O",))
+        self.assertEqual(v.solute_dict["Na"].shape, (1,))